@@ -6,9 +6,10 @@ from сlasses.vkinder_bot import VKinderBot
 Перед началом использования переименуйте файл "default_keys.py" в "keys.py" и укажите в нем свои токены и данные
 доступа к БД. 
 
-Перед первым запуском установите {"rebuild_tables": true} в файле "options.cfg" (регистр букв true имеет значение). 
-Когда этот файл установлен, все таблицы в БД будут пересозданы. Все данные в БД будут утеряны. 
-После первого запуска этот флаг будет установлен в false автоматически. 
+Таблицы создаются при первом запуске и обновляются миграциями при каждом запуске, данные сохраняются. 
+Чтобы начать с чистой БД, установите {"rebuild_tables": true} в файле "options.cfg" (регистр букв true имеет значение). 
+Когда этот флаг установлен, все таблицы в БД будут пересозданы. Все данные в БД будут утеряны. 
+После запуска этот флаг будет установлен в false автоматически. 
 """
 if __name__ == '__main__':
     server = VKinderBot(group_token=GROUP_TOKEN,
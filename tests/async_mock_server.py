@@ -0,0 +1,27 @@
+from aiohttp import web
+from tests.mock_server import MockServerRequestHandler, get_free_port
+from сlasses.vk_api_classes import read_textfile
+
+
+async def handle_get(request: web.Request) -> web.Response:
+    """
+    Answers the same response files as synchronous mock server does
+    """
+    filename = MockServerRequestHandler.find_response_file(request.path_qs)
+    if filename:
+        return web.Response(text=read_textfile(filename), content_type='application/json')
+    return web.Response(text=read_textfile('responses\\404.json'), content_type='application/json')
+
+
+async def start_async_mock_server(port: int = None) -> tuple[web.AppRunner, int]:
+    """
+    Starts mock server in running event loop
+    :return: runner, which should be cleaned up by caller, and port of server
+    """
+    port = port if port else get_free_port()
+    app = web.Application()
+    app.router.add_get('/{method}', handle_get)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    return runner, port
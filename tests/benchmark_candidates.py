@@ -0,0 +1,78 @@
+"""
+Benchmark of found users of client with 10k candidates: list of users (as it was before) versus CandidateSet.
+Search result is filtered and sorted, then all new candidates are shown with prefetching of next 2 ones.
+Run from "tests" folder: python benchmark_candidates.py
+"""
+import json
+import time
+from сlasses.vk_api_classes import ApiUser, CandidateSet, read_textfile, RATINGS
+
+USERS = 10000
+LOOKAHEAD = 2
+
+
+class RatedUser(ApiUser):
+    """
+    User which keeps own rating, as it was before
+    """
+    __slots__ = ('rating_id',)
+
+    def __init__(self, row: dict, rating_id: int):
+        super().__init__(row)
+        self.rating_id = rating_id
+
+
+def show_list(users: list[RatedUser]) -> int:
+    users = [user for user in users if not user.is_closed and user.last_seen_time]
+    users.sort(key=lambda x: x.last_seen_time, reverse=True)
+    shown = 0
+    position = -1
+    while True:
+        # the same as peek_next_users and get_next_user of VKinderClient did
+        next_users = []
+        for user in users[position + 1:]:
+            if len(next_users) >= LOOKAHEAD:
+                break
+            if user.rating_id == RATINGS['new']:
+                next_users.append(user)
+        while position < len(users) - 1:
+            position += 1
+            if users[position].rating_id == RATINGS['new']:
+                break
+        else:
+            return shown
+        shown += 1
+
+
+def show_candidates(users: list[RatedUser]) -> int:
+    candidates = CandidateSet(users)
+    candidates.set_ratings({user.vk_id: user.rating_id for user in users if user.rating_id != RATINGS['new']})
+    candidates = candidates.select(~candidates.column('is_closed') & (candidates.column('last_seen_time') > 0))
+    candidates = candidates.sorted_by('last_seen_time', reverse=True)
+    shown = 0
+    while True:
+        candidates.peek_users(RATINGS['new'], LOOKAHEAD)
+        if candidates.next_user(RATINGS['new']) is None:
+            return shown
+        shown += 1
+
+
+def measure(show, users: list[RatedUser]) -> tuple[int, float]:
+    start_time = time.perf_counter()
+    shown = show(users)
+    return shown, time.perf_counter() - start_time
+
+
+def main():
+    # real users from mock server response with unique ids, every third one is already rated
+    rows = json.loads(read_textfile('responses\\users.search.json'))['response']['items']
+    users = [RatedUser({**rows[index % len(rows)], 'id': index}, RATINGS['liked'] if index % 3 == 0 else RATINGS['new'])
+             for index in range(USERS)]
+    shown_before, before = measure(show_list, users)
+    shown_after, after = measure(show_candidates, users)
+    assert shown_before == shown_after
+    print(f'{USERS} users, {shown_after} shown: list {before * 1000:.0f} ms, CandidateSet {after * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
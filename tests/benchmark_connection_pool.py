@@ -0,0 +1,53 @@
+"""
+Benchmark of requests per second against mock server: new connection per request (module-level requests.get,
+as it was before) versus pooled keep-alive session of VkApiClient.
+Run from "tests" folder: python benchmark_connection_pool.py
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import requests
+from tests.mock_server import get_free_port, start_mock_server
+from сlasses.vk_api_client import VkApiClient
+
+REQUESTS = 1000
+THREADS = 8
+
+
+def measure(get_user, threads: int) -> float:
+    start_time = time.perf_counter()
+    if threads == 1:
+        for _ in range(REQUESTS):
+            get_user()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(get_user) for _ in range(REQUESTS)]:
+                future.result()
+    return REQUESTS / (time.perf_counter() - start_time)
+
+
+def main():
+    port = get_free_port()
+    start_mock_server(port)
+    url = f'http://localhost:{port}/'
+    with mock.patch('сlasses.vk_api_client.VkApiClient.API_BASE_URL', new_callable=mock.PropertyMock) as mock_f:
+        mock_f.return_value = url
+        # rate limiting is not subject of this benchmark
+        api = VkApiClient(token='', app_id='', user_id='1', requests_per_second=100000, burst=1000,
+                          pool_size=THREADS)
+
+        def get_user_without_pool():
+            requests.get(url + 'users.get', params={'user_ids': '1', 'v': '5.124'})
+
+        def get_user_with_pool():
+            api.get_users('1')
+
+        for threads in (1, THREADS):
+            before = measure(get_user_without_pool, threads)
+            after = measure(get_user_with_pool, threads)
+            print(f'threads={threads}: new connection per request {before:.0f} req/s, '
+                  f'pooled session {after:.0f} req/s ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
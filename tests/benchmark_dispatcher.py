@@ -0,0 +1,110 @@
+"""
+Load benchmark of EventDispatcher and replies of bot against mock server.
+Simulates many concurrent clients, where some of them make slow users search (several pages with delays),
+every message is answered by VKinderBot.send_msg, reply latency (from event receiving till reply is sent) is measured.
+Replies are sent by vk_api library (as it was before) and by VkGroupClient of bot.
+Run from "tests" folder: python benchmark_dispatcher.py
+"""
+import statistics
+import threading
+import time
+from random import randrange
+import vk_api
+from tests.mock_server import get_free_port, start_mock_server
+from сlasses.vk_api_classes import VKinderClient, ApiUser
+from сlasses.vk_api_client import VkApiClient, VkGroupClient
+from сlasses.vk_api_constants import BASE_URL
+from сlasses.vkinder_bot import VKinderBot, Commands
+from сlasses.vkinder_bot_constants import COMMANDS, KEYBOARDS
+from сlasses.vkinder_dispatcher import EventDispatcher
+
+CLIENTS = 120
+MESSAGES_PER_CLIENT = 5
+SLOW_CLIENTS_SHARE = 10
+# imitation of paginated search: pages quantity and delay between pages
+SLOW_PAGES = 3
+PAGE_DELAY = 0.33
+# latency of API server
+SERVER_DELAY = 0.02
+
+
+class VkApiReplies:
+    """
+    Sends replies by vk_api library, as bot did before, requests are redirected to mock server
+    """
+
+    def __init__(self, base_url: str):
+        vk = vk_api.VkApi(token='benchmark')
+        vk.RPS_DELAY = 0
+        post = vk.http.post
+        vk.http.post = lambda url, *args, **kwargs: post(url.replace(BASE_URL, base_url), *args, **kwargs)
+        self.api = vk.get_api()
+
+    def send_message(self, peer_id, message: str, attachment: str = None, keyboard: str = None):
+        self.api.messages.send(peer_id=peer_id, message=message, attachment=attachment, keyboard=keyboard,
+                               random_id=randrange(10 ** 7))
+
+
+def percentile(values: list[float], pct: int) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(api: VkApiClient, bot: VKinderBot, workers: int) -> tuple[list[float], list[float]]:
+    """
+    :return: latencies of all messages and latencies of messages of clients without slow search
+    """
+    latencies = []
+    fast_latencies = []
+    lock = threading.Lock()
+    done = threading.Event()
+    total = CLIENTS * MESSAGES_PER_CLIENT
+    clients = [VKinderClient(ApiUser({'id': client_id})) for client_id in range(CLIENTS)]
+
+    def handler(client: VKinderClient, received: float):
+        slow = int(client.vk_id) % SLOW_CLIENTS_SHARE == 0
+        if slow:
+            for _ in range(SLOW_PAGES):
+                api.search_users(q='Дуров')
+                time.sleep(PAGE_DELAY)
+        else:
+            api.get_users(str(client.vk_id))
+        bot.send_msg(client, 'Ответ', keyboard=bot.cmd.kb(['yes', 'no']))
+        with lock:
+            latencies.append(time.perf_counter() - received)
+            if not slow:
+                fast_latencies.append(latencies[-1])
+            if len(latencies) == total:
+                done.set()
+
+    dispatcher = EventDispatcher(workers=workers)
+    for _ in range(MESSAGES_PER_CLIENT):
+        for client in clients:
+            dispatcher.submit(str(client.vk_id), handler, client, time.perf_counter())
+    done.wait()
+    dispatcher.shutdown()
+    return latencies, fast_latencies
+
+
+def main():
+    port = get_free_port()
+    start_mock_server(port, delay=SERVER_DELAY)
+    base_url = f'http://localhost:{port}/'
+    # rate limiting is not subject of this benchmark
+    api = VkApiClient(token='', app_id='', user_id='1', base_url=base_url, requests_per_second=10000, burst=100)
+    bot = VKinderBot.__new__(VKinderBot)
+    bot.cmd = Commands(COMMANDS, KEYBOARDS)
+    senders = {'vk_api': VkApiReplies(base_url),
+               'VkGroupClient': VkGroupClient('benchmark', base_url=base_url, requests_per_second=10000, burst=100,
+                                              pool_size=64)}
+    for workers in (16, 64):
+        for name, sender in senders.items():
+            bot.group_client = sender
+            latencies, fast_latencies = run(api, bot, workers)
+            print(f'workers={workers:3d} replies by {name:13s} clients={CLIENTS} messages={len(latencies)} '
+                  f'p50={statistics.median(latencies) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms '
+                  f'p99 of fast clients={percentile(fast_latencies, 99) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Memory benchmark of search result of 10k users: DTOs with __dict__ (as it was before) versus DTOs with __slots__.
+Run from "tests" folder: python benchmark_dto_memory.py
+"""
+import json
+import tracemalloc
+from сlasses.vk_api_classes import ApiUser, read_textfile
+
+USERS = 10000
+
+
+def measure(make_user, rows: list[dict]) -> int:
+    tracemalloc.start()
+    users = [make_user(row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(users) == len(rows)
+    return size
+
+
+def main():
+    # real users from mock server response with unique ids
+    rows = json.loads(read_textfile('responses\\users.search.json'))['response']['items']
+    rows = [{**rows[index % len(rows)], 'id': index} for index in range(USERS)]
+    # the same constructor, but attributes are stored in __dict__
+    dict_user = type('DictApiUser', (), {'__init__': ApiUser.__init__})
+    before = measure(dict_user, rows)
+    after = measure(ApiUser, rows)
+    print(f'{USERS} users: with __dict__ {before / 2 ** 20:.2f} MiB, with __slots__ {after / 2 ** 20:.2f} MiB '
+          f'({(1 - after / before) * 100:.0f}% less)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of 100k replies with keyboards of bot: keyboard built and serialized on every reply (as it was before)
+versus JSON compiled once by Commands.
+Run from "tests" folder: python benchmark_keyboards.py
+"""
+import random
+import time
+from vk_api.keyboard import VkKeyboard
+from сlasses.vkinder_bot import Commands
+from сlasses.vkinder_bot_constants import COMMANDS, KEYBOARDS
+
+REPLIES = 100000
+
+
+def build(cmd: Commands, params: list) -> str:
+    # the same as Commands.kb did
+    if not params:
+        return VkKeyboard().get_empty_keyboard()
+    keyboard = VkKeyboard(one_time=False)
+    for param in params:
+        if param is None:
+            keyboard.add_line()
+            continue
+        btn = cmd.get(param, True)
+        keyboard.add_button(btn[0], color=btn[1])
+    return keyboard.get_keyboard()
+
+
+def measure(make, layouts: list[list]) -> tuple[float, list[str]]:
+    started = time.perf_counter()
+    keyboards = [make(params) for params in layouts]
+    return time.perf_counter() - started, keyboards
+
+
+def main():
+    random.seed(1)
+    layouts = [random.choice(KEYBOARDS) for _ in range(REPLIES)]
+    cmd = Commands(COMMANDS, KEYBOARDS)
+    before, expected = measure(lambda params: build(cmd, params), layouts)
+    after, keyboards = measure(cmd.kb, layouts)
+    # both ways make the same JSON
+    assert keyboards == expected
+    print(f'{REPLIES} replies: built keyboards {before * 1e6 / REPLIES:.2f} us/reply, '
+          f'compiled keyboards {after * 1e6 / REPLIES:.2f} us/reply ({before / after:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
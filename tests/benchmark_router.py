@@ -0,0 +1,124 @@
+"""
+Benchmark of routing of 100k messages to handlers without network I/O: if/elif chain with synonyms lists
+(as it was before) versus dispatch table of VKinderBot.
+Run from "tests" folder: python benchmark_router.py
+"""
+import random
+import time
+from сlasses.vkinder_bot import VKinderBot, Commands, Router
+from сlasses.vkinder_bot_constants import STATUSES, COMMANDS
+
+MESSAGES = 100000
+SAMPLES = ['да', 'нет', 'назад', 'поиск', 'история', 'выход', 'бан', 'ж', 'лайкнутые', 'страна', 'москва', '2', '18',
+           'привет']
+
+
+def synonyms(command_name: str) -> list[str]:
+    # the same as Commands.get did
+    return [x.lower() for x in COMMANDS[command_name][0]]
+
+
+def route_chain(status: int, msg: str) -> str:
+    # the same branches as VKinderBot.handle_message had, handler name is returned instead of calling it
+    welcome = (STATUSES['invited'], STATUSES['has_contacted'])
+    if msg in synonyms('quit') and status != STATUSES['has_contacted']:
+        return 'do_say_goodbye'
+    if msg == 'test':
+        return 'do_test_search'
+    if status in welcome and (msg in synonyms('yes') or msg in synonyms('new search')):
+        return 'do_start_search_creating'
+    elif status in welcome and msg in synonyms('show history'):
+        return 'do_show_search_history'
+    elif status in welcome and (msg in synonyms('liked') or msg in synonyms('disliked') or msg in synonyms('banned')):
+        return 'do_show_rated_users'
+    elif status in welcome and msg in synonyms('no'):
+        return 'do_say_goodbye'
+    elif status == STATUSES['has_contacted']:
+        return 'do_propose_start_search'
+    elif status == STATUSES['search_history_input_wait'] and msg in synonyms('back'):
+        return 'do_propose_start_search'
+    elif status == STATUSES['search_history_input_wait']:
+        return 'on_search_history_choose'
+    elif status == STATUSES['country_input_wait'] and msg in synonyms('back'):
+        return 'do_start_search_creating'
+    elif status == STATUSES['country_input_wait']:
+        return 'on_country_name_input'
+    elif status == STATUSES['country_choose_wait'] and msg in synonyms('back'):
+        return 'do_propose_country_name_input'
+    elif status == STATUSES['country_choose_wait']:
+        return 'on_country_name_choose'
+    elif status == STATUSES['city_input_wait'] and msg in synonyms('back'):
+        return 'do_propose_start_search'
+    elif status == STATUSES['city_input_wait'] and msg in synonyms('country'):
+        return 'do_propose_country_name_input'
+    elif status == STATUSES['city_input_wait']:
+        return 'do_propose_city_name_choose'
+    elif status == STATUSES['city_choose_wait'] and msg in synonyms('back'):
+        return 'do_start_search_creating'
+    elif status == STATUSES['city_choose_wait']:
+        return 'on_city_name_choose'
+    elif status == STATUSES['sex_choose_wait'] and msg in synonyms('back'):
+        return 'do_start_search_creating'
+    elif status == STATUSES['sex_choose_wait']:
+        return 'on_sex_choose'
+    elif status == STATUSES['status_choose_wait'] and msg in synonyms('back'):
+        return 'do_propose_sex_choose'
+    elif status == STATUSES['status_choose_wait']:
+        return 'on_status_choose'
+    elif status == STATUSES['min_age_input_wait'] and msg in synonyms('back'):
+        return 'do_propose_status_choose'
+    elif status == STATUSES['min_age_input_wait']:
+        return 'on_min_age_enter'
+    elif status == STATUSES['max_age_input_wait'] and msg in synonyms('back'):
+        return 'do_propose_min_age_enter'
+    elif status == STATUSES['max_age_input_wait']:
+        return 'on_max_age_enter'
+    elif status == STATUSES['decision_wait'] and msg in synonyms('back'):
+        return 'do_return_from_decision'
+    elif status == STATUSES['decision_wait']:
+        return 'on_decision_made'
+    return 'do_inform_about_unknown_command'
+
+
+class Recorder:
+    """
+    Stands for bot: every handler just returns own name
+    """
+
+    def __init__(self):
+        self.cmd = Commands(COMMANDS)
+
+    def __getattr__(self, name):
+        return lambda *args: name
+
+
+def route_table(cmd: Commands, router: Router, status: int, msg: str) -> str:
+    # the same as VKinderBot.handle_message does
+    command = cmd.find(msg)
+    if command is None and msg == 'test':
+        return 'do_test_search'
+    return router.route(status, command)(msg, None)
+
+
+def measure(route, messages: list[tuple[int, str]]) -> tuple[float, list[str]]:
+    started = time.perf_counter()
+    handlers = [route(status, msg) for status, msg in messages]
+    return time.perf_counter() - started, handlers
+
+
+def main():
+    random.seed(1)
+    statuses = list(STATUSES.values())
+    messages = [(random.choice(statuses), random.choice(SAMPLES)) for _ in range(MESSAGES)]
+    bot = Recorder()
+    router = VKinderBot.make_router(bot)
+    before, expected = measure(route_chain, messages)
+    after, handlers = measure(lambda status, msg: route_table(bot.cmd, router, status, msg), messages)
+    # both ways choose the same handlers
+    assert handlers == expected
+    print(f'{MESSAGES} messages: if/elif chain {MESSAGES / before:,.0f} msg/s, '
+          f'dispatch table {MESSAGES / after:,.0f} msg/s ({before / after:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Memory benchmark of 50 clients which found the same 1k users: own users of each client (as it was before)
+versus users shared via pool.
+Run from "tests" folder: python benchmark_users_pool.py
+"""
+import json
+import tracemalloc
+from сlasses.vk_api_classes import ApiUser, CandidateSet, read_textfile
+from сlasses.vkinder_users_pool import UsersPool
+
+CLIENTS = 50
+USERS = 1000
+
+
+def search(response: str) -> list[ApiUser]:
+    # each search parses own response of VK, as it would be received by network
+    rows = json.loads(response)['response']['items']
+    return [ApiUser({**rows[index % len(rows)], 'id': index}) for index in range(USERS)]
+
+
+def measure(found_users, response: str) -> int:
+    tracemalloc.start()
+    clients = [found_users(search(response)) for _ in range(CLIENTS)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(clients) == CLIENTS
+    return size
+
+
+def main():
+    response = read_textfile('responses\\users.search.json')
+    pool = UsersPool()
+    before = measure(CandidateSet, response)
+    after = measure(lambda users: CandidateSet(pool.resolve_all(users)), response)
+    # users are released together with found users of clients
+    assert len(pool) == 0
+    print(f'{CLIENTS} clients x {USERS} users: own users {before / 2 ** 20:.2f} MiB, '
+          f'pooled users {after / 2 ** 20:.2f} MiB ({(1 - after / before) * 100:.0f}% less)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,56 +1,108 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
 import re
 import socket
+import time
 from threading import Thread
+from urllib.parse import parse_qs, urlencode
 import requests
 from сlasses.vk_api_classes import read_textfile
 
 
 class MockServerRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections, like real API server
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this every keep-alive response waits for delayed ACK
+    disable_nagle_algorithm = True
     USER_GET = re.compile(r'users.get')
     COUNTRIES_GET = re.compile(r'database.getCountries')
     CITIES_GET = re.compile(r'database.getCities')
     SEARCH_USERS_GET = re.compile(r'users.search')
     SEARCH_USER_BABYCH = re.compile(r'babych')
     PHOTOS_GET = re.compile(r'photos.get')
+    EXECUTE = re.compile(r'execute')
+    MESSAGES_SEND = re.compile(r'messages.send')
+    MESSAGES_SET_ACTIVITY = re.compile(r'messages.setActivity')
+    EXECUTE_CALL = re.compile(r'API\.([\w.]+)\(')
 
     def do_GET(self):
-        if re.search(self.USER_GET, self.path):
-            self.send('responses\\users.get.json')
+        filename = self.find_response_file(self.path)
+        if filename:
+            self.send(filename)
+        else:
+            self.send(fail=True)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        # latency of real API server, if it is set
+        time.sleep(getattr(self.server, 'delay', 0))
+        if re.search(self.EXECUTE, self.path):
+            self.send_execute(parse_qs(body).get('code', [''])[0])
+        elif re.search(self.MESSAGES_SEND, self.path):
+            self.send('responses\\messages.send.json')
+        elif re.search(self.MESSAGES_SET_ACTIVITY, self.path):
+            self.send('responses\\messages.setActivity.json')
+        else:
+            self.send(fail=True)
 
-        elif re.search(self.COUNTRIES_GET, self.path):
-            self.send('responses\\database.getCountries.json')
+    @classmethod
+    def find_response_file(cls, text: str) -> str:
+        """
+        Finds file with response of API method mentioned in text (path or code of execute)
+        """
+        if re.search(cls.USER_GET, text):
+            return 'responses\\users.get.json'
 
-        elif re.search(self.CITIES_GET, self.path):
-            self.send('responses\\database.getCities.json')
+        elif re.search(cls.COUNTRIES_GET, text):
+            return 'responses\\database.getCountries.json'
 
-        elif re.search(self.SEARCH_USERS_GET, self.path):
-            if re.search(self.SEARCH_USER_BABYCH, self.path):
-                self.send('responses\\users.search_babych.json')
+        elif re.search(cls.CITIES_GET, text):
+            return 'responses\\database.getCities.json'
+
+        elif re.search(cls.SEARCH_USERS_GET, text):
+            if re.search(cls.SEARCH_USER_BABYCH, text):
+                return 'responses\\users.search_babych.json'
             else:
-                self.send('responses\\users.search.json')
+                return 'responses\\users.search.json'
 
-        elif re.search(self.PHOTOS_GET, self.path):
-            self.send('responses\\photos.get.json')
+        elif re.search(cls.PHOTOS_GET, text):
+            return 'responses\\photos.get.json'
 
-        else:
-            self.send(fail=True)
+    def send_execute(self, code: str):
+        """
+        Imitation of https://vk.com/dev/execute for code like "return [API.users.search({...}), ...];"
+        Each call is answered with the same content as separate request, unknown methods are answered with false
+        """
+        decoder = json.JSONDecoder()
+        result = []
+        for call in re.finditer(self.EXECUTE_CALL, code):
+            params, _ = decoder.raw_decode(code, call.end())
+            filename = self.find_response_file(f'{call.group(1)}?{urlencode(params)}')
+            result.append(json.loads(read_textfile(filename))['response'] if filename else False)
+        body = json.dumps({'response': result}, ensure_ascii=False).encode('utf-8')
+        self.send_headers(content_length=len(body))
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep console clean, as benchmarks make thousands of requests
+        pass
 
-    def send_headers(self, fail: bool = False):
+    def send_headers(self, fail: bool = False, content_length: int = 0):
         if fail:
             self.send_error(404)
         else:
             self.send_response(requests.codes.ok)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(content_length))
         self.end_headers()
 
     def send(self, filename: str = '', fail: bool = False):
         if not fail:
-            self.send_headers()
-            self.wfile.write(read_textfile(filename).encode('utf-8'))
+            body = read_textfile(filename).encode('utf-8')
         else:
-            self.send_headers()
-            self.wfile.write(read_textfile('responses\\404.json').encode('utf-8'))
+            body = read_textfile('responses\\404.json').encode('utf-8')
+        self.send_headers(content_length=len(body))
+        self.wfile.write(body)
 
 
 def get_free_port():
@@ -61,8 +113,9 @@ def get_free_port():
     return port
 
 
-def start_mock_server(port):
-    mock_server = HTTPServer(('localhost', port), MockServerRequestHandler)
+def start_mock_server(port, delay: float = 0):
+    mock_server = ThreadingHTTPServer(('localhost', port), MockServerRequestHandler)
+    mock_server.delay = delay
     mock_server_thread = Thread(target=mock_server.serve_forever)
     mock_server_thread.setDaemon(True)
     mock_server_thread.start()
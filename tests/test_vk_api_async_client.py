@@ -0,0 +1,26 @@
+import unittest
+from tests.async_mock_server import start_async_mock_server
+from сlasses.vk_api_async_client import AsyncVkApiClient
+
+
+class TestAsyncVkApiClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.mock_server, self.mock_server_port = await start_async_mock_server()
+
+    async def asyncTearDown(self):
+        await self.mock_server.cleanup()
+
+    async def test_request_response(self):
+        mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
+        async with AsyncVkApiClient(token='async', app_id='', user_id='1', debug_mode=True, base_url=mock_users_url,
+                                    requests_per_second=100) as api:
+            assert api.is_initialized
+            assert api.get_fname == 'Павел'
+            assert api.get_lname == 'Дуров'
+            assert len(await api.get_countries()) == 234
+            assert len(await api.search_cities(country_id=1, city_name='Нижн')) == 80
+            assert len(await api.search_users(q='Дуров')) == 16
+            # first page is full, so the rest pages are requested concurrently
+            assert len(await api.search_users(q='babych', page_size=162)) == 324
+            assert len(await api.get_user_photos(owner_id='1', needed_qty=1000)) == 9
@@ -0,0 +1,93 @@
+import unittest
+from сlasses.vk_api_classes import ApiUser, CandidateSet, RATINGS
+
+
+def make_users(vk_ids, last_seen: dict = None) -> list[ApiUser]:
+    last_seen = last_seen or {}
+    return [ApiUser({'id': vk_id, 'last_seen': {'time': last_seen.get(vk_id)}}) for vk_id in vk_ids]
+
+
+def vk_ids(users) -> list[str]:
+    return [user.vk_id if user else None for user in users]
+
+
+class TestCandidateSet(unittest.TestCase):
+
+    def setUp(self):
+        self.users = CandidateSet(make_users(range(1, 6)))
+
+    def test_next_user(self):
+        assert self.users.next_user(RATINGS['new']).vk_id == '1'
+        assert self.users.cursor == 1
+        # peeking doesn't move cursor
+        assert vk_ids(self.users.peek_users(RATINGS['new'], 2)) == ['2', '3']
+        assert self.users.cursor == 1
+        assert vk_ids(self.users.next_user(RATINGS['new']) for _ in range(5)) == ['2', '3', '4', '5', None]
+        assert self.users.cursor == len(self.users)
+        assert self.users.peek_users(RATINGS['new'], 2) == []
+        self.users.rewind()
+        assert self.users.next_user(RATINGS['new']).vk_id == '1'
+
+    def test_set_rating(self):
+        self.users.next_user(RATINGS['new'])
+        self.users.next_user(RATINGS['new'])
+        # user already passed by cursor and user ahead of cursor
+        self.users.set_rating('1', RATINGS['liked'])
+        self.users.set_rating('4', RATINGS['banned'])
+        self.users.set_rating('unknown', RATINGS['liked'])
+        assert vk_ids(self.users.peek_users(RATINGS['new'], 5)) == ['3', '5']
+        assert vk_ids(self.users.next_user(RATINGS['new']) for _ in range(3)) == ['3', '5', None]
+        assert self.users.get_rating('1') == RATINGS['liked']
+        assert self.users.get_rating('4') == RATINGS['banned']
+        assert self.users.get_rating('unknown') is None
+        assert self.users.ratings_counts() == {'new': 3, 'liked': 1, 'disliked': 0, 'banned': 1}
+        self.users.rewind()
+        assert vk_ids(self.users.next_user(RATINGS['liked']) for _ in range(2)) == ['1', None]
+        # rating of user ahead of cursor is changed back
+        self.users.rewind()
+        self.users.set_ratings({'4': RATINGS['new'], '5': RATINGS['disliked']})
+        assert vk_ids(self.users.peek_users(RATINGS['new'], 5)) == ['2', '3', '4']
+
+    def test_repeated_user(self):
+        # the same user is found twice, as search results shift between pages
+        self.users.extend(make_users([2]))
+        self.users.set_rating('2', RATINGS['disliked'])
+        assert self.users.column('rating_id').tolist() == [0, 2, 0, 0, 0, 2]
+        assert vk_ids(self.users.peek_users(RATINGS['disliked'], 5)) == ['2', '2']
+
+    def test_extend_after_end(self):
+        assert vk_ids(self.users.next_user(RATINGS['new']) for _ in range(6)) == ['1', '2', '3', '4', '5', None]
+        self.users.extend(make_users([6, 7]))
+        self.users += make_users([8])
+        self.users.extend(make_users([9]), RATINGS['liked'])
+        assert vk_ids(self.users.next_user(RATINGS['new']) for _ in range(4)) == ['6', '7', '8', None]
+        assert len(self.users) == 9
+        assert self.users.get_rating('9') == RATINGS['liked']
+
+    def test_sorted_by(self):
+        users = CandidateSet(make_users(range(1, 6), last_seen={1: 30, 2: 10, 3: 30, 4: 20}))
+        users.set_rating('3', RATINGS['liked'])
+        assert vk_ids(users.sorted_by('last_seen_time')) == ['5', '2', '4', '1', '3']
+        # equal users keep their order in reverse sorting too
+        ordered = users.sorted_by('last_seen_time', reverse=True)
+        assert vk_ids(ordered) == ['1', '3', '4', '2', '5']
+        # ratings are moved together with users, new set has own cursor and positions
+        assert ordered.column('rating_id').tolist() == [0, 1, 0, 0, 0]
+        assert ordered.next_user(RATINGS['liked']).vk_id == '3'
+        assert ordered.cursor == 2
+        assert users.cursor == 0
+
+    def test_select(self):
+        users = CandidateSet(make_users(range(1, 6), last_seen={1: 30, 2: 10, 3: 30, 4: 20}))
+        users.set_rating('1', RATINGS['banned'])
+        selected = users.select(users.column('last_seen_time') >= 20)
+        assert vk_ids(selected) == ['1', '3', '4']
+        assert selected.get_rating('1') == RATINGS['banned']
+        selected.set_rating('3', RATINGS['liked'])
+        # source set isn't changed
+        assert users.get_rating('3') == RATINGS['new']
+        assert len(users.select(users.column('last_seen_time') > 100)) == 0
+
+    def test_read_only_column(self):
+        with self.assertRaises(ValueError):
+            self.users.column('rating_id')[0] = RATINGS['liked']
@@ -1,7 +1,7 @@
 import unittest
 from unittest import mock
-from tests.mock_server import get_free_port, start_mock_server
-from сlasses.vk_api_client import VkApiClient
+from tests.mock_server import get_free_port, start_mock_server, MockServerRequestHandler
+from сlasses.vk_api_client import VkApiClient, VkGroupClient
 
 
 class TestVkApiClient(unittest.TestCase):
@@ -23,3 +23,34 @@ class TestVkApiClient(unittest.TestCase):
             assert len(self.api.search_cities(country_id=1, city_name='Нижн')) == 80
             assert len(self.api.search_users(q='Дуров')) == 16
             assert len(self.api.get_user_photos(owner_id='1', needed_qty=1000)) == 9
+
+    def test_search_pages(self):
+        mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
+        with mock.patch('сlasses.vk_api_client.VkApiClient.API_BASE_URL', new_callable=mock.PropertyMock) as mock_f:
+            mock_f.return_value = mock_users_url
+            self.api = VkApiClient(token='', app_id='', user_id='1', debug_mode=True)
+            assert self.api.is_initialized
+            # first page is full and 281 users are found, so the second page is requested, mock returns the same 162
+            assert len(self.api.search_users(q='babych', page_size=162)) == 324
+            assert [len(page) for page in self.api.iter_search_users(q='babych', page_size=162)] == [162, 162]
+
+    def test_users_photos_execute(self):
+        mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
+        with mock.patch('сlasses.vk_api_client.VkApiClient.API_BASE_URL', new_callable=mock.PropertyMock) as mock_f:
+            mock_f.return_value = mock_users_url
+            self.api = VkApiClient(token='', app_id='', user_id='1', debug_mode=True)
+            assert self.api.is_initialized
+            with mock.patch.object(MockServerRequestHandler, 'send_execute', autospec=True,
+                                   side_effect=MockServerRequestHandler.send_execute) as send_execute:
+                photos = self.api.get_users_photos([str(owner_id) for owner_id in range(30)], needed_qty=1000)
+            # photos of 30 users are requested by two execute calls, up to 25 photos.get per call
+            calls = [call.args[1].count('API.photos.get(') for call in send_execute.call_args_list]
+            assert calls == [25, 5]
+            assert len(photos) == 30
+            assert all(len(user_photos) == 9 for user_photos in photos.values())
+
+    def test_group_client(self):
+        group = VkGroupClient(token='group', base_url=f'http://localhost:{self.mock_server_port}/', debug_mode=True)
+        assert group.send_message(1, 'Привет', keyboard='{"buttons":[],"one_time":false}').success
+        assert group.set_activity(1).success
+        group.close()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+from сlasses.vk_api_rate_limiter import TokenBucket, get_token_bucket
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        # bucket sees only time of this clock, so timing is exact
+        self.now = 1000.0
+        self.slept = []
+        patcher = mock.patch('сlasses.vk_api_rate_limiter.time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time.monotonic.side_effect = lambda: self.now
+        self.time.sleep.side_effect = self.slept.append
+
+    def test_reserve(self):
+        bucket = TokenBucket(rate=4, burst=2)
+        # burst is taken at once, then every request waits for its token, debt grows with each request
+        assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.25, 0.5]
+        self.now += 0.75
+        # debt is paid, and the next token is just added
+        assert bucket.reserve() == 0
+
+    def test_acquire(self):
+        bucket = TokenBucket(rate=4, burst=1)
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0.25
+        assert bucket.acquire() == 0.5
+        assert self.slept == [0.25, 0.5]
+
+    def test_burst_refill(self):
+        bucket = TokenBucket(rate=4, burst=3)
+        assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+        self.now += 0.375
+        # one and half tokens are added
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0.125
+        self.now += 10
+        # refill is limited by burst
+        assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+        assert bucket.reserve() == 0.25
+
+    def test_metrics(self):
+        bucket = TokenBucket(rate=4, burst=1)
+        assert bucket.metrics == {'requests': 0, 'throttled': 0, 'wait_total': 0.0, 'wait_max': 0.0,
+                                  'wait_avg': 0.0}
+        for _ in range(4):
+            bucket.reserve()
+        assert bucket.metrics == {'requests': 4, 'throttled': 3, 'wait_total': 1.5, 'wait_max': 0.75,
+                                  'wait_avg': 0.375}
+
+    def test_shared_bucket(self):
+        bucket = get_token_bucket('test_shared_bucket', rate=5, burst=2)
+        assert get_token_bucket('test_shared_bucket', rate=5, burst=2) is bucket
+        assert get_token_bucket('test_shared_bucket_other', rate=5, burst=2) is not bucket
+        # one token can't have two limits
+        with self.assertRaises(ValueError):
+            get_token_bucket('test_shared_bucket', rate=10, burst=2)
+        with self.assertRaises(ValueError):
+            get_token_bucket('test_shared_bucket', rate=5, burst=1)
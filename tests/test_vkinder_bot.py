@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+from vk_api.keyboard import VkKeyboard
+from сlasses.vk_api_classes import ApiUser, VKinderClient
+from сlasses.vkinder_bot import VKinderBot, Commands
+from сlasses.vkinder_bot_constants import STATUSES, COMMANDS, KEYBOARDS
+
+UNKNOWN = ['привет', 'москва', '18', 'ё', '']
+WELCOME = {'yes': 'do_start_search_creating', 'new search': 'do_start_search_creating',
+           'show history': 'do_show_search_history', 'liked': 'do_show_rated_users',
+           'disliked': 'do_show_rated_users', 'banned': 'do_show_rated_users', 'no': 'do_say_goodbye'}
+# status -> (handlers of commands, handler of other messages)
+ROUTES = {
+    'has_contacted': (WELCOME, 'do_propose_start_search'),
+    'invited': ({**WELCOME, 'quit': 'do_say_goodbye'}, 'do_inform_about_unknown_command'),
+    'search_history_input_wait': ({'back': 'do_propose_start_search'}, 'on_search_history_choose'),
+    'country_input_wait': ({'back': 'do_start_search_creating'}, 'on_country_name_input'),
+    'country_choose_wait': ({'back': 'do_propose_country_name_input'}, 'on_country_name_choose'),
+    'city_input_wait': ({'back': 'do_propose_start_search', 'country': 'do_propose_country_name_input'},
+                        'do_propose_city_name_choose'),
+    'city_choose_wait': ({'back': 'do_start_search_creating'}, 'on_city_name_choose'),
+    'sex_choose_wait': ({'back': 'do_start_search_creating'}, 'on_sex_choose'),
+    'status_choose_wait': ({'back': 'do_propose_sex_choose'}, 'on_status_choose'),
+    'min_age_input_wait': ({'back': 'do_propose_status_choose'}, 'on_min_age_enter'),
+    'max_age_input_wait': ({'back': 'do_propose_min_age_enter'}, 'on_max_age_enter'),
+    'loading_users': ({}, 'do_inform_about_unknown_command'),
+    'decision_wait': ({'back': 'do_return_from_decision'}, 'on_decision_made'),
+}
+
+
+class Recorder:
+    """
+    Stands for bot: every handler just returns own name
+    """
+
+    def __getattr__(self, name):
+        return lambda *args: name
+
+
+def build_keyboard(params: list = None, one_time: bool = False) -> str:
+    # keyboard as bot built it before caching, for every message
+    if not params:
+        return VkKeyboard().get_empty_keyboard()
+    keyboard = VkKeyboard(one_time=one_time)
+    for param in params:
+        if param is None:
+            keyboard.add_line()
+            continue
+        keyboard.add_button(COMMANDS[param][0][0], color=COMMANDS[param][1])
+    return keyboard.get_keyboard()
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.cmd = Commands(COMMANDS, KEYBOARDS)
+        self.router = VKinderBot.make_router(Recorder())
+
+    def route(self, status: int, msg: str) -> str:
+        return self.router.route(status, self.cmd.find(msg.lower()))(msg, None)
+
+    def test_find(self):
+        for name, command in COMMANDS.items():
+            for synonym in command[0]:
+                assert self.cmd.find(synonym.lower()) == name, synonym
+        for msg in UNKNOWN + ['test']:
+            assert self.cmd.find(msg) is None
+
+    def test_routes(self):
+        assert set(ROUTES) == set(STATUSES)
+        for status_name, (commands, other) in ROUTES.items():
+            status = STATUSES[status_name]
+            # exit works at any page, except the very first message
+            if status_name != 'has_contacted':
+                commands = {'quit': 'do_say_goodbye', **commands}
+            for name, command in COMMANDS.items():
+                for synonym in command[0]:
+                    assert self.route(status, synonym) == commands.get(name, other), (status_name, synonym)
+            for msg in UNKNOWN:
+                assert self.route(status, msg) == other, (status_name, msg)
+
+    def test_handle_message(self):
+        bot = VKinderBot.__new__(VKinderBot)
+        bot.debug_mode = False
+        bot.cmd = self.cmd
+        client = VKinderClient(ApiUser({'id': 1}))
+        client.status = STATUSES['decision_wait']
+        bot.get_client = mock.Mock(return_value=client)
+        bot.do_test_search = mock.Mock()
+        bot.router = mock.Mock()
+        # messages are recognized in any case
+        bot.handle_message('1', '↩ НАЗАД')
+        bot.router.route.assert_called_once_with(STATUSES['decision_wait'], 'back')
+        bot.router.route.return_value.assert_called_once_with('↩ назад', client)
+        # imitation of search works at any page
+        bot.handle_message('1', 'Test')
+        bot.do_test_search.assert_called_once_with(client)
+        assert bot.router.route.call_count == 1
+
+
+class TestKeyboards(unittest.TestCase):
+
+    def setUp(self):
+        self.cmd = Commands(COMMANDS, KEYBOARDS)
+
+    def test_known_layouts(self):
+        for params in KEYBOARDS:
+            for one_time in (False, True):
+                keyboard = self.cmd.kb(params, one_time)
+                assert keyboard == build_keyboard(params, one_time), (params, one_time)
+                # the same string is returned, nothing is built again
+                assert self.cmd.kb(list(params), one_time) is keyboard
+        assert self.cmd.kb() == self.cmd.kb(None, True) == build_keyboard()
+
+    def test_unknown_layout(self):
+        params = ['liked', None, 'quit']
+        with mock.patch.object(self.cmd, 'make_keyboard', wraps=self.cmd.make_keyboard) as make_keyboard:
+            keyboard = self.cmd.kb(params)
+            assert self.cmd.kb(params) is keyboard
+            make_keyboard.assert_called_once_with(params, False)
+        assert keyboard == build_keyboard(params)
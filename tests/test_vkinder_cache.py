@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+from сlasses.vk_api_classes import VKinderSearch, get_search_key
+from сlasses.vkinder_cache import TTLCache
+
+
+def make_search(city_id, sex_id, status_id, min_age, max_age) -> VKinderSearch:
+    search = VKinderSearch()
+    search.city_id, search.sex_id, search.status_id, search.min_age, search.max_age = \
+        city_id, sex_id, status_id, min_age, max_age
+    return search
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        # cache sees only time of this clock
+        self.now = 1000.0
+        patcher = mock.patch('сlasses.vkinder_cache.time')
+        patcher.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def test_ttl_expiry(self):
+        cache = TTLCache(ttl=60)
+        cache.put('a', 1)
+        self.now += 30
+        cache.put('b', 2)
+        self.now += 30
+        assert cache.get('a') == 1
+        self.now += 1
+        # reading doesn't prolong life of entry
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        assert len(cache) == 1
+        # put of existing key starts its life again
+        self.now += 20
+        cache.put('b', 3)
+        self.now += 59
+        assert cache.get('b') == 3
+        assert cache.metrics == {'hits': 3, 'misses': 1, 'hit_ratio': 0.75, 'evictions': 0, 'entries': 1,
+                                 'weight': 1}
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_weight=3)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, key)
+        # reading makes entry the most recently used one
+        assert cache.get('a') == 'a'
+        cache.put('d', 'd')
+        assert cache.get('b') is None
+        cache.put('e', 'e')
+        assert cache.get('c') is None
+        assert [cache.get(key) for key in ('a', 'd', 'e')] == ['a', 'd', 'e']
+        assert cache.metrics['evictions'] == 2
+
+    def test_weight_eviction(self):
+        cache = TTLCache(max_weight=10, weigher=len)
+        cache.put('a', [1] * 4)
+        cache.put('b', [1] * 4)
+        cache.put('c', [1] * 4)
+        assert cache.get('a') is None
+        assert cache.metrics['weight'] == 8
+        # value heavier than whole cache isn't stored, previous value of key is removed
+        cache.put('b', [1] * 11)
+        assert cache.get('b') is None
+        assert cache.metrics['weight'] == 4
+        assert cache.pop('c') == [1] * 4
+        assert cache.pop('c') is None
+        assert cache.metrics['weight'] == 0
+
+    def test_search_key(self):
+        cache = TTLCache()
+        # the same search of other client, parameters of which came as strings from messages
+        cache.put(get_search_key(make_search(1, 2, 6, 20, 30)), ['found'])
+        assert cache.get(get_search_key(make_search('1', '2', '6', '20', '30'))) == ['found']
+        assert cache.get(get_search_key(make_search(1, 2, 6, 20, 31))) is None
+        assert get_search_key(make_search(None, 1, None, 18, None)) == (None, 1, None, 18, None)
@@ -0,0 +1,109 @@
+import unittest
+from unittest import mock
+from сlasses.vk_api_classes import ApiCity, ApiCountry
+from сlasses.vkinder_catalog import CatalogIndex, VKinderCatalog
+
+CITIES = ['Москва', 'Нижний Новгород', 'Великий Новгород', 'Орёл', 'Новосибирск', 'Петропавловск-Камчатский']
+
+
+def make_cities(titles: list[str]) -> list[ApiCity]:
+    return [ApiCity({'id': city_id, 'title': title}) for city_id, title in enumerate(titles, 1)]
+
+
+def titles(items: list) -> list[str]:
+    return [item.title for item in items]
+
+
+class TestCatalogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CatalogIndex(make_cities(CITIES))
+
+    def test_prefix_search(self):
+        # beginning of any word, results are in order of items
+        assert titles(self.index.prefix_search('нов')) == ['Нижний Новгород', 'Великий Новгород', 'Новосибирск']
+        assert titles(self.index.prefix_search('Нижний Н')) == ['Нижний Новгород']
+        assert titles(self.index.prefix_search('камч')) == ['Петропавловск-Камчатский']
+        assert self.index.prefix_search('город') == []
+
+    def test_substring_search(self):
+        assert titles(self.index.substring_search('город')) == ['Нижний Новгород', 'Великий Новгород']
+        assert titles(self.index.substring_search('ск')) == ['Москва', 'Новосибирск', 'Петропавловск-Камчатский']
+        assert self.index.substring_search('казань') == []
+
+    def test_normalization(self):
+        for query in ('МОСК', 'мОсК'):
+            assert titles(self.index.prefix_search(query)) == ['Москва']
+        # ё and е are equal in titles and in queries
+        for query in ('орел', 'Орёл', 'ОРЁ'):
+            assert titles(self.index.prefix_search(query)) == ['Орёл']
+        assert titles(self.index.substring_search('рел')) == ['Орёл']
+        assert titles(CatalogIndex(make_cities(['Орел'])).substring_search('рёл')) == ['Орел']
+
+
+class TestVKinderCatalog(unittest.TestCase):
+
+    def setUp(self):
+        # catalog sees only time of this clock
+        self.now = 1000.0
+        patcher = mock.patch('сlasses.vkinder_catalog.time')
+        patcher.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+        self.vk = mock.Mock()
+        self.db = mock.Mock()
+        self.catalog = VKinderCatalog(self.vk, self.db, refresh_interval=3600)
+
+    def test_countries(self):
+        countries = [ApiCountry({'id': 1, 'title': 'Россия'}), ApiCountry({'id': 2, 'title': 'Украина'})]
+        # empty catalog in DB, VK is requested and its answer is saved
+        self.db.load_countries.return_value = None
+        self.vk.get_countries.return_value = countries
+        assert titles(self.catalog.search_countries(' росс ')) == ['Россия']
+        self.db.save_countries.assert_called_once_with(countries)
+        # the next lookups are answered from memory
+        assert titles(self.catalog.search_countries('ина')) == ['Украина']
+        assert self.db.load_countries.call_count == 1
+        assert self.vk.get_countries.call_count == 1
+        # stale catalog is reloaded from DB
+        self.now += 3601
+        self.db.load_countries.return_value = countries[:1]
+        assert self.catalog.search_countries('ина') == []
+        assert self.db.load_countries.call_count == 2
+        assert self.vk.get_countries.call_count == 1
+
+    def test_countries_failure(self):
+        # failed request isn't kept, so the next lookup requests VK again
+        self.db.load_countries.return_value = None
+        self.vk.get_countries.return_value = []
+        assert self.catalog.search_countries('россия') == []
+        self.vk.get_countries.return_value = [ApiCountry({'id': 1, 'title': 'Россия'})]
+        assert titles(self.catalog.search_countries('россия')) == ['Россия']
+        self.db.save_countries.assert_called_once()
+
+    def test_cities(self):
+        self.db.load_cities_queries.return_value = {}
+        self.vk.search_cities.return_value = make_cities(['Нижний Новгород', 'Нижнекамск'])
+        assert titles(self.catalog.search_cities(1, 'Нижн')) == ['Нижний Новгород', 'Нижнекамск']
+        self.vk.search_cities.assert_called_once_with(country_id=1, city_name='нижн')
+        self.db.save_cities_query.assert_called_once()
+        # longer query is answered locally by results of its beginning, case doesn't matter
+        assert titles(self.catalog.search_cities(1, 'НИЖНЕК')) == ['Нижнекамск']
+        assert self.vk.search_cities.call_count == 1
+        # other country isn't answered by cities of the first one
+        self.vk.search_cities.return_value = []
+        assert self.catalog.search_cities(2, 'нижнек') == []
+        assert self.vk.search_cities.call_count == 2
+
+    def test_cities_from_db(self):
+        # queries, which were saved with ё, are found by any spelling
+        self.db.load_cities_queries.return_value = {'орё': make_cities(['Орёл', 'Орёлково'])}
+        assert titles(self.catalog.search_cities(1, 'Орел')) == ['Орёл', 'Орёлково']
+        assert titles(self.catalog.search_cities(1, 'орёлк')) == ['Орёлково']
+        self.vk.search_cities.assert_not_called()
+        # stale queries are reloaded from DB, VK is requested as there are no fresh queries
+        self.now += 3601
+        self.db.load_cities_queries.return_value = {}
+        self.vk.search_cities.return_value = make_cities(['Орёл'])
+        assert titles(self.catalog.search_cities(1, 'орел')) == ['Орёл']
+        assert self.db.load_cities_queries.call_count == 2
+        self.vk.search_cities.assert_called_once_with(country_id=1, city_name='орел')
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from сlasses.vk_api_classes import ApiUser, VKinderClient
+from сlasses.vkinder_bot import VKinderBot
+from сlasses.vkinder_bot_constants import STATUSES
+from сlasses.vkinder_clients_pool import ClientsPool
+from сlasses.vkinder_dispatcher import EventDispatcher
+from сlasses.vkinder_sessions import FileSessionStore
+
+
+class TestClientsPool(unittest.TestCase):
+
+    def setUp(self):
+        self.evicted = []
+        self.pool = ClientsPool(self.evict, idle_timeout=60, max_clients=3, max_weight=25, sweep_interval=3600)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def evict(self, vk_id: str, idle: bool):
+        self.evicted.append((vk_id, idle))
+        self.pool.pop(vk_id)
+
+    def make_client(self, vk_id: int, found_users: int = 0, idle_seconds: int = 0) -> VKinderClient:
+        client = VKinderClient(ApiUser({'id': vk_id}))
+        client.found_users = [ApiUser({'id': user_id}) for user_id in range(found_users)]
+        client.last_contact = datetime.now() - timedelta(seconds=idle_seconds)
+        return client
+
+    def test_idle_eviction(self):
+        self.pool.put(self.make_client(1, idle_seconds=120))
+        active = self.make_client(2, idle_seconds=120)
+        self.pool.put(active)
+        # client became active after it was put to pool
+        active.last_contact = datetime.now()
+        self.pool.sweep()
+        assert self.evicted == [('1', True)]
+        assert self.pool.get('2') is active
+
+    def test_lru_eviction(self):
+        for vk_id in range(1, 5):
+            self.pool.put(self.make_client(vk_id, found_users=10 if vk_id == 4 else 0))
+        self.pool.get('1')
+        self.pool.sweep()
+        assert self.evicted == [('2', False)]
+        # after eviction of the 3rd client quantity of clients is within limit, but their weight isn't
+        self.pool.put(self.make_client(5, found_users=20))
+        self.pool.sweep()
+        assert self.evicted == [('2', False), ('3', False), ('4', False)]
+        assert self.pool.metrics == {'size': 2, 'weight': 20, 'evicting': 0, 'evicted_idle': 0, 'evicted_lru': 3}
+
+
+class TestClientsEviction(unittest.TestCase):
+    """
+    Eviction of clients by sweeper thread of pool to session store of bot and their restoring
+    """
+
+    def setUp(self):
+        # bot without connections to VK and DB, only parts which are needed for eviction
+        self.bot = VKinderBot.__new__(VKinderBot)
+        self.bot.debug_mode = False
+        self.bot.client_activity_timeout = 3600
+        self.bot.dispatcher = EventDispatcher(workers=2)
+        self.bot.sessions = FileSessionStore(os.path.join(tempfile.mkdtemp(), 'sessions'))
+        self.bot.prefetcher = mock.Mock()
+        self.bot.profiles = mock.Mock()
+        self.bot.db = mock.Mock()
+        self.bot.db.load_users_by_vk_ids = lambda vk_ids: {vk_id: ApiUser({'id': vk_id}) for vk_id in vk_ids}
+        self.bot.clients_pool = ClientsPool(self.bot.request_eviction, idle_timeout=3600, max_clients=1,
+                                            max_weight=15, sweep_interval=0.05)
+
+    def tearDown(self):
+        self.bot.clients_pool.shutdown()
+        self.bot.dispatcher.shutdown()
+        self.bot.sessions.close()
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, self.bot.clients_pool.metrics
+            time.sleep(0.01)
+
+    def make_client(self, vk_id: int, found_users: int) -> VKinderClient:
+        client = VKinderClient(ApiUser({'id': vk_id, 'first_name': 'Павел'}))
+        client.found_users = [ApiUser({'id': user_id}) for user_id in range(100, 100 + found_users)]
+        client.active_user = client.get_next_user()
+        client.status = STATUSES['decision_wait']
+        return client
+
+    def test_evict_and_restore(self):
+        pool = self.bot.clients_pool
+        pool.put(self.make_client(1, found_users=10))
+        pool.put(self.make_client(2, found_users=10))
+        # the least recently used client is evicted, as pool exceeds limits of clients and found users
+        self.wait_for(lambda: pool.metrics['evicted_lru'] == 1)
+        assert pool.get('1') is None
+        assert pool.metrics['weight'] == 10
+        restored = self.bot.get_client('1')
+        assert pool.get('1') is restored
+        assert restored.fname == 'Павел'
+        assert restored.status == STATUSES['decision_wait']
+        assert len(restored.found_users) == 10
+        assert restored.active_user.vk_id == '100'
+        assert restored.get_next_user().vk_id == '101'
+
+    def test_failed_writing(self):
+        pool = self.bot.clients_pool
+        with mock.patch.object(self.bot.sessions, 'write_states', side_effect=OSError('disk is full')):
+            client = self.make_client(1, found_users=20)
+            pool.put(client)
+            self.wait_for(lambda: self.bot.sessions.get('1') is not None)
+            # client whose session isn't written stays in memory
+            time.sleep(0.2)
+            assert pool.get('1', touch=False) is client
+            assert pool.metrics['evicted_lru'] == 0
+        self.wait_for(lambda: pool.get('1', touch=False) is None)
+        assert self.bot.get_client('1').active_user.vk_id == '100'
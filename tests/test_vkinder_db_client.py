@@ -2,9 +2,14 @@ import unittest
 from random import randrange
 from unittest import mock
 from tests.mock_server import get_free_port, start_mock_server
-from сlasses.vk_api_classes import VKinderClient
+from сlasses.vk_api_classes import VKinderClient, ApiUser, ApiPhoto, CandidateSet, RATINGS
 from сlasses.vk_api_client import VkApiClient
+from сlasses.vkinder_bot import VKinderBot
+from сlasses.vkinder_cache import TTLCache
 from сlasses.vkinder_db_client import VKinderDb
+from сlasses.vkinder_db_migrations import MIGRATIONS, migrate
+from сlasses.vkinder_prefetcher import PhotoPrefetcher
+from сlasses.vkinder_profiles import ClientsProfiles
 
 
 class TestVKinderDb(unittest.TestCase):
@@ -15,6 +20,13 @@ class TestVKinderDb(unittest.TestCase):
         cls.mock_server_port = get_free_port()
         start_mock_server(cls.mock_server_port)
 
+    def test_migrations(self):
+        assert self.db.is_initialized
+        assert self.db.schema_version == MIGRATIONS[-1].version
+        # already applied migrations are skipped
+        with self.db.session_scope() as session:
+            assert migrate(session.bind) == MIGRATIONS[-1].version
+
     def test_client_save_load(self):
         assert self.db.is_initialized
         mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
@@ -34,6 +46,21 @@ class TestVKinderDb(unittest.TestCase):
             assert client.fname == 'Павел'
             assert client.lname == 'Дуров'
 
+    def test_client_profiles(self):
+        mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
+        with mock.patch('сlasses.vk_api_client.VkApiClient.API_BASE_URL', new_callable=mock.PropertyMock) as mock_f:
+            mock_f.return_value = mock_users_url
+            api = VkApiClient(token='', app_id='', user_id='1', debug_mode=True)
+            profiles = ClientsProfiles(api, self.db, lambda vk_id, user: None, max_age=3600)
+            client = profiles.get('1')
+            assert client.db_id
+            # returning client is taken from memory, then from DB without requests to VK
+            assert profiles.get('1').db_id == client.db_id
+            profiles = ClientsProfiles(api, self.db, lambda vk_id, user: None, max_age=3600)
+            assert profiles.get('1').db_id == client.db_id
+            assert profiles.metrics['vk'] == 0
+            profiles.shutdown()
+
     def test_users_save_load(self):
         mock_users_url = 'http://localhost:{port}/'.format(port=self.mock_server_port)
         with mock.patch('сlasses.vk_api_client.VkApiClient.API_BASE_URL', new_callable=mock.PropertyMock) as mock_f:
@@ -80,6 +107,132 @@ class TestVKinderDb(unittest.TestCase):
                 self.db.save_users(client_1)
                 self.db.save_users(client_2)
 
-
-
-
+    @staticmethod
+    def rate(db: VKinderDb, client: VKinderClient, vk_id: str, rating_id: int):
+        client.active_user = next(user for user in client.found_users if user.vk_id == vk_id)
+        client.rate_active_user(rating_id)
+        db.save_user_rating(client)
+
+    @staticmethod
+    def save_found_users(db: VKinderDb, client: VKinderClient, users: list[ApiUser]):
+        db.save_client(client)
+        db.save_search(client)
+        client.found_users = users
+        db.save_users(client)
+
+    def test_users_ratings_merge(self):
+        client = VKinderClient(ApiUser({'id': 'ratings_test', 'first_name': 'Client'}))
+        other_client = VKinderClient(ApiUser({'id': 'ratings_test_other', 'first_name': 'Client'}))
+        users = [ApiUser({'id': f'ratings_test_{user_id}', 'first_name': 'User'}) for user_id in range(10)]
+        self.save_found_users(self.db, client, users)
+        self.save_found_users(self.db, other_client, users)
+        # ratings of client are written, rating of other client is written to the same users too
+        self.rate(self.db, client, 'ratings_test_2', RATINGS['liked'])
+        self.rate(self.db, client, 'ratings_test_5', RATINGS['banned'])
+        self.rate(self.db, other_client, 'ratings_test_3', RATINGS['liked'])
+        assert self.db.flush()
+        # this rating is still buffered
+        self.rate(self.db, client, 'ratings_test_7', RATINGS['disliked'])
+
+        client.found_users = CandidateSet(users)
+        self.db.load_users_ratings_from_db(client)
+        expected = {'ratings_test_2': RATINGS['liked'], 'ratings_test_5': RATINGS['banned'],
+                    'ratings_test_7': RATINGS['disliked']}
+        assert {user.vk_id: client.found_users.get_rating(user.vk_id) for user in users} == \
+               {user.vk_id: expected.get(user.vk_id, RATINGS['new']) for user in users}
+        # ratings of other users are not touched, when part of found users is synced
+        client.found_users = CandidateSet(users)
+        self.db.load_users_ratings_from_db(client, users[:6])
+        assert client.found_users.get_rating('ratings_test_5') == RATINGS['banned']
+        assert client.found_users.get_rating('ratings_test_7') == RATINGS['new']
+
+    @staticmethod
+    def make_photos(vk_id: str, photos_ids: list[int]) -> list[ApiPhoto]:
+        return [ApiPhoto({'url': f'https://vk.com/photo{vk_id}_{photo_id}', 'likes_count': photo_id,
+                          'comments_count': 0, 'reposts_count': 0, 'owner_id': vk_id, 'id': photo_id})
+                for photo_id in photos_ids]
+
+    @staticmethod
+    def load_ratings(db: VKinderDb, client: VKinderClient, users: list[ApiUser]) -> dict[str, int]:
+        client.found_users = CandidateSet(users)
+        db.load_users_ratings_from_db(client)
+        return {user.vk_id: client.found_users.get_rating(user.vk_id) for user in users
+                if client.found_users.get_rating(user.vk_id) != RATINGS['new']}
+
+    def test_write_behind(self):
+        # writer thread doesn't flush buffer by itself during test
+        db = VKinderDb('test', 'test', 'test', write_behind_size=1000, write_behind_interval=3600, debug_mode=True)
+        # ratings of previous runs don't interfere
+        prefix = f'write_behind_{randrange(10 ** 6)}'
+        client = VKinderClient(ApiUser({'id': prefix, 'first_name': 'Client'}))
+        other_client = VKinderClient(ApiUser({'id': f'{prefix}_other', 'first_name': 'Client'}))
+        users = [ApiUser({'id': f'{prefix}_{user_id}', 'first_name': 'User'}) for user_id in range(3)]
+        self.save_found_users(db, client, users)
+        self.save_found_users(db, other_client, users)
+        db.flush()
+
+        # writes of the same key are coalesced, the latest value replaces pending one
+        self.rate(db, client, f'{prefix}_0', RATINGS['liked'])
+        self.rate(db, client, f'{prefix}_0', RATINGS['banned'])
+        db.save_photos(f'{prefix}_0', self.make_photos(f'{prefix}_0', [1, 2, 3]))
+        db.save_photos(f'{prefix}_0', self.make_photos(f'{prefix}_0', [2, 3]))
+        self.rate(db, other_client, f'{prefix}_1', RATINGS['liked'])
+        assert db.pending_writes == 3
+        # buffered writes are visible before they are written
+        assert self.load_ratings(db, client, users) == {f'{prefix}_0': RATINGS['banned']}
+        assert [photo.id for photo in db.load_photos(f'{prefix}_0', 3600)] == [2, 3]
+
+        # only changes of given client are written, photos belong to no client and wait for full flush
+        assert db.flush(client.db_id)
+        assert db.pending_writes == 2
+        assert db.flush()
+        assert db.pending_writes == 0
+        assert not db.flush()
+        assert self.load_ratings(db, client, users) == {f'{prefix}_0': RATINGS['banned']}
+        assert self.load_ratings(db, other_client, users) == {f'{prefix}_1': RATINGS['liked']}
+        # photos absent in the latest list are deleted, the most popular photo is the first one
+        assert [photo.id for photo in db.load_photos(f'{prefix}_0', 3600)] == ['3', '2']
+
+        # newer batch replaces written value
+        self.rate(db, client, f'{prefix}_0', RATINGS['liked'])
+        db.flush()
+        self.rate(db, client, f'{prefix}_0', RATINGS['disliked'])
+        db.flush()
+        assert self.load_ratings(db, client, users) == {f'{prefix}_0': RATINGS['disliked']}
+
+        # buffer is written on shutdown
+        client.city_name = 'Москва'
+        db.save_client(client)
+        self.rate(db, client, f'{prefix}_2', RATINGS['liked'])
+        db.save_photos(f'{prefix}_2', self.make_photos(f'{prefix}_2', [7]))
+        assert db.pending_writes == 3
+        db.close()
+        assert self.db.load_client_from_db(prefix).city_name == 'Москва'
+        assert self.load_ratings(self.db, client, users) == {f'{prefix}_0': RATINGS['disliked'],
+                                                             f'{prefix}_2': RATINGS['liked']}
+        assert [photo.id for photo in self.db.load_photos(f'{prefix}_2', 3600)] == ['7']
+
+    def test_prefetch_connections(self):
+        # pool has connections for prefetcher threads only, connection kept after loading would block the next ones
+        workers = 2
+        db = VKinderDb('test', 'test', 'test', pool_size=workers, max_overflow=0, pool_timeout=1, debug_mode=True)
+        bot = VKinderBot.__new__(VKinderBot)
+        bot.db = db
+        bot.photos_max_age = 3600
+        bot.photos_cache = TTLCache(ttl=3600)
+        bot.vk_personal = mock.Mock()
+        bot.vk_personal.get_users_photos.return_value = {}
+        prefetcher = PhotoPrefetcher(bot.load_users_photos, lookahead=2, workers=workers, max_pending=100)
+        prefix = f'prefetch_{randrange(10 ** 6)}'
+        clients = []
+        for client_id in range(10):
+            client = VKinderClient(ApiUser({'id': f'{prefix}_{client_id}', 'first_name': 'Client'}))
+            client.found_users = [ApiUser({'id': f'{prefix}_{client_id}_{user_id}'}) for user_id in range(2)]
+            prefetcher.schedule(client)
+            clients.append(client)
+        prefetcher.shutdown()
+        # every loading is finished, users without photos in DB and VK get empty lists
+        assert all(prefetcher.pop(client, client.peek_next_users(1)[0]) == [] for client in clients)
+        assert db.pool_metrics['timeouts'] == 0
+        assert db.pool_metrics['in_use'] == 0
+        db.close()
@@ -0,0 +1,137 @@
+import unittest
+from sqlalchemy import event
+from сlasses.vk_api_classes import ApiUser
+from сlasses.vkinder_db_classes import Clients, Users, ClientsUsers, Photos, Searches, SearchesUsers
+from сlasses.vkinder_db_client import VKinderDb
+
+SEED_CLIENTS = 50
+SEED_USERS = 2000
+
+
+class TestVKinderDbIndexes(unittest.TestCase):
+    """
+    Checks by EXPLAIN of PostgreSQL, that hot queries of VKinderDb use indexes on seeded database.
+    Statements are captured while methods of VKinderDb run, so exactly the production queries are explained
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db = VKinderDb('test', 'test', 'test', debug_mode=True)
+        with cls.db.session_scope() as session:
+            cls.engine = session.bind
+            # rows left by interrupted run
+            cls.cleanup(session)
+            cls.seed(session)
+        cls.client = cls.db.load_client_from_db('index_test_1')
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.db.session_scope() as session:
+            cls.cleanup(session)
+        cls.db.close()
+
+    @staticmethod
+    def seed(session):
+        clients = [{'vk_id': f'index_test_{client_id}', 'fname': 'Client'} for client_id in range(SEED_CLIENTS)]
+        session.execute(Clients.__table__.insert(), clients)
+        users = [{'vk_id': f'index_test_{user_id}', 'fname': 'User'} for user_id in range(SEED_USERS)]
+        session.execute(Users.__table__.insert(), users)
+        clients_ids = [row[0] for row in session.query(Clients.id).filter(Clients.vk_id.like('index_test_%'))]
+        users_ids = [row[0] for row in session.query(Users.id).filter(Users.vk_id.like('index_test_%'))]
+        session.execute(Searches.__table__.insert(), [{'client_id': client_id}
+                                                      for client_id in clients_ids for _ in range(10)])
+        searches_ids = [row[0] for row in session.query(Searches.id).filter(Searches.client_id.in_(clients_ids))]
+        session.execute(SearchesUsers.__table__.insert(), [{'search_id': search_id, 'user_id': user_id}
+                                                           for search_id in searches_ids[:20] for user_id in users_ids])
+        session.execute(ClientsUsers.__table__.insert(), [{'client_id': client_id, 'user_id': user_id,
+                                                           'rating_id': user_id % 4}
+                                                          for client_id in clients_ids for user_id in users_ids[:200]])
+        session.execute(Photos.__table__.insert(), [{'owner_id': user_id, 'photo_id': str(photo_id), 'url': ''}
+                                                    for user_id in users_ids for photo_id in range(3)])
+        session.commit()
+        session.execute('ANALYZE')
+        session.commit()
+
+    @staticmethod
+    def cleanup(session):
+        """
+        Deletes seeded rows, relations of clients and users are deleted by cascade
+        """
+        clients_ids = session.query(Clients.id).filter(Clients.vk_id.like('index_test_%')).subquery()
+        users_ids = session.query(Users.id).filter(Users.vk_id.like('index_test_%')).subquery()
+        session.query(Photos).filter(Photos.owner_id.in_(users_ids)).delete(synchronize_session=False)
+        session.query(Searches).filter(Searches.client_id.in_(clients_ids)).delete(synchronize_session=False)
+        session.query(Users).filter(Users.vk_id.like('index_test_%')).delete(synchronize_session=False)
+        session.query(Clients).filter(Clients.vk_id.like('index_test_%')).delete(synchronize_session=False)
+        session.commit()
+
+    def capture(self, call) -> list[tuple[str, dict]]:
+        """
+        Runs call of VKinderDb methods and returns SELECT statements, which were sent to DB, with their parameters
+        """
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(self.engine, 'before_cursor_execute', on_execute)
+        try:
+            call()
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', on_execute)
+        return statements
+
+    def explain(self, statement: str, parameters: dict) -> str:
+        with self.db.session_scope() as session:
+            cursor = session.connection().connection.cursor()
+            # on small tables planner might prefer sequential scan even if suitable index exists,
+            # setting is local to transaction, so pooled connection isn't affected
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {statement}', parameters)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            session.rollback()
+        return plan
+
+    def assert_index_scan(self, call, table: str, indexes: set[str]):
+        """
+        Checks that every statement of call, which reads given table, reads it by one of given indexes
+        """
+        statements = [(statement, parameters) for statement, parameters in self.capture(call)
+                      if f'FROM {table}' in statement or f'JOIN {table}' in statement]
+        assert statements, f'no statements on {table}'
+        for statement, parameters in statements:
+            plan = self.explain(statement, parameters)
+            assert f'Seq Scan on {table}' not in plan, plan
+            assert any(f'using {index} on {table}' in plan or f'Bitmap Index Scan on {index}' in plan
+                       for index in indexes), plan
+
+    def test_searches_history(self):
+        self.assert_index_scan(lambda: self.db.load_searches(self.client), 'searches',
+                               {'ix_searches_client_id_updated'})
+
+    def test_rated_users(self):
+        self.client.rating_filter = 1
+        self.assert_index_scan(lambda: self.db.load_users_from_db(self.client), 'clients_users',
+                               {'ix_clients_users_client_id_rating_id'})
+
+    def test_users_ratings(self):
+        # users are selected by array parameter, ratings of client by its id and users ids
+        self.client.found_users = [ApiUser({'id': f'index_test_{user_id}'}) for user_id in range(0, 400, 2)]
+        self.assert_index_scan(lambda: self.db.load_users_ratings_from_db(self.client), 'users',
+                               {'users_vk_id_key'})
+        self.assert_index_scan(lambda: self.db.load_users_ratings_from_db(self.client), 'clients_users',
+                               {'clients_users_pkey', 'ix_clients_users_client_id_rating_id'})
+
+    def test_user_photos(self):
+        self.assert_index_scan(lambda: self.db.load_photos('index_test_1', 3600), 'photos',
+                               {'ix_photos_owner_id_photo_id'})
+        # writing of buffered photos reads existing photos of users
+        photos = self.db.load_photos('index_test_2', 3600)
+        assert photos
+
+        def save():
+            self.db.save_photos('index_test_2', photos)
+            self.db.flush()
+
+        self.assert_index_scan(save, 'photos', {'ix_photos_owner_id_photo_id'})
@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+from сlasses.vkinder_dispatcher import EventDispatcher
+
+
+class TestEventDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = EventDispatcher(workers=4)
+        self.lock = threading.Lock()
+        self.processed = []
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def record(self, key: str, value, delay: float = 0):
+        time.sleep(delay)
+        with self.lock:
+            self.processed.append((key, value))
+
+    def test_same_key_order(self):
+        # the first event is the slowest one, but the rest events of the same key wait for it
+        for value in range(20):
+            self.dispatcher.submit('1', self.record, '1', value, 0.05 if value == 0 else 0)
+        self.dispatcher.shutdown()
+        assert self.processed == [('1', value) for value in range(20)]
+        assert self.dispatcher.pending == 0
+
+    def test_different_keys_concurrency(self):
+        # event of slow client is still processed, while events of other clients are already done
+        released = threading.Event()
+        self.dispatcher.submit('slow', released.wait, 5)
+        for key in ('1', '2', '3'):
+            self.dispatcher.submit(key, self.record, key, 0)
+        deadline = time.monotonic() + 5
+        while len(self.processed) < 3:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert not released.is_set()
+        released.set()
+        assert sorted(self.processed) == [('1', 0), ('2', 0), ('3', 0)]
+
+    def test_exception_isolation(self):
+        def fail():
+            raise ValueError('broken event')
+
+        self.dispatcher.submit('1', self.record, '1', 0)
+        self.dispatcher.submit('1', fail)
+        self.dispatcher.submit('2', fail)
+        self.dispatcher.submit('1', self.record, '1', 1)
+        self.dispatcher.submit('2', self.record, '2', 0)
+        self.dispatcher.shutdown()
+        assert sorted(self.processed) == [('1', 0), ('1', 1), ('2', 0)]
+
+    def test_submit_after_shutdown(self):
+        self.dispatcher.submit('1', self.record, '1', 0)
+        self.dispatcher.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.dispatcher.submit('1', self.record, '1', 1)
+        assert self.processed == [('1', 0)]
+        assert self.dispatcher.pending == 0
+
@@ -0,0 +1,134 @@
+import threading
+import unittest
+from unittest import mock
+from сlasses.vk_api_classes import ApiUser, ApiPhoto, VKinderClient
+from сlasses.vkinder_bot import VKinderBot
+from сlasses.vkinder_cache import TTLCache
+from сlasses.vkinder_prefetcher import PhotoPrefetcher
+
+
+def make_client(vk_id: int, users_ids) -> VKinderClient:
+    client = VKinderClient(ApiUser({'id': vk_id}))
+    client.found_users = [ApiUser({'id': user_id}) for user_id in users_ids]
+    return client
+
+
+def make_photos(users: list[ApiUser]) -> dict[str, list[ApiPhoto]]:
+    return {user.vk_id: [ApiPhoto({'owner_id': user.vk_id, 'id': 1})] for user in users}
+
+
+class TestPhotoPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = mock.Mock(side_effect=make_photos)
+        self.prefetcher = PhotoPrefetcher(self.loader, lookahead=2, workers=1, max_pending=2)
+        self.addCleanup(self.prefetcher.shutdown)
+
+    def block_worker(self) -> threading.Event:
+        """
+        Occupies the only worker, so loadings scheduled after it wait in queue until event is set
+        """
+        event = threading.Event()
+        started = threading.Event()
+
+        def load(users):
+            started.set()
+            event.wait()
+            return make_photos(users)
+
+        self.loader.side_effect = load
+        self.prefetcher.schedule(make_client(1, [10]))
+        started.wait()
+        self.loader.side_effect = make_photos
+        return event
+
+    def loaded(self) -> list[list[str]]:
+        return [[user.vk_id for user in call.args[0]] for call in self.loader.call_args_list]
+
+    def test_prefetch(self):
+        client = make_client(2, [20, 21, 22])
+        self.prefetcher.schedule(client)
+        # already scheduled users aren't loaded again
+        self.prefetcher.schedule(client)
+        # loadings are finished, as not started ones are cancelled by pop
+        self.prefetcher.shutdown()
+        first, second, third = client.peek_next_users(3)
+        assert self.prefetcher.pop(client, first)[0].owner_id == '20'
+        assert self.prefetcher.pop(client, second)[0].owner_id == '21'
+        # next candidates are requested together
+        assert self.loaded() == [['20', '21']]
+        # photos are given once, not prefetched user is loaded by bot itself
+        assert self.prefetcher.pop(client, first) is None
+        assert self.prefetcher.pop(client, third) is None
+
+    def test_max_pending(self):
+        event = self.block_worker()
+        client = make_client(2, [20, 21])
+        self.prefetcher.schedule(client)
+        first, second = client.peek_next_users(2)
+        # one place of limit is taken by blocked loading
+        assert self.prefetcher.pop(client, second) is None
+        event.set()
+        self.prefetcher.shutdown()
+        assert self.prefetcher.pop(client, first)[0].owner_id == '20'
+        assert self.loaded() == [['10'], ['20']]
+
+    def test_cancel(self):
+        event = self.block_worker()
+        client = make_client(2, [20])
+        self.prefetcher.schedule(client)
+        # found users are reset while loading waits in queue
+        self.prefetcher.cancel(client)
+        assert self.prefetcher.pop(client, client.peek_next_users(1)[0]) is None
+        # cancelled loading gives its place of limit back
+        other = make_client(3, [30])
+        self.prefetcher.schedule(other)
+        event.set()
+        self.prefetcher.shutdown()
+        assert self.prefetcher.pop(other, other.peek_next_users(1)[0])[0].owner_id == '30'
+        assert self.loaded() == [['10'], ['30']]
+
+    def test_loader_failure(self):
+        self.loader.side_effect = RuntimeError('VK is unavailable')
+        client = make_client(2, [20])
+        self.prefetcher.schedule(client)
+        self.prefetcher.shutdown()
+        assert self.prefetcher.pop(client, client.peek_next_users(1)[0]) is None
+
+
+class TestBotPrefetch(unittest.TestCase):
+    """
+    Prefetcher loads photos by loader of bot, which fills photos cache
+    """
+
+    def setUp(self):
+        self.bot = VKinderBot.__new__(VKinderBot)
+        self.bot.photos_max_age = 3600
+        self.bot.photos_cache = TTLCache(ttl=3600)
+        self.bot.db = mock.Mock()
+        self.bot.db.load_photos.return_value = None
+        self.bot.vk_personal = mock.Mock()
+        self.bot.vk_personal.get_users_photos.side_effect = lambda vk_ids, album_id='profile': \
+            make_photos([ApiUser({'id': vk_id}) for vk_id in vk_ids])
+
+    def prefetch(self, client: VKinderClient) -> list[ApiPhoto]:
+        """
+        Prefetches photos of next candidates of client and gives photos of the first one
+        """
+        prefetcher = PhotoPrefetcher(self.bot.load_users_photos, lookahead=2, workers=1)
+        prefetcher.schedule(client)
+        prefetcher.shutdown()
+        return prefetcher.pop(client, client.peek_next_users(1)[0])
+
+    def test_photos_cache(self):
+        client = make_client(2, [20, 21, 22])
+        assert self.prefetch(client)[0].owner_id == '20'
+        assert self.bot.photos_cache.get('20')[0].owner_id == '20'
+        assert self.bot.photos_cache.get('21')[0].owner_id == '21'
+        assert self.bot.photos_cache.get('22') is None
+        self.bot.vk_personal.get_users_photos.assert_called_once_with(['20', '21'])
+        assert self.bot.db.save_photos.call_count == 2
+        # the same users in search of other client are taken from cache
+        assert self.prefetch(make_client(3, [21, 20]))[0].owner_id == '21'
+        assert self.bot.vk_personal.get_users_photos.call_count == 1
+        assert self.bot.db.load_photos.call_count == 2
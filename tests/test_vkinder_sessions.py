@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from сlasses.vk_api_classes import ApiUser, VKinderClient, RATINGS
+from сlasses.vkinder_bot_constants import STATUSES
+from сlasses.vkinder_db_classes import Searches
+from сlasses.vkinder_sessions import FileSessionStore, dump_client, restore_client
+
+
+class TestFileSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'sessions')
+
+    def test_restore(self):
+        client = VKinderClient(ApiUser({'id': 1, 'first_name': 'Павел', 'bdate': '10.10.1984'}))
+        client.search.city_name = 'Москва'
+        client.found_users = [ApiUser({'id': vk_id}) for vk_id in range(2, 12)]
+        client.active_user = client.get_next_user()
+        client.rate_active_user(RATINGS['liked'])
+        client.status = STATUSES['decision_wait']
+        store = FileSessionStore(self.directory)
+        store.put(client.vk_id, dump_client(client))
+        store.close()
+
+        store = FileSessionStore(self.directory)
+        # users are rehydrated by VK ids, user absent in DB is dropped
+        restored = restore_client(store.get('1'), lambda vk_ids: {vk_id: ApiUser({'id': vk_id}) for vk_id in vk_ids
+                                                               if vk_id != '5'})
+        assert restored.fname == 'Павел'
+        assert restored.birth_date == client.birth_date
+        assert restored.status == STATUSES['decision_wait']
+        assert restored.search.city_name == 'Москва'
+        assert len(restored.found_users) == 9
+        assert restored.active_user.vk_id == '2'
+        assert restored.found_users.get_rating('2') == RATINGS['liked']
+        assert restored.get_next_user().vk_id == '3'
+
+        store.remove('1')
+        store.close()
+        assert FileSessionStore(self.directory).get('1') is None
+
+    def test_prune(self):
+        client = VKinderClient(ApiUser({'id': 1}))
+        store = FileSessionStore(self.directory)
+        store.put(client.vk_id, dump_client(client))
+        store.close()
+        # expired sessions are deleted from directory at the next writing
+        store = FileSessionStore(self.directory, ttl=-1)
+        store.put('2', dump_client(VKinderClient(ApiUser({'id': 2}))))
+        store.close()
+        assert os.listdir(self.directory) == ['2.json']
+
+    def test_searches_from_db(self):
+        client = VKinderClient(ApiUser({'id': 1}))
+        # search history loaded from DB consists of rows of searches table
+        client.searches = [Searches(id=7, client_id=1, min_age=20, max_age=30, sex_id=1, status_id=6, city_id=1,
+                                    city_name='Москва', updated=datetime.now(timezone.utc))]
+        client.search = client.searches[0]
+        store = FileSessionStore(self.directory)
+        store.put(client.vk_id, dump_client(client))
+        store.close()
+        restored = restore_client(FileSessionStore(self.directory).get('1'), lambda vk_ids: {})
+        assert [(search.id, search.city_name, search.max_age) for search in restored.searches] == [(7, 'Москва', 30)]
+        assert restored.search.id == 7
+
+    def test_broken_state(self):
+        store = FileSessionStore(self.directory)
+        store.put('1', {'last_contact': 0, 'broken': object()})
+        store.put('2', dump_client(VKinderClient(ApiUser({'id': 2}))))
+        store.flush()
+        # state which can't be encoded is dropped instead of being retried forever
+        store.flush()
+        store.close()
+        assert sorted(os.listdir(self.directory)) == ['2.json']
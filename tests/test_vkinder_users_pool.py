@@ -0,0 +1,80 @@
+import gc
+import unittest
+from unittest import mock
+from сlasses.vk_api_classes import ApiUser, ApiPhoto, VKinderClient
+from сlasses.vkinder_bot import VKinderBot, Commands
+from сlasses.vkinder_bot_constants import COMMANDS, KEYBOARDS
+from сlasses.vkinder_users_pool import UsersPool
+
+
+def make_user(vk_id: int, city_name: str = 'Москва') -> ApiUser:
+    # names are built at runtime, so equal names are different strings before interning
+    return ApiUser({'id': vk_id, 'first_name': ''.join(['Пав', 'ел']), 'city': {'id': 1, 'title': city_name}})
+
+
+class TestUsersPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = UsersPool()
+
+    def test_interning(self):
+        first, second = make_user(1), make_user(2)
+        assert first.fname is not second.fname
+        self.pool.resolve_all([first, second])
+        assert first.fname is second.fname
+        assert first.city_name is second.city_name
+
+    def test_same_user(self):
+        user = make_user(1)
+        user.db_id = 10
+        assert self.pool.resolve(user) is user
+        # the same data found by other client gives pooled user
+        assert self.pool.resolve(make_user(1)) is user
+        assert self.pool.metrics == {'size': 1, 'hits': 1, 'misses': 1}
+
+    def test_replacement(self):
+        user = make_user(1)
+        user.db_id = 10
+        self.pool.resolve(user)
+        moved = make_user(1, city_name='Казань')
+        assert self.pool.resolve(moved) is moved
+        # DB id is kept, as fresh data has no it, previous user isn't changed
+        assert moved.db_id == 10
+        assert user.city_name == 'Москва'
+        assert self.pool.resolve(make_user(1, city_name='Казань')) is moved
+        # user restored from DB doesn't replace pooled one
+        assert self.pool.resolve(make_user(1), refresh=False) is moved
+
+    def test_expiry(self):
+        users = self.pool.resolve_all([make_user(1), make_user(2)])
+        assert len(self.pool) == 2
+        del users[0]
+        gc.collect()
+        assert len(self.pool) == 1
+        user = make_user(1)
+        assert self.pool.resolve(user) is user
+        assert self.pool.metrics['misses'] == 3
+
+
+class TestSharedUser(unittest.TestCase):
+    """
+    Pooled user shown to several clients isn't changed by bot
+    """
+
+    def test_photos_are_not_kept_by_user(self):
+        bot = VKinderBot.__new__(VKinderBot)
+        bot.debug_mode = False
+        bot.cmd = Commands(COMMANDS, KEYBOARDS)
+        bot.group_client = mock.Mock()
+        bot.prefetcher = mock.Mock()
+        user = make_user(1)
+        clients = [VKinderClient(make_user(client_id)) for client_id in (100, 200)]
+        for client, photo_id in zip(clients, (7, 8)):
+            client.found_users = [user]
+            bot.prefetcher.pop.return_value = [ApiPhoto({'owner_id': '1', 'id': photo_id})]
+            bot.do_show_next_user(client)
+            assert client.active_user is user
+        attachments = [call.kwargs['attachment'] for call in bot.group_client.send_message.call_args_list
+                       if call.kwargs.get('attachment')]
+        assert attachments == ['photo1_7', 'photo1_8']
+        assert user.photos == []
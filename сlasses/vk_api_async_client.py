@@ -0,0 +1,248 @@
+import asyncio
+import json
+import aiohttp
+from сlasses.vk_api_classes import ApiCity, ApiUser, ApiPhoto, ApiCountry, log
+from сlasses.vk_api_client import ApiResult, VkApiClient, get_response_content, make_countries_params, \
+    make_cities_params, make_search_users_params, make_user_photos_params, make_users_params, process_photos
+from сlasses.vk_api_constants import BASE_URL, PERSONAL_TOKEN_RPS, SEARCH_USERS_MAX_COUNT
+from сlasses.vk_api_rate_limiter import get_token_bucket
+
+
+class AsyncResponse:
+    """
+    Minimal response interface needed by get_response_content, filled from aiohttp response
+    """
+
+    def __init__(self, status_code: int, headers, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncVkApiClient:
+    """
+    Asynchronous sibling of VkApiClient with the same public methods, which should be awaited.
+    Must be used as async context manager, client is initialized on enter:
+    async with AsyncVkApiClient(token, app_id) as api:
+        users = await api.search_users(city_id=1)
+    """
+    API_BASE_URL = ''
+
+    def __init__(self, token: str, app_id: str, user_id=None, version: str = '5.124', debug_mode=False, base_url=None,
+                 requests_per_second: float = PERSONAL_TOKEN_RPS, burst: int = 1, pool_size: int = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.3, timeout: float = 10):
+        self.API_BASE_URL = base_url if base_url else BASE_URL
+        self.debug_mode = debug_mode
+        self.token = token
+        self.app_id = app_id
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.__init_user_id = user_id
+        self.__pool_size = pool_size
+        self.__timeout = timeout
+        self.__headers = {'User-Agent': 'Netology'}
+        self.__params = {'access_token': self.token, 'v': version}
+        # bucket is shared with synchronous clients of the same token
+        self.rate_limiter = get_token_bucket(token, rate=requests_per_second, burst=burst)
+        self.__session: aiohttp.ClientSession = None
+        self.__initialized = False
+        self.__user_id = None
+        self.__first_name = None
+        self.__last_name = None
+        self.__domain = None
+        self.__status = f'{type(self).__name__} not initialised'
+
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def initialize(self):
+        """
+        Opens pooled HTTP session and checks token by getting its user
+        """
+        connector = aiohttp.TCPConnector(limit=self.__pool_size)
+        self.__session = aiohttp.ClientSession(connector=connector, headers=self.__headers,
+                                               timeout=aiohttp.ClientTimeout(total=self.__timeout))
+        user = await self.__request('users.get', make_users_params(user_ids=self.__init_user_id))
+        is_deactivated = False
+        if user.success:
+            is_deactivated = user.json_object[0].get('deactivated', False)
+        if user.success and not is_deactivated:
+            self.__initialized = True
+            self.__user_id = str(user.json_object[0]['id'])
+            self.__first_name = user.json_object[0]['first_name']
+            self.__last_name = user.json_object[0]['last_name']
+            self.__domain = user.json_object[0]['domain']
+            self.__status = f'{type(self).__name__} initialised with user: {self.__first_name} {self.__last_name} ' \
+                            f'(#{self.__user_id})'
+        else:
+            if is_deactivated:
+                user.message = 'User is deactivated'
+            self.__status = f'{type(self).__name__} init failed: ' + user.message
+            self.__status += f'\nPls check a personal token via this URL:' \
+                             f'\n{VkApiClient.get_auth_link(self.app_id, "offline,photos,status,groups")}'
+        log(self.__status, self.debug_mode)
+
+    async def close(self):
+        if self.__session:
+            await self.__session.close()
+
+    @property
+    def is_initialized(self):
+        return self.__initialized
+
+    @property
+    def get_id(self):
+        return self.__user_id
+
+    @property
+    def get_fname(self):
+        return self.__first_name
+
+    @property
+    def get_lname(self):
+        return self.__last_name
+
+    @property
+    def get_domain(self):
+        return self.__domain
+
+    @property
+    def get_status(self) -> str:
+        return self.__status
+
+    async def __request(self, method: str, params: dict) -> ApiResult:
+        """
+        Internal use only. All API requests are made here, after waiting for a free slot of rate limiter.
+        Connection errors and 5xx responses are retried with exponential backoff.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with self.__session.get(self.API_BASE_URL + method,
+                                              params={**self.__params, **params}) as response:
+                    result = AsyncResponse(response.status, response.headers, await response.read())
+                if result.status_code < 500 or attempt == self.max_retries:
+                    return get_response_content(result, path='response')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    return ApiResult(message=f'Request error: {type(e).__name__} ({e})')
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def __get_pages(self, method: str, params: dict, count: int = 1000, max_count: int = None) -> list:
+        """
+        Internal use only. Gets all items of paginated method: first page is requested alone, and if it's full,
+        the rest pages are requested concurrently using total count of items from the first page
+        :return: list of items in order of pages
+        """
+        first = await self.__request(method, {**params, 'count': str(count), 'offset': '0'})
+        if not first.success:
+            log(f'Loading {method} failed: {first.message}', self.debug_mode)
+            return []
+        result = list(first.json_object['items'])
+        log(f'Loaded {len(result)} items of {method}', self.debug_mode)
+        if len(result) < count:
+            return result
+        total = first.json_object.get('count', 0)
+        total = min(total, max_count) if max_count else total
+        pages = await asyncio.gather(*[self.__request(method, {**params, 'count': str(count), 'offset': str(offset)})
+                                       for offset in range(count, total, count)])
+        for page in pages:
+            if not page.success:
+                log(f'Loading {method} failed: {page.message}', self.debug_mode)
+                break
+            items = page.json_object['items']
+            log(f'Loaded {len(items)} items of {method}', self.debug_mode)
+            result += items
+            # if returned less items than requested, suppose that we reached the end
+            if len(items) < count:
+                break
+        return result
+
+    async def get_countries(self, code: str = None) -> list[ApiCountry]:
+        """
+        Full list of countries or specific country byt its code
+        https://vk.com/dev/database.getCountries
+        :param code: coma separated ISO 3166-1 alpha-2 codes - RU,UA,BY
+        :return:  list of ApiCountry objects or empty list
+        """
+        if not self.__initialized:
+            log(f'Error in get_countries: {type(self).__name__} not initialized', self.debug_mode)
+            return []
+        params = make_countries_params(code=code) if code else make_countries_params(need_all=True)
+        return [ApiCountry(dict(row)) for row in await self.__get_pages('database.getCountries', params)]
+
+    async def search_cities(self, country_id: int = None, city_name: str = None) -> list[ApiCity]:
+        """
+        Searching all cities by name.
+        https://vk.com/dev/database.getCities
+        :param city_name: search name (might be partial)
+        :param country_id: country ID from catalog VK
+        :return: list of ApiCity objects or empty list
+        """
+        if not self.__initialized:
+            log(f'Error in search_cities: {type(self).__name__} not initialized', self.debug_mode)
+            return []
+        if city_name:
+            params = make_cities_params(country_id=country_id, q=city_name)
+        else:
+            params = make_cities_params(country_id=country_id, need_all=True)
+        return [ApiCity(dict(row)) for row in await self.__get_pages('database.getCities', params)]
+
+    async def search_users(self, city_id: int = None, sex_id: int = None, love_status_id: int = None,
+                           age_from: int = None, age_to: int = None, q: str = None, has_photo: bool = True,
+                           hometown: str = None, sort: bool = True, page_size: int = 1000) -> list[ApiUser]:
+        """
+        Search for VK users by different parameters.
+        https://vk.com/dev/users.search
+        :return: list of ApiUser objects or empty list
+        """
+        if not self.__initialized:
+            log(f'Error in search_users: {type(self).__name__} not initialized', self.debug_mode)
+            return []
+        params = make_search_users_params(city_id=city_id, sex_id=sex_id, love_status_id=love_status_id,
+                                          age_from=age_from, age_to=age_to, q=q, has_photo=has_photo,
+                                          hometown=hometown, sort=sort)
+        rows = await self.__get_pages('users.search', params, count=page_size, max_count=SEARCH_USERS_MAX_COUNT)
+        return [ApiUser(dict(row)) for row in rows]
+
+    async def get_user_photos(self, owner_id: str = None, album_id='profile', rev: bool = True,
+                              extended: bool = True, photo_sizes: bool = True, sort_by: str = 'popularity',
+                              needed_qty: int = 3) -> list[ApiPhoto]:
+        """
+        Getting all user photos with sorting and returning limited quantity.
+        https://vk.com/dev/photos.get
+        :return: list of ApiPhoto objects or empty list
+        """
+        if not self.__initialized:
+            log(f'Error in get_user_photos: {type(self).__name__} not initialized', self.debug_mode)
+            return []
+        owner_id = owner_id if owner_id else self.__user_id
+        params = make_user_photos_params(owner_id=owner_id, album_id=album_id, rev=rev, extended=extended,
+                                         photo_sizes=photo_sizes)
+        rows = await self.__get_pages('photos.get', params)
+        log(f'Loaded totally {len(rows)} photos', self.debug_mode)
+        return [ApiPhoto(row) for row in process_photos(rows, sort_by=sort_by, needed_qty=needed_qty)]
+
+    async def get_users(self, user_ids=None, fields: [str] = None) -> list[ApiUser]:
+        """
+        This method receive users info by their ID's.
+        Description here: https://vk.com/dev/users.get
+        :return: list of ApiUser objects or empty list
+        """
+        if not self.__initialized:
+            log(f'Error in get_users: {type(self).__name__} not initialized', self.debug_mode)
+            return []
+        users = await self.__request('users.get', make_users_params(user_ids=user_ids, fields=fields))
+        if not users.success:
+            log(f'Getting users failed: {users.message}', self.debug_mode)
+            return []
+        return [ApiUser(dict(row)) for row in users.json_object]
@@ -1,6 +1,7 @@
 import os
 import time
 from datetime import datetime, date
+import numpy as np
 import requests
 from сlasses.vk_api_constants import RATINGS
 
@@ -9,7 +10,10 @@ from сlasses.vk_api_constants import RATINGS
 from сlasses.vkinder_bot_constants import PHRASES
 
 
+# DTOs are created by thousands per search, so they have no __dict__ to save memory
 class ApiCity:
+    __slots__ = ('id', 'title', 'area', 'region')
+
     def __init__(self, row: dict):
         self.id = row.get('id', None)
         self.title = row.get('title', None)
@@ -18,12 +22,16 @@ class ApiCity:
 
 
 class ApiCountry:
+    __slots__ = ('id', 'title')
+
     def __init__(self, row: dict):
         self.id = row.get('id', None)
         self.title = row.get('title', None)
 
 
 class ApiPhoto:
+    __slots__ = ('url', 'likes_count', 'comments_count', 'reposts_count', 'owner_id', 'id')
+
     def __init__(self, row: dict):
         self.url = row.get('url', None)
         self.likes_count = row.get('likes_count', None)
@@ -44,8 +52,16 @@ class VKinderSearch:
         self.city_name = None
 
 
+USER_ATTRIBUTES = ('vk_id', 'fname', 'lname', 'sex_id', 'is_closed', 'country_id', 'country_name', 'city_id',
+                   'city_name', 'hometown', 'domain', 'last_seen_time', 'db_id', 'photos', 'birth_day',
+                   'birth_month', 'birth_year', 'age', 'birth_date')
+
+
 class ApiUser:
-    def __init__(self, row: dict = None, rating_id: int = RATINGS['new']):
+    # weak references allow to share users between clients via pool
+    __slots__ = USER_ATTRIBUTES + ('__weakref__',)
+
+    def __init__(self, row: dict = None):
         if row is None:
             row = {}
         self.vk_id = str(row.get('id', None))
@@ -62,7 +78,6 @@ class ApiUser:
         self.domain = row.get('domain', None)
         self.last_seen_time = row.get('last_seen', {}).get('time', None)
         self.db_id = None
-        self.rating_id = rating_id
         self.photos: list[ApiPhoto] = []
         bdate = row.get('bdate', None)
         if bdate:
@@ -80,19 +95,201 @@ class ApiUser:
             self.birth_date = None
 
 
+class CandidateSet:
+    """
+    Found users of client. Attributes used for selection of candidates are kept in NumPy columns,
+    so filtering, sorting and search of next candidate are vectorized, users themselves are kept for showing.
+    Users might be shared between clients, so ratings of client are kept only in rating_id column.
+    Absent values are stored as -1 for vk_id and age, as 0 for last_seen_time and city_id
+    """
+    COLUMNS = {'vk_id': np.int64, 'last_seen_time': np.int64, 'rating_id': np.int8, 'age': np.int16,
+               'city_id': np.int32, 'is_closed': np.bool_}
+
+    def __init__(self, users=(), rating_id: int = RATINGS['new']):
+        self._users: list[ApiUser] = []
+        # user VK id -> first position, the same user might be found twice, as search results shift between pages,
+        # positions of such repeats are kept apart, as they are rare
+        self._positions: dict[str, int] = {}
+        self._repeats: dict[str, list[int]] = {}
+        self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self._cursor = 0
+        # [rating id, positions of users with this rating, quantity of indexed users, first position not before cursor]
+        self._index = None
+        self.extend(users, rating_id)
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __getitem__(self, index):
+        return self._users[index]
+
+    def __iadd__(self, users):
+        self.extend(users)
+        return self
+
+    def extend(self, users, rating_id: int = RATINGS['new']):
+        """
+        Appends users with given rating, columns grow by doubling, so appending of pages costs amortized O(1) per user
+        """
+        users = list(users)
+        start = len(self._users)
+        end = start + len(users)
+        capacity = len(self._columns['rating_id'])
+        if end > capacity:
+            capacity = max(end, capacity * 2)
+            for name, column in self._columns.items():
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:start] = column[:start]
+                self._columns[name] = grown
+        columns = self._columns
+        columns['vk_id'][start:end] = [int(user.vk_id) if user.vk_id and user.vk_id.isdigit() else -1
+                                       for user in users]
+        columns['last_seen_time'][start:end] = [user.last_seen_time or 0 for user in users]
+        columns['rating_id'][start:end] = rating_id
+        columns['age'][start:end] = [-1 if user.age is None else user.age for user in users]
+        columns['city_id'][start:end] = [user.city_id or 0 for user in users]
+        columns['is_closed'][start:end] = [bool(user.is_closed) for user in users]
+        self.__add_positions(users, start)
+        self._users += users
+
+    def __add_positions(self, users: list[ApiUser], start: int):
+        positions = self._positions
+        for position, user in enumerate(users, start):
+            if positions.setdefault(user.vk_id, position) != position:
+                self._repeats.setdefault(user.vk_id, []).append(position)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Read-only view of column, ratings must be changed by set_rating to keep index of candidates in sync
+        """
+        view = self._columns[name][:len(self._users)]
+        view.flags.writeable = False
+        return view
+
+    def take(self, indexes: np.ndarray) -> 'CandidateSet':
+        """
+        New set of users at given positions, columns are copied without reading of users attributes
+        """
+        result = CandidateSet()
+        result._users = [self._users[index] for index in indexes.tolist()]
+        result.__add_positions(result._users, 0)
+        result._columns = {name: column[:len(self._users)][indexes] for name, column in self._columns.items()}
+        return result
+
+    def select(self, mask: np.ndarray) -> 'CandidateSet':
+        return self.take(np.flatnonzero(mask))
+
+    def sorted_by(self, name: str, reverse: bool = False) -> 'CandidateSet':
+        """
+        Stable sort by column, equal users keep their order also in reverse sorting, as list.sort does
+        """
+        column = self.column(name).astype(np.int64)
+        return self.take(np.argsort(-column if reverse else column, kind='stable'))
+
+    def rewind(self):
+        self.cursor = 0
+
+    @property
+    def cursor(self) -> int:
+        """
+        Position of user, which is checked first by next_user
+        """
+        return self._cursor
+
+    @cursor.setter
+    def cursor(self, value: int):
+        self._cursor = value
+        self._index = None
+
+    def __indexed(self, rating_id: int) -> list:
+        """
+        Internal use only. Index of users with given rating, users appended after indexing are indexed by one
+        vectorized comparison, pointer of index is moved to the first position not before cursor
+        """
+        index = self._index
+        if index is None or index[0] != rating_id:
+            index = self._index = [rating_id, [], 0, 0]
+        size = len(self._users)
+        if index[2] < size:
+            hits = np.flatnonzero(self._columns['rating_id'][index[2]:size] == rating_id) + index[2]
+            index[1] += hits.tolist()
+            index[2] = size
+        positions = index[1]
+        while index[3] < len(positions) and positions[index[3]] < self._cursor:
+            index[3] += 1
+        return index
+
+    def next_user(self, rating_id: int) -> ApiUser:
+        """
+        Moves cursor to next user with given rating, cursor only moves forward, so it costs amortized O(1).
+        Users appended after reaching the end are returned by next calls
+        """
+        _, positions, _, pointer = self.__indexed(rating_id)
+        if pointer == len(positions):
+            self._cursor = len(self._users)
+            return None
+        self._cursor = positions[pointer] + 1
+        return self._users[positions[pointer]]
+
+    def peek_users(self, rating_id: int, qty: int) -> list[ApiUser]:
+        """
+        Returns up to qty users which will be returned by next calls of next_user, without moving cursor
+        """
+        _, positions, _, pointer = self.__indexed(rating_id)
+        return [self._users[position] for position in positions[pointer:pointer + qty]]
+
+    def set_rating(self, vk_id: str, rating_id: int):
+        """
+        Costs O(1), only change of user which isn't passed by cursor yet requires reindexing
+        """
+        position = self._positions.get(vk_id)
+        if position is None:
+            return
+        for position in [position] + self._repeats.get(vk_id, []):
+            self._columns['rating_id'][position] = rating_id
+            if position >= self._cursor:
+                self._index = None
+
+    def get_rating(self, vk_id: str) -> int:
+        """
+        :return: rating of user or None if there is no such user
+        """
+        position = self._positions.get(vk_id)
+        return None if position is None else int(self._columns['rating_id'][position])
+
+    def set_ratings(self, ratings: dict[str, int]):
+        """
+        :param ratings: {user VK id: rating id}
+        """
+        for vk_id, rating_id in ratings.items():
+            self.set_rating(vk_id, rating_id)
+
+    def ratings_counts(self) -> dict:
+        """
+        Counts ratings of all users and return as dict {'new': 0, 'liked': 0, 'disliked': 0, 'banned': 0}
+        """
+        counts = np.bincount(self.column('rating_id'), minlength=len(RATINGS))
+        return {name: int(counts[rating_id]) for name, rating_id in RATINGS.items()}
+
+
 class VKinderClient(ApiUser):
     def __init__(self, user: ApiUser):
         super().__init__()
-        self.__dict__.update(user.__dict__)
-        self._found_user_iter = -1
+        for name in USER_ATTRIBUTES:
+            setattr(self, name, getattr(user, name))
         self._status = 0
         self.rating_filter = RATINGS['new']
         self._search = VKinderSearch()
         self.searches = []
         self.found_cities: list[ApiCity] = []
         self.found_countries: list[ApiCountry] = []
-        self._found_users: list[ApiUser] = []
+        self._found_users = CandidateSet()
         self.last_contact = datetime.now()
+        # time when profile was received from VK, None if it is unknown
+        self.profile_updated: datetime = None
         self.active_user: ApiUser = None
 
     # this prevents to import VKinderSearch in main modules
@@ -100,10 +297,16 @@ class VKinderClient(ApiUser):
         self.search = VKinderSearch()
 
     def get_next_user(self) -> ApiUser:
-        while self._found_user_iter < len(self._found_users)-1:
-            self._found_user_iter += 1
-            if self._found_users[self._found_user_iter].rating_id == self.rating_filter:
-                return self._found_users[self._found_user_iter]
+        return self._found_users.next_user(self.rating_filter)
+
+    def peek_next_users(self, qty: int) -> list[ApiUser]:
+        """
+        Returns up to qty users which will be returned by next calls of get_next_user, without moving iterator
+        """
+        return self._found_users.peek_users(self.rating_filter, qty)
+
+    def rate_active_user(self, rating_id: int):
+        self._found_users.set_rating(self.active_user.vk_id, rating_id)
 
     @property
     def search(self):
@@ -121,7 +324,9 @@ class VKinderClient(ApiUser):
 
     @found_users.setter
     def found_users(self, value):
-        self._found_user_iter = -1
+        if not isinstance(value, CandidateSet):
+            value = CandidateSet(value)
+        value.rewind()
         self._found_users = value
 
     @property
@@ -348,14 +553,12 @@ def read_textfile(filename: str) -> str:
     return query_text
 
 
-def get_users_ratings_counts(users: list[ApiUser]) -> dict:
+def get_search_key(search: VKinderSearch) -> tuple:
     """
-    Counts total ratings of all found users and return as dict {'new': 0, 'liked': 0, 'disliked': 0, 'banned': 0}
+    Normalized search parameters, equal searches of different clients have equal keys
     """
-    result = {'new': 0, 'liked': 0, 'disliked': 0, 'banned': 0}
-    for user in users:
-        result[get_dict_key_by_value(RATINGS, user.rating_id)] += 1
-    return result
+    return tuple(None if value is None else int(value) for value in
+                 (search.city_id, search.sex_id, search.status_id, search.min_age, search.max_age))
 
 
 def get_dict_key_by_value(dictionary: dict, value):
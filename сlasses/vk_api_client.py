@@ -1,9 +1,15 @@
-import time
+import json
+from concurrent.futures import ThreadPoolExecutor
 from http.client import responses
+from random import randrange
 from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from сlasses.vk_api_classes import ApiCity, ApiUser, ApiPhoto, ApiCountry, log, prepare_params
-from сlasses.vk_api_constants import BASE_URL
+from сlasses.vk_api_constants import BASE_URL, PERSONAL_TOKEN_RPS, GROUP_TOKEN_RPS, EXECUTE_MAX_CALLS, \
+    SEARCH_USERS_MAX_COUNT, REQUIRED_USER_FIELDS, IMG_TYPES
+from сlasses.vk_api_rate_limiter import get_token_bucket
 
 
 class ApiResult:
@@ -26,7 +32,9 @@ class ApiResult:
 class VkApiClient:
     API_BASE_URL = ''
 
-    def __init__(self, token: str, app_id: str, user_id=None, version: str = '5.124', debug_mode=False, base_url=None):
+    def __init__(self, token: str, app_id: str, user_id=None, version: str = '5.124', debug_mode=False, base_url=None,
+                 requests_per_second: float = PERSONAL_TOKEN_RPS, burst: int = 1, pool_size: int = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.3, timeout: float = 10, parallel_pages: int = 4):
         super().__init__()
         self.API_BASE_URL = base_url if base_url else BASE_URL
         self.debug_mode = debug_mode
@@ -34,11 +42,15 @@ class VkApiClient:
         self.token = token
         self.app_id = app_id
         self.__version = version
-        self.__required_user_fields = ['sex', 'bdate', 'domain', 'country', 'city', 'last_seen', 'home_town']
         self.__headers = {'User-Agent': 'Netology'}
         self.__params = {'access_token': self.token, 'v': self.__version}
-        self.__img_types = {'s': 1, 'm': 2, 'x': 3, 'o': 4, 'p': 5, 'q': 6, 'r': 7, 'y': 8, 'z': 9, 'w': 10}
-        self.request_delay = 0.33
+        # all clients with the same token share one bucket, this prevents ban from service
+        self.rate_limiter = get_token_bucket(token, rate=requests_per_second, burst=burst)
+        # one pooled keep-alive session per client, connections pool of requests is safe to share between threads
+        self.timeout = timeout
+        self.__session = make_session(pool_size=pool_size, max_retries=max_retries, backoff_factor=backoff_factor)
+        # pages after the first one are requested concurrently, their rate is still limited by the bucket
+        self.__executor = ThreadPoolExecutor(max_workers=parallel_pages, thread_name_prefix='vk_pages')
         # below line needed for get_users only
         self.__initialized = True
         # try to instantiate
@@ -111,25 +123,104 @@ class VkApiClient:
         }
         return '?'.join([oauth_api_base_url, urlencode(oauth_params)])
 
-    def __get_countries(self, count: int = 1000, offset: int = 0, code: str = None, need_all: bool = None) -> ApiResult:
+    @property
+    def rate_limiter_metrics(self) -> dict:
+        return self.rate_limiter.metrics
+
+    def __request(self, method: str, params: dict, post: bool = False) -> ApiResult:
         """
-        Internal use only.
-        https://vk.com/dev/database.getCountries
-        :param count: max 1000
-        :param offset: any integer
-        :param code: coma separated ISO 3166-1 alpha-2 codes - RU,UA,BY
-        :param need_all: True of False
+        Internal use only. All API requests are made here, after waiting for a free slot of rate limiter
+        :param method: name of API method
+        :param params: method specific parameters
+        :param post: send parameters in request body, needed for long parameters like code of execute
         :return: ApiResult
         """
-        params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
-        if code:
-            params.update({'code': code})
-        if need_all:
-            params.update({'need_all': '1'})
-        response = requests.get(self.API_BASE_URL + 'database.getCountries',
-                                params={**self.__params, **params}, headers=self.__headers)
+        self.rate_limiter.acquire()
+        try:
+            if post:
+                response = self.__session.post(self.API_BASE_URL + method, data={**self.__params, **params},
+                                               headers=self.__headers, timeout=self.timeout)
+            else:
+                response = self.__session.get(self.API_BASE_URL + method, params={**self.__params, **params},
+                                              headers=self.__headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            return ApiResult(message=f'Request error: {type(e).__name__} ({e})')
         return get_response_content(response, path='response')
 
+    def close(self):
+        self.__executor.shutdown(wait=False)
+        self.__session.close()
+
+    def __execute(self, calls: list[tuple[str, dict]]) -> ApiResult:
+        """
+        Internal use only.
+        Makes up to EXECUTE_MAX_CALLS API calls in one request
+        https://vk.com/dev/execute
+        :param calls: list of tuples (method name, method parameters)
+        :return: ApiResult with list of responses in order of calls, failed call has response False
+        """
+        code = ','.join([f'API.{method}({json.dumps(params, ensure_ascii=False)})' for method, params in calls])
+        return self.__request('execute', {'code': f'return [{code}];'}, post=True)
+
+    def __request_page(self, method: str, params: dict, offset: int) -> list:
+        """
+        Internal use only.
+        :return: page content with total count and items or None if request failed
+        """
+        page = self.__request(method, {**params, 'offset': prepare_params(offset)})
+        if not page.success:
+            log(f'Loading {method} failed: {page.message}', self.debug_mode)
+            return None
+        return page.json_object
+
+    def __iter_pages(self, method: str, params: dict, count: int = 1000, max_count: int = None):
+        """
+        Internal use only. Iterates over pages of paginated method in order of offsets.
+        First page gives total count of items, so the rest pages are requested concurrently by parallel_pages
+        threads, their rate is limited by the token bucket. Iteration stops at failed or not full page.
+        :param params: method parameters, without count and offset
+        :param count: items per page
+        :param max_count: max items which API returns, even if found more
+        :return: generator of lists of items
+        """
+        params = {**params, 'count': prepare_params(count)}
+        page = self.__request_page(method, params, 0)
+        if not page or not page['items']:
+            return
+        log(f'Loaded {len(page["items"])} items of {method}', self.debug_mode)
+        yield page['items']
+        if len(page['items']) < count:
+            return
+        total = page.get('count', 0)
+        total = min(total, max_count) if max_count else total
+        offsets = list(range(count, total, count))
+        results = self.__executor.map(lambda offset: self.__request_page(method, params, offset), offsets)
+        # map yields results in order of offsets, closing it cancels requests which are not started yet
+        try:
+            for page in results:
+                if not page or not page['items']:
+                    return
+                log(f'Loaded {len(page["items"])} items of {method}', self.debug_mode)
+                yield page['items']
+                # if returned less items than requested, suppose that we reached the end
+                if len(page['items']) < count:
+                    return
+        finally:
+            results.close()
+
+    def iter_countries(self, code: str = None):
+        """
+        Same as get_countries, but countries are yielded page by page, as soon as page is received. For external use.
+        :return: generator of lists of ApiCountry objects
+        """
+        if not self.__initialized:
+            log(f'Error in iter_countries: {type(self).__name__} not initialized', self.debug_mode)
+            return
+        log(f'\nRequesting countries from VK...', self.debug_mode)
+        params = make_countries_params(code=code) if code else make_countries_params(need_all=True)
+        for items in self.__iter_pages('database.getCountries', params):
+            yield [ApiCountry(dict(row)) for row in items]
+
     def get_countries(self, code: str = None) -> list[ApiCountry]:
         """
         Full list of countries or specific country byt its code
@@ -137,61 +228,23 @@ class VkApiClient:
         :param code: coma separated ISO 3166-1 alpha-2 codes - RU,UA,BY
         :return:  list of ApiCountry objects or empty list
         """
-        result = []
-        if not self.__initialized:
-            log(f'Error in get_countries: {type(self).__name__} not initialized', self.debug_mode)
-            return result
-        offset = 0
-        count = 1000
-        log(f'\nRequesting max {count} countries at once from VK...', self.debug_mode)
-        while True:
-            if code:
-                countries = self.__get_countries(count=count, offset=offset, code=code)
-            else:
-                countries = self.__get_countries(count=count, offset=offset, need_all=True)
-            if not countries.success:
-                log(f'Loading countries failed: {countries.message}', self.debug_mode)
-                break
-            items_count = len(countries.json_object['items'])
-            log(f'Loaded {items_count} countries', self.debug_mode)
-            # if we reached the end
-            if items_count == 0:
-                break
-            result += countries.json_object['items']
-            # if returned less items than requested, suppose that we reached the end
-            # or if next iteration will return more items than we requested
-            if items_count < count:
-                break
-            offset += count
-            # prevent ban from service
-            time.sleep(self.request_delay)
-        result = [ApiCountry(dict(row)) for row in result]
-        return result
+        return [country for page in self.iter_countries(code=code) for country in page]
 
-    def __search_cities(self, count: int = 1000, offset: int = 0, country_id: int = None, region_id: int = None,
-                        need_all: bool = False, q: str = None) -> ApiResult:
+    def iter_cities(self, country_id: int = None, city_name: str = None):
         """
-        Internal use only.
-        https://vk.com/dev/database.getCities
-        :param count: max 1000
-        :param offset: any integer
-        :param country_id: country ID from catalog VK
-        :param region_id: region ID from catalog VK
-        :param need_all: True of False
-        :return: ApiResult
+        Same as search_cities, but cities are yielded page by page, as soon as page is received. For external use.
+        :return: generator of lists of ApiCity objects
         """
-        params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
-        if country_id:
-            params.update({'country_id': prepare_params(country_id)})
-        if region_id:
-            params.update({'region_id': prepare_params(region_id)})
-        if need_all:
-            params.update({'need_all': '1'})
-        if q:
-            params.update({'q': q})
-        response = requests.get(self.API_BASE_URL + 'database.getCities',
-                                params={**self.__params, **params}, headers=self.__headers)
-        return get_response_content(response, path='response')
+        if not self.__initialized:
+            log(f'Error in iter_cities: {type(self).__name__} not initialized', self.debug_mode)
+            return
+        log(f'\nSearching city name: "{city_name}" at country {country_id} ...', self.debug_mode)
+        if city_name:
+            params = make_cities_params(country_id=country_id, q=city_name)
+        else:
+            params = make_cities_params(country_id=country_id, need_all=True)
+        for items in self.__iter_pages('database.getCities', params):
+            yield [ApiCity(dict(row)) for row in items]
 
     def search_cities(self, country_id: int = None, city_name: str = None) -> list[ApiCity]:
         """
@@ -201,83 +254,29 @@ class VkApiClient:
         :param country_id: country ID from catalog VK
         :return: list of ApiCity objects or empty list
         """
-        result = []
-        if not self.__initialized:
-            log(f'Error in search_cities: {type(self).__name__} not initialized', self.debug_mode)
-            return result
-        offset = 0
-        count = 1000
-        log(f'\nSearching city name: "{city_name}" at country {country_id} ...', self.debug_mode)
-        while True:
-            if city_name:
-                cities = self.__search_cities(count=count, offset=offset, country_id=country_id, q=city_name)
-            else:
-                cities = self.__search_cities(count=count, offset=offset, country_id=country_id, need_all=True)
-            if not cities.success:
-                log(f'Loading cities failed: {cities.message}', self.debug_mode)
-                break
-            items_count = len(cities.json_object['items'])
-            log(f'Loaded {items_count} cities', self.debug_mode)
-            # if we reached the end
-            if items_count == 0:
-                break
-            result += cities.json_object['items']
-            # if returned less items than requested, suppose that we reached the end
-            # or if next iteration will return more items than we requested
-            if items_count < count:
-                break
-            offset += count
-            # prevent ban from service
-            time.sleep(self.request_delay)
-        result = [ApiCity(dict(row)) for row in result]
-        return result
+        return [city for page in self.iter_cities(country_id=country_id, city_name=city_name) for city in page]
 
-    def __search_users(self, count: int = 1000, offset: int = 0, city_id: int = None, sex_id: int = None,
-                       love_status_id: int = None, age_from: int = None, age_to: int = None, q: str = None,
-                       has_photo: bool = True, hometown: str = None, sort: bool = True, fields=None) -> ApiResult:
+    def iter_search_users(self, city_id: int = None, sex_id: int = None, love_status_id: int = None,
+                          age_from: int = None, age_to: int = None, q: str = None, has_photo: bool = True,
+                          hometown: str = None, sort: bool = True, page_size: int = 1000):
         """
-        Internal use only.
-        https://vk.com/dev/users.search
-        :param count: max 1000
-        :param offset: any integer
-        :param city_id: country ID from catalog VK
-        :param sex_id: sex ID from catalog VK
-        :param love_status_id: love status from catalog BK
-        :param age_from: any positive integer
-        :param age_to: any positive integer
-        :param q: search string
-        :param hometown: city name
-        :param has_photo: True or False
-        :param sort: True or False
-        :return: ApiResult
+        Same as search_users, but users are yielded page by page, as soon as page is received. For external use.
+        Remaining requests are cancelled if generator is closed before the end.
+        :return: generator of lists of ApiUser objects
         """
-        params = {'count': prepare_params(count), 'offset': prepare_params(offset), 'online': '0',
-                  'fields': prepare_params(fields, self.__required_user_fields)}
-        if city_id:
-            params.update({'city': prepare_params(city_id)})
-        if sex_id:
-            params.update({'sex': prepare_params(sex_id)})
-        if love_status_id:
-            params.update({'status': prepare_params(love_status_id)})
-        if age_from:
-            params.update({'age_from': prepare_params(age_from)})
-        if age_to:
-            params.update({'age_to': prepare_params(age_to)})
-        if q:
-            params.update({'q': q})
-        if hometown:
-            params.update({'hometown': hometown})
-        if has_photo:
-            params.update({'has_photo': '1'})
-        if sort:
-            params.update({'sort': '1'})
-        response = requests.get(self.API_BASE_URL + 'users.search',
-                                params={**self.__params, **params}, headers=self.__headers)
-        return get_response_content(response, path='response')
+        if not self.__initialized:
+            log(f'Error in iter_search_users: {type(self).__name__} not initialized', self.debug_mode)
+            return
+        log(f'\nSearching users...', self.debug_mode)
+        params = make_search_users_params(city_id=city_id, sex_id=sex_id, love_status_id=love_status_id,
+                                          age_from=age_from, age_to=age_to, q=q, has_photo=has_photo,
+                                          hometown=hometown, sort=sort)
+        for items in self.__iter_pages('users.search', params, count=page_size, max_count=SEARCH_USERS_MAX_COUNT):
+            yield [ApiUser(dict(row)) for row in items]
 
     def search_users(self, city_id: int = None, sex_id: int = None, love_status_id: int = None, age_from: int = None,
                      age_to: int = None, q: str = None, has_photo: bool = True, hometown: str = None,
-                     sort: bool = True) -> list[ApiUser]:
+                     sort: bool = True, page_size: int = 1000) -> list[ApiUser]:
         """
         Search for VK users by different parameters. For external use.
         https://vk.com/dev/users.search
@@ -290,64 +289,30 @@ class VkApiClient:
         :param hometown: city name
         :param has_photo: True or False
         :param sort: True or False
+        :param page_size: users per request, max 1000
         :return: list of ApiUser objects or empty list
         """
-        result = []
-        if not self.__initialized:
-            log(f'Error in search_users: {type(self).__name__} not initialized', self.debug_mode)
-            return result
-        offset = 0
-        count = 1000
-        log(f'\nSearching users...', self.debug_mode)
-        while True:
-            users = self.__search_users(count=count, offset=offset, city_id=city_id, sex_id=sex_id,
-                                        love_status_id=love_status_id, age_from=age_from, age_to=age_to, q=q,
-                                        has_photo=has_photo, hometown=hometown, sort=sort)
-            if not users.success:
-                log(f'Loading users failed: {users.message}', self.debug_mode)
-                break
-            items_count = len(users.json_object['items'])
-            log(f'Loaded {items_count} users', self.debug_mode)
-            # if we reached the end
-            if items_count == 0:
-                break
-            result += users.json_object['items']
-            # if returned less items than requested, suppose that we reached the end
-            # or if next iteration will return more items than we requested
-            if items_count < count:
-                break
-            offset += count
-            # prevent ban from service
-            time.sleep(self.request_delay)
-        result = [ApiUser(dict(row)) for row in result]
-        return result
+        pages = self.iter_search_users(city_id=city_id, sex_id=sex_id, love_status_id=love_status_id,
+                                       age_from=age_from, age_to=age_to, q=q, has_photo=has_photo, hometown=hometown,
+                                       sort=sort, page_size=page_size)
+        return [user for page in pages for user in page]
 
-    def __get_user_photos(self, owner_id: str, count: int = 1000, offset: int = 0, album_id='profile',
-                          rev: bool = True, extended: bool = True, photo_sizes: bool = True) -> ApiResult:
+    def iter_user_photos(self, owner_id: str = None, album_id='profile', rev: bool = True, extended: bool = True,
+                         photo_sizes: bool = True, sort_by: str = 'popularity'):
         """
-        Internal use only.
-        https://vk.com/dev/photos.get
-        :param owner_id: ID of user, if None - your token's account ID will be taken
-        :param album_id: one of album type: wall, profile, saved
-        :param rev: reversed chronological order
-        :param photo_sizes: True, if needed additional info abt photos
-        :param count: images per request
-        :param offset: offset from which count images
-        :param extended: True, if needed likes, comments, tags, reposts
-        :return: ApiResult
+        Photos of user yielded page by page, as soon as page is received. Photos are sorted within page only,
+        use get_user_photos to get the best photos of all. For external use.
+        :return: generator of lists of ApiPhoto objects
         """
-        params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
-        params.update({'owner_id': prepare_params(owner_id)})
-        params.update({'album_id': prepare_params(album_id)})
-        if rev:
-            params.update({'rev': '1'})
-        if extended:
-            params.update({'extended': '1'})
-        if photo_sizes:
-            params.update({'photo_sizes': '1'})
-        response = requests.get(self.API_BASE_URL + 'photos.get',
-                                params={**self.__params, **params}, headers=self.__headers)
-        return get_response_content(response, path='response')
+        if not self.__initialized:
+            log(f'Error in iter_user_photos: {type(self).__name__} not initialized', self.debug_mode)
+            return
+        owner_id = owner_id if owner_id else self.__user_id
+        log(f'Getting user {owner_id} photos from {album_id}...', self.debug_mode)
+        params = make_user_photos_params(owner_id=owner_id, album_id=album_id, rev=rev, extended=extended,
+                                         photo_sizes=photo_sizes)
+        for items in self.__iter_pages('photos.get', params):
+            yield [ApiPhoto(row) for row in process_photos(items, sort_by=sort_by, needed_qty=0)]
 
     def get_user_photos(self, owner_id: str = None, album_id='profile', rev: bool = True, extended: bool = True,
                         photo_sizes: bool = True, sort_by: str = 'popularity', needed_qty: int = 3) -> list[ApiPhoto]:
@@ -368,74 +333,53 @@ class VkApiClient:
             log(f'Error in get_user_photos: {type(self).__name__} not initialized', self.debug_mode)
             return result
         owner_id = owner_id if owner_id else self.__user_id
-        offset = 0
-        count = 1000
         log(f'Getting user {owner_id} photos from {album_id}...', self.debug_mode)
-        while True:
-            photos = self.__get_user_photos(count=count, offset=offset, owner_id=owner_id, album_id=album_id, rev=rev,
-                                            extended=extended, photo_sizes=photo_sizes)
-            if not photos.success:
-                log(f'Loading photos failed: {photos.message}', self.debug_mode)
-                break
-            items_count = len(photos.json_object['items'])
-            log(f'Loaded {items_count} photos more...', self.debug_mode)
-            # if we reached the end
-            if items_count == 0:
-                break
-            result += photos.json_object['items']
-            # if returned less items than requested, suppose that we reached the end
-            # or if next iteration will return more items than we requested
-            if items_count < count:
-                break
-            offset += count
-            # prevent ban from service
-            time.sleep(self.request_delay)
+        params = make_user_photos_params(owner_id=owner_id, album_id=album_id, rev=rev, extended=extended,
+                                         photo_sizes=photo_sizes)
+        # all pages are needed to select the best photos
+        for items in self.__iter_pages('photos.get', params):
+            result += items
         log(f'Loaded totally {len(result)} photos', self.debug_mode)
-        result = self.__process_photos(result, sort_by=sort_by, needed_qty=needed_qty)
+        result = process_photos(result, sort_by=sort_by, needed_qty=needed_qty)
         result = [ApiPhoto(row) for row in result]
         return result
 
-    def __process_photos(self, photos: list, sort_by: str = 'popularity', needed_qty: int = 3) -> list:
+    def get_users_photos(self, owner_ids: list[str], album_id='profile', rev: bool = True, extended: bool = True,
+                         photo_sizes: bool = True, sort_by: str = 'popularity',
+                         needed_qty: int = 3) -> dict[str, list[ApiPhoto]]:
         """
-        Sorting photos and limits their quantity. Internal use only.
-        :return: list of dicts
-        {'likes_count': 0, 'comments_count': 0, 'reposts_count': 0, 'url': "", 'owner_id': "", 'id': ""}
+        Getting photos of several users at once, photos of EXECUTE_MAX_CALLS users are requested via one execute.
+        Only first 1000 photos of each user are considered. For external use.
+        https://vk.com/dev/execute
+        :param owner_ids: IDs of users
+        :param album_id: one of album type: wall, profile, saved
+        :param rev: reversed chronological order
+        :param photo_sizes: True, if needed additional info abt photos
+        :param extended: True, if needed likes, comments, tags, reposts
+        :param needed_qty: max quantity to be returned for each user
+        :param sort_by: 'popularity' or 'date'
+        :return: dict {owner_id: list of ApiPhoto objects}, users with failed requests are absent
         """
-        result = []
-        if sort_by == 'popularity':
-            photos.sort(key=lambda x: x['likes']['count'] + x['comments']['count'] + x['reposts']['count'] * 3,
-                        reverse=True)
-        else:
-            photos.sort(key=lambda x: x['date'], reverse=True)
-        needed_qty = needed_qty if needed_qty > 0 else len(photos)
-        for photo in photos[:needed_qty]:
-            # let's detect images with the maximum resolution, based on dimensions or on type if dimensions is absent
-            img_url = ''
-            img_url_fallback = ''
-            # this needed as fallback if all resolutions will be zero
-            max_type = -1
-            # even if we will be unable to detect max resolution link, we will always take the first one
-            max_res = -1
-            for size in photo['sizes']:
-                res = size['height'] * size['width']
-                if max_res < res:
-                    max_res = res
-                    img_url = size['url']
-                # fallback only
-                size_type = self.__img_types.get(size['type'], 0)
-                if max_type < size_type:
-                    max_type = size_type
-                    # below line needed to prevent additional loop through sizes list in case of fallback
-                    img_url_fallback = size['url']
-            # fallback if unable to detect resolutions
-            # for images older than 2012 year https://vk.com/dev/objects/photo_sizes
-            if max_res == 0:
-                img_url = img_url_fallback
-            likes_count = str(photo['likes']['count'])
-            comments_count = str(photo['comments']['count'])
-            reposts_count = str(photo['reposts']['count'])
-            result.append({'likes_count': likes_count, 'comments_count': comments_count, 'reposts_count': reposts_count,
-                           'url': img_url, 'owner_id': photo['owner_id'], 'id': photo['id']})
+        result = {}
+        if not self.__initialized:
+            log(f'Error in get_users_photos: {type(self).__name__} not initialized', self.debug_mode)
+            return result
+        owner_ids = [str(owner_id) for owner_id in owner_ids]
+        log(f'Getting photos of {len(owner_ids)} users from {album_id}...', self.debug_mode)
+        for batch_start in range(0, len(owner_ids), EXECUTE_MAX_CALLS):
+            batch = owner_ids[batch_start:batch_start + EXECUTE_MAX_CALLS]
+            pages = self.__execute([('photos.get', make_user_photos_params(owner_id=owner_id, album_id=album_id, rev=rev,
+                                                                           extended=extended, photo_sizes=photo_sizes))
+                                    for owner_id in batch])
+            if not pages.success:
+                log(f'Loading photos failed: {pages.message}', self.debug_mode)
+                continue
+            for owner_id, page in zip(batch, pages.json_object):
+                if not page:
+                    continue
+                photos = process_photos(page['items'], sort_by=sort_by, needed_qty=needed_qty)
+                result[owner_id] = [ApiPhoto(row) for row in photos]
+        log(f'Loaded photos of {len(result)} users', self.debug_mode)
         return result
 
     def __get_users(self, user_ids=None, fields: [str] = None) -> ApiResult:
@@ -446,13 +390,7 @@ class VkApiClient:
         :param user_ids: list of one or more user IDs in strings form
         :return: ApiResult
         """
-        params = {}
-        params.update({'fields': {prepare_params(fields, self.__required_user_fields)}})
-        if user_ids:
-            params.update({'user_ids': prepare_params(user_ids)})
-        response = requests.get(self.API_BASE_URL + 'users.get',
-                                params={**self.__params, **params}, headers=self.__headers)
-        return get_response_content(response, path='response')
+        return self.__request('users.get', make_users_params(user_ids=user_ids, fields=fields))
 
     def get_users(self, user_ids=None, fields: [str] = None) -> list[ApiUser]:
         """
@@ -478,6 +416,217 @@ class VkApiClient:
         return result
 
 
+class VkGroupClient:
+    """
+    Client of group token, used to reply to clients.
+    Unlike vk_api.VkApi, it doesn't hold lock during request, so replies to different clients are sent concurrently
+    by pooled keep-alive connections, only the shared bucket of token limits their rate
+    """
+    API_BASE_URL = ''
+
+    def __init__(self, token: str, version: str = '5.124', debug_mode=False, base_url=None,
+                 requests_per_second: float = GROUP_TOKEN_RPS, burst: int = 1, pool_size: int = 16,
+                 max_retries: int = 3, backoff_factor: float = 0.3, timeout: float = 10):
+        self.API_BASE_URL = base_url if base_url else BASE_URL
+        self.debug_mode = debug_mode
+        self.__headers = {'User-Agent': 'Netology'}
+        self.__params = {'access_token': token, 'v': version}
+        self.rate_limiter = get_token_bucket(token, rate=requests_per_second, burst=burst)
+        self.timeout = timeout
+        self.__session = make_session(pool_size=pool_size, max_retries=max_retries, backoff_factor=backoff_factor)
+
+    def __request(self, method: str, params: dict) -> ApiResult:
+        """
+        Internal use only. Posts request after waiting for a free slot of rate limiter, long messages and keyboards
+        are sent in request body
+        :param method: name of API method
+        :param params: method specific parameters
+        :return: ApiResult
+        """
+        self.rate_limiter.acquire()
+        try:
+            response = self.__session.post(self.API_BASE_URL + method, data={**self.__params, **params},
+                                           headers=self.__headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            return ApiResult(message=f'Request error: {type(e).__name__} ({e})')
+        return get_response_content(response, path='response')
+
+    def send_message(self, peer_id, message: str, attachment: str = None, keyboard: str = None) -> ApiResult:
+        """
+        Sends message to user, description here: https://vk.com/dev/messages.send
+        :param peer_id: VK id of user
+        :param message: text of message
+        :param attachment: attachments separated by commas, like photo<owner_id>_<media_id>
+        :param keyboard: JSON of keyboard
+        :return: ApiResult with id of sent message
+        """
+        params = {'peer_id': peer_id, 'message': message, 'attachment': attachment, 'keyboard': keyboard,
+                  'random_id': randrange(10 ** 7)}
+        result = self.__request('messages.send', {k: v for k, v in params.items() if v is not None})
+        if not result.success:
+            log(f'Sending message to {peer_id} failed: {result.message}', self.debug_mode)
+        return result
+
+    def set_activity(self, peer_id, activity: str = 'typing') -> ApiResult:
+        """
+        Shows activity of group in dialog with user, description here: https://vk.com/dev/messages.setActivity
+        :param peer_id: VK id of user
+        :param activity: type of activity
+        :return: ApiResult
+        """
+        return self.__request('messages.setActivity', {'peer_id': peer_id, 'type': activity})
+
+    def close(self):
+        self.__session.close()
+
+
+def make_countries_params(count: int = 1000, offset: int = 0, code: str = None, need_all: bool = None) -> dict:
+    """
+    Parameters of database.getCountries, same for all clients
+    """
+    params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
+    if code:
+        params.update({'code': code})
+    if need_all:
+        params.update({'need_all': '1'})
+    return params
+
+
+def make_cities_params(count: int = 1000, offset: int = 0, country_id: int = None, region_id: int = None,
+                       need_all: bool = False, q: str = None) -> dict:
+    """
+    Parameters of database.getCities, same for all clients
+    """
+    params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
+    if country_id:
+        params.update({'country_id': prepare_params(country_id)})
+    if region_id:
+        params.update({'region_id': prepare_params(region_id)})
+    if need_all:
+        params.update({'need_all': '1'})
+    if q:
+        params.update({'q': q})
+    return params
+
+
+def make_search_users_params(count: int = 1000, offset: int = 0, city_id: int = None, sex_id: int = None,
+                             love_status_id: int = None, age_from: int = None, age_to: int = None, q: str = None,
+                             has_photo: bool = True, hometown: str = None, sort: bool = True, fields=None) -> dict:
+    """
+    Parameters of users.search, same for all clients, single requests and execute
+    """
+    params = {'count': prepare_params(count), 'offset': prepare_params(offset), 'online': '0',
+              'fields': prepare_params(fields, REQUIRED_USER_FIELDS)}
+    if city_id:
+        params.update({'city': prepare_params(city_id)})
+    if sex_id:
+        params.update({'sex': prepare_params(sex_id)})
+    if love_status_id:
+        params.update({'status': prepare_params(love_status_id)})
+    if age_from:
+        params.update({'age_from': prepare_params(age_from)})
+    if age_to:
+        params.update({'age_to': prepare_params(age_to)})
+    if q:
+        params.update({'q': q})
+    if hometown:
+        params.update({'hometown': hometown})
+    if has_photo:
+        params.update({'has_photo': '1'})
+    if sort:
+        params.update({'sort': '1'})
+    return params
+
+
+def make_user_photos_params(owner_id: str, count: int = 1000, offset: int = 0, album_id='profile', rev: bool = True,
+                            extended: bool = True, photo_sizes: bool = True) -> dict:
+    """
+    Parameters of photos.get, same for all clients, single requests and execute
+    """
+    params = {'count': prepare_params(count), 'offset': prepare_params(offset)}
+    params.update({'owner_id': prepare_params(owner_id)})
+    params.update({'album_id': prepare_params(album_id)})
+    if rev:
+        params.update({'rev': '1'})
+    if extended:
+        params.update({'extended': '1'})
+    if photo_sizes:
+        params.update({'photo_sizes': '1'})
+    return params
+
+
+def process_photos(photos: list, sort_by: str = 'popularity', needed_qty: int = 3) -> list:
+    """
+    Sorting photos and limits their quantity, same for all clients
+    :return: list of dicts
+    {'likes_count': 0, 'comments_count': 0, 'reposts_count': 0, 'url': "", 'owner_id': "", 'id': ""}
+    """
+    result = []
+    if sort_by == 'popularity':
+        photos.sort(key=lambda x: x['likes']['count'] + x['comments']['count'] + x['reposts']['count'] * 3,
+                    reverse=True)
+    else:
+        photos.sort(key=lambda x: x['date'], reverse=True)
+    needed_qty = needed_qty if needed_qty > 0 else len(photos)
+    for photo in photos[:needed_qty]:
+        # let's detect images with the maximum resolution, based on dimensions or on type if dimensions is absent
+        img_url = ''
+        img_url_fallback = ''
+        # this needed as fallback if all resolutions will be zero
+        max_type = -1
+        # even if we will be unable to detect max resolution link, we will always take the first one
+        max_res = -1
+        for size in photo['sizes']:
+            res = size['height'] * size['width']
+            if max_res < res:
+                max_res = res
+                img_url = size['url']
+            # fallback only
+            size_type = IMG_TYPES.get(size['type'], 0)
+            if max_type < size_type:
+                max_type = size_type
+                # below line needed to prevent additional loop through sizes list in case of fallback
+                img_url_fallback = size['url']
+        # fallback if unable to detect resolutions
+        # for images older than 2012 year https://vk.com/dev/objects/photo_sizes
+        if max_res == 0:
+            img_url = img_url_fallback
+        likes_count = str(photo['likes']['count'])
+        comments_count = str(photo['comments']['count'])
+        reposts_count = str(photo['reposts']['count'])
+        result.append({'likes_count': likes_count, 'comments_count': comments_count, 'reposts_count': reposts_count,
+                       'url': img_url, 'owner_id': photo['owner_id'], 'id': photo['id']})
+    return result
+
+
+def make_users_params(user_ids=None, fields: [str] = None) -> dict:
+    """
+    Parameters of users.get, same for all clients
+    """
+    params = {'fields': prepare_params(fields, REQUIRED_USER_FIELDS)}
+    if user_ids:
+        params.update({'user_ids': prepare_params(user_ids)})
+    return params
+
+
+def make_session(pool_size: int = 10, max_retries: int = 3, backoff_factor: float = 0.3) -> requests.Session:
+    """
+    Makes HTTP session with keep-alive connections pool and retries with exponential backoff
+    on connection errors and 5xx responses
+    :param pool_size: max quantity of kept alive connections per host
+    :param max_retries: max retries of one request
+    :param backoff_factor: delay between retries is backoff_factor * (2 ** retry number)
+    :return: requests.Session
+    """
+    retry = Retry(total=max_retries, connect=max_retries, read=max_retries, backoff_factor=backoff_factor,
+                  status_forcelist=[500, 502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
 def get_response_content(response: requests.Response, path='', sep=',', error_code='error_code',
                          error_msg='error_msg', no_decode: bool = False) -> ApiResult:
     """
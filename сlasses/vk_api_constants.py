@@ -11,3 +11,13 @@ LOVE_STATUSES = {
 }
 SEXES = {1: 'женщина', 2: 'мужчина', 0: 'любой'}
 BASE_URL = 'https://api.vk.com/method/'
+# max requests per second allowed by VK https://vk.com/dev/api_requests
+PERSONAL_TOKEN_RPS = 3
+GROUP_TOKEN_RPS = 20
+# max API calls in one request of execute method https://vk.com/dev/execute
+EXECUTE_MAX_CALLS = 25
+# max users which can be received by users.search with any offset https://vk.com/dev/users.search
+SEARCH_USERS_MAX_COUNT = 1000
+REQUIRED_USER_FIELDS = ['sex', 'bdate', 'domain', 'country', 'city', 'last_seen', 'home_town']
+# photo size types in order of resolution https://vk.com/dev/objects/photo_sizes
+IMG_TYPES = {'s': 1, 'm': 2, 'x': 3, 'o': 4, 'p': 5, 'q': 6, 'r': 7, 'y': 8, 'z': 9, 'w': 10}
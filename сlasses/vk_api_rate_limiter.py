@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket rate limiter.
+    'rate': tokens added per second (allowed requests per second)
+    'burst': max tokens in bucket (requests which can be made at once without waiting)
+    """
+
+    def __init__(self, rate: float = 3, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+        # metrics
+        self.__requests = 0
+        self.__throttled = 0
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+
+    def reserve(self) -> float:
+        """
+        Takes one token from bucket (possibly in debt) and returns time in seconds which caller should wait
+        before making request. Doesn't block, suitable for asynchronous code.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            delay = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+            self.__requests += 1
+            if delay > 0:
+                self.__throttled += 1
+                self.__wait_total += delay
+                self.__wait_max = max(self.__wait_max, delay)
+            return delay
+
+    def acquire(self) -> float:
+        """
+        Blocks till request is allowed
+        :return: time in seconds spent in waiting
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Throttling statistics: how many requests were made, how many of them waited and how long
+        """
+        with self.__lock:
+            return {'requests': self.__requests,
+                    'throttled': self.__throttled,
+                    'wait_total': self.__wait_total,
+                    'wait_max': self.__wait_max,
+                    'wait_avg': self.__wait_total / self.__requests if self.__requests else 0.0}
+
+
+# process-wide buckets, one per token, as VK limits requests per token, not per client instance
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(token: str, rate: float = 3, burst: int = 1) -> TokenBucket:
+    """
+    Returns shared bucket of given token, bucket is created with given settings at first call.
+    Raises ValueError if bucket of token already exists with other settings, as one token can't have two limits
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(token)
+        if bucket is None:
+            bucket = TokenBucket(rate=rate, burst=burst)
+            _buckets[token] = bucket
+        elif (bucket.rate, bucket.burst) != (rate, burst):
+            raise ValueError(f'Bucket of token already exists with rate={bucket.rate} and burst={bucket.burst}, '
+                             f'requested rate={rate} and burst={burst}')
+        return bucket
@@ -1,4 +1,5 @@
 import sys
+import threading
 from datetime import datetime
 from random import randrange
 from time import sleep
@@ -6,36 +7,77 @@ import requests
 import vk_api
 from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
 from vk_api.keyboard import VkKeyboard
-from сlasses.vk_api_classes import VKinderClient, RATINGS, get_users_ratings_counts, format_city_name, \
-    get_dict_key_by_value, log, decorator_speed_meter, break_str, last_seen
+from сlasses.vk_api_classes import VKinderClient, VKinderSearch, CandidateSet, ApiUser, ApiPhoto, RATINGS, \
+    format_city_name, get_dict_key_by_value, log, decorator_speed_meter, break_str, last_seen, get_search_key
 from сlasses.vk_api_constants import LOVE_STATUSES, SEXES
-from сlasses.vkinder_bot_constants import PHRASES, STATUSES, MAX_MSG_SIZE, COMMANDS
-from сlasses.vk_api_client import VkApiClient
+from сlasses.vkinder_bot_constants import PHRASES, STATUSES, MAX_MSG_SIZE, COMMANDS, KEYBOARDS
+from сlasses.vk_api_client import VkApiClient, VkGroupClient
 from сlasses.vkinder_db_client import VKinderDb
+from сlasses.vkinder_dispatcher import EventDispatcher
+from сlasses.vkinder_prefetcher import PhotoPrefetcher
+from сlasses.vkinder_cache import TTLCache
+from сlasses.vkinder_catalog import VKinderCatalog
+from сlasses.vkinder_users_pool import users_pool
+from сlasses.vkinder_sessions import SessionStore, FileSessionStore, dump_client, restore_client
+from сlasses.vkinder_clients_pool import ClientsPool
+from сlasses.vkinder_profiles import ClientsProfiles, refresh_profile
 
 
 class VKinderBot:
     def __init__(self, group_token: str, person_token: str, group_id: str, app_id: str, db_name: str, db_login: str,
                  db_password: str, db_driver: str, db_host: str, db_port: int, retry_timeout: int = 1,
-                 retry_attempts: int = sys.maxsize, debug_mode=False):
+                 retry_attempts: int = sys.maxsize, workers: int = 16, prefetch_lookahead: int = 2,
+                 prefetch_workers: int = 4, search_cache_ttl: int = 600, search_cache_size: int = 100000,
+                 photos_max_age: int = 86400, photos_cache_size: int = 10000, catalog_refresh_interval: int = 7 * 86400,
+                 stream_search: bool = False, session_store: SessionStore = None, client_idle_timeout: int = 1800,
+                 clients_pool_size: int = 10000, clients_pool_weight: int = 1000000,
+                 clients_profiles_cache_size: int = 10000, client_profile_max_age: int = 7 * 86400, debug_mode=False):
         self.client_activity_timeout = 300
         self.debug_mode = debug_mode
-        self.clients_pool = {}
+        # idle clients and clients above limits of pool are moved to session store, weight is quantity of found users,
+        # limits bound memory of process as far as session store keeps sessions out of memory (files or Redis)
+        self.clients_pool = ClientsPool(self.request_eviction, idle_timeout=client_idle_timeout,
+                                        max_clients=clients_pool_size, max_weight=clients_pool_weight,
+                                        debug_mode=debug_mode)
         self.group_id = group_id
-        self.cmd = Commands(COMMANDS)
-        # countries received once per application launch (by request), as they almost doesn't changes
-        self.countries = []
+        self.cmd = Commands(COMMANDS, KEYBOARDS)
+        self.router = self.make_router()
+        # every client's messages processed in order, but different clients are served concurrently
+        self.dispatcher = EventDispatcher(workers=workers, debug_mode=debug_mode)
+        # same searches of different clients are made once per ttl, size of cache limited by total users quantity
+        self.search_cache = TTLCache(max_weight=search_cache_size, ttl=search_cache_ttl, weigher=len)
+        # show first candidate as soon as first page of search is received, the rest pages are added after that
+        self.stream_search = stream_search
+        # conversations are restored after restart or eviction, session is restored on the next message of client
+        self.sessions = session_store if session_store else FileSessionStore(debug_mode=debug_mode)
+        # photos are refreshed from VK not often than once per photos_max_age seconds
+        self.photos_max_age = photos_max_age
+        self.photos_cache = TTLCache(max_weight=photos_cache_size, ttl=photos_max_age)
+        # prefetcher threads read photos from DB by own thread-local sessions
+        self.prefetcher = PhotoPrefetcher(self.load_users_photos, lookahead=prefetch_lookahead,
+                                          workers=prefetch_workers, debug_mode=debug_mode)
         self.rebuild_tables = False
         self.retry_timeout = retry_timeout
         self.retry_attempts = retry_attempts
         self.vk_personal = VkApiClient(person_token, app_id, debug_mode=debug_mode)
+        # each dispatcher worker and prefetcher thread holds own connection during unit of work,
+        # so they never wait for each other, writer and other background threads use overflow
         self.db = VKinderDb(db_name, db_login, db_password, db_driver=db_driver, db_host=db_host, db_port=db_port,
-                            debug_mode=debug_mode)
+                            pool_size=workers + prefetch_workers, debug_mode=debug_mode)
         self.__initialized = self.vk_personal.is_initialized and self.db.is_initialized
+        # returning clients are recognized without requests to VK, their profiles are refreshed in background
+        self.profiles = ClientsProfiles(self.vk_personal, self.db, self.request_profile_refresh,
+                                        cache_size=clients_profiles_cache_size, max_age=client_profile_max_age,
+                                        debug_mode=debug_mode)
+        # countries and cities are stored in DB, as they almost doesn't changes
+        self.catalog = VKinderCatalog(self.vk_personal, self.db, refresh_interval=catalog_refresh_interval,
+                                      debug_mode=debug_mode)
         self.vk_group = vk_api.VkApi(token=group_token)
+        # vk_api library is used for long poll only, it holds one lock during every request and would serialize
+        # replies of all workers, so replies are sent by own pooled client throttled by shared bucket of token
+        self.group_client = VkGroupClient(group_token, pool_size=workers, debug_mode=debug_mode)
         try:
             self.long_poll = VkBotLongPoll(self.vk_group, self.group_id)
-            self.vk_api = self.vk_group.get_api()
         except BaseException as e:
             self.__initialized = False
             log(f'{type(self).__name__} init failed: {e.error["error_msg"]}', self.debug_mode)
@@ -46,7 +88,7 @@ class VKinderBot:
         """
         Imitation of keyboard activity from bot, suitable if we'll make network requests
         """
-        self.vk_api.messages.setActivity(type='typing', peer_id=client.vk_id)
+        self.group_client.set_activity(client.vk_id)
 
     def send_msg(self, client: VKinderClient, message: str, attachment: str = None, keyboard=None):
         """
@@ -55,24 +97,28 @@ class VKinderBot:
         # message += f'\n[step={get_dict_key_by_value(STATUSES, client.status)}, ' \
         #            f'фильтр: {get_dict_key_by_value(RATINGS, client.rating_filter)}]' if self.debug_mode else ''
         for msg in break_str(message, max_size=MAX_MSG_SIZE):
-            self.vk_api.messages.send(peer_id=client.vk_id, message=msg, attachment=attachment,
-                                      random_id=randrange(10 ** 7), keyboard=keyboard)
+            self.group_client.send_message(client.vk_id, msg, attachment=attachment, keyboard=keyboard)
 
     def get_client(self, vk_id) -> VKinderClient:
         """
-        Here we create new instance of clients class and add to clients pool
+        Here we create new instance of clients class and add to clients pool, or restore it from saved session
         If client already exists, we check his activity timeout and reset client if timeout expired
         """
-        client = self.clients_pool.get(vk_id, None)
+        client = self.clients_pool.get(vk_id)
+        if not client:
+            state = self.sessions.get(vk_id)
+            if state:
+                client = restore_client(state, self.db.load_users_by_vk_ids)
+                self.clients_pool.put(client)
+                log(f'[{client.fname} {client.lname}] Session restored with {len(client.found_users)} found users',
+                    self.debug_mode)
         if client:
             lag = int((datetime.now() - client.last_contact).total_seconds())
             if lag > self.client_activity_timeout:
                 self.do_send_to_start_after_absence(client)
         else:
-            user = self.vk_personal.get_users(vk_id)[0]
-            client = VKinderClient(user)
-            self.db.save_client(client)
-            self.clients_pool.update({user.vk_id: client})
+            client = self.profiles.get(vk_id)
+            self.clients_pool.put(client)
             self.do_greet_client(client)
         return client
 
@@ -87,156 +133,193 @@ class VKinderBot:
                 log(f'Listening for messages in group {self.group_id}...(retry #{retries})', self.debug_mode)
                 for event in self.long_poll.listen():
                     if event.type == VkBotEventType.MESSAGE_NEW:
-                        client = self.get_client(str(event.object.message['from_id']))
-                        msg = event.object.message['text']
-                        log(f'[{client.fname} {client.lname}] typed "{msg}"', self.debug_mode)
-                        msg = msg.lower()
-
-                        # obligatory exit from conversation, works at any page, highest priority,
-                        # one exception: if this command not very first one
-                        if msg in self.cmd.get('quit') and client.status != STATUSES['has_contacted']:
-                            self.do_say_goodbye(client)
-                            continue
-
-                        # imitation of custom search - works at any page, highest priority
-                        if msg == 'test':
-                            client.reset_search()
-                            client.search.sex_id = randrange(0, 2, 1)
-                            client.search.status_id = randrange(1, 8, 1)
-                            client.search.city_id = 1
-                            client.search.city_name = 'Москва'
-                            client.search.min_age = randrange(0, 60, 1)
-                            client.search.max_age = randrange(client.search.min_age, 127, 1)
-                            client.rating_filter = RATINGS['new']
-                            self.do_users_search(client)
-                            continue
-
-                        # if client prints/press something at "Welcome screen" page
-                        if client.status in (STATUSES['invited'], STATUSES['has_contacted']) \
-                                and (msg in self.cmd.get('yes') or msg in self.cmd.get('new search')):
-                            self.do_start_search_creating(client)
-
-                        elif client.status in (STATUSES['invited'], STATUSES['has_contacted']) \
-                                and msg in self.cmd.get('show history'):
-                            self.do_show_search_history(client)
-
-                        elif client.status in (STATUSES['invited'], STATUSES['has_contacted']) \
-                                and (msg in self.cmd.get('liked') or msg in self.cmd.get('disliked') or msg in
-                                     self.cmd.get('banned')):
-                            self.do_show_rated_users(msg, client)
-
-                        elif client.status in (STATUSES['invited'], STATUSES['has_contacted']) and msg in self.cmd.get(
-                                'no'):
-                            self.do_say_goodbye(client)
-
-                        elif client.status == STATUSES['has_contacted']:
-                            self.do_propose_start_search(client)
-
-                        # if client prints/press something in "Select search history" page
-                        elif client.status == STATUSES['search_history_input_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_start_search(client)
-
-                        # if client prints/press something in "Select search history" page
-                        elif client.status == STATUSES['search_history_input_wait']:
-                            self.on_search_history_choose(msg, client)
-
-                        # if client prints/press something in "Search country" page
-                        elif client.status == STATUSES['country_input_wait'] and msg in self.cmd.get('back'):
-                            self.do_start_search_creating(client)
-
-                        # if client prints/press something in "Search country" page
-                        elif client.status == STATUSES['country_input_wait']:
-                            self.on_country_name_input(msg, client)
-
-                        # if client prints/press something in "Select country" page
-                        elif client.status == STATUSES['country_choose_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_country_name_input(client)
-
-                        # if client prints/press something in "Select country" page
-                        elif client.status == STATUSES['country_choose_wait']:
-                            self.on_country_name_choose(msg, client)
-
-                        # if client prints/press something in "Search city" page
-                        elif client.status == STATUSES['city_input_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_start_search(client)
-
-                        # if client prints/press something in "Search city" page
-                        elif client.status == STATUSES['city_input_wait'] and msg in self.cmd.get('country'):
-                            self.do_propose_country_name_input(client)
-
-                        # if client prints/press something in "Search city" page
-                        elif client.status == STATUSES['city_input_wait']:
-                            self.do_propose_city_name_choose(msg, client)
-
-                        # if client prints/press something in "Select city" page
-                        elif client.status == STATUSES['city_choose_wait'] and msg in self.cmd.get('back'):
-                            self.do_start_search_creating(client)
-
-                        # if client prints/press something in "Select city" page
-                        elif client.status == STATUSES['city_choose_wait']:
-                            self.on_city_name_choose(msg, client)
-
-                        # if client prints/press something in "Select sex" page
-                        elif client.status == STATUSES['sex_choose_wait'] and msg in self.cmd.get('back'):
-                            self.do_start_search_creating(client)
-
-                        # if client prints/press something in "Select sex" page
-                        elif client.status == STATUSES['sex_choose_wait']:
-                            self.on_sex_choose(msg, client)
-
-                        # if client prints/press something in "Select love status" page
-                        elif client.status == STATUSES['status_choose_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_sex_choose(client)
-
-                        # if client prints/press something in "Select love status" page
-                        elif client.status == STATUSES['status_choose_wait']:
-                            self.on_status_choose(msg, client)
-
-                        # if client prints/press something in "Min age" page
-                        elif client.status == STATUSES['min_age_input_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_status_choose(client)
-
-                        # if client prints/press something in "Min age" page
-                        elif client.status == STATUSES['min_age_input_wait']:
-                            self.on_min_age_enter(msg, client)
-
-                        # if client prints/press something in "Max age" page
-                        elif client.status == STATUSES['max_age_input_wait'] and msg in self.cmd.get('back'):
-                            self.do_propose_min_age_enter(client)
-
-                        # if client prints/press something in "Max age" page
-                        elif client.status == STATUSES['max_age_input_wait']:
-                            self.on_max_age_enter(msg, client)
-
-                        # if client prints/press something in "User profile view" page
-                        elif client.status == STATUSES['decision_wait'] and msg in self.cmd.get('back'):
-                            if client.rating_filter == RATINGS['new']:
-                                self.do_propose_min_age_enter(client)
-                            else:
-                                self.do_propose_start_search(client)
-
-                        # if client prints/press something in "User profile view" page
-                        elif client.status == STATUSES['decision_wait']:
-                            self.on_decision_made(msg, client)
-
-                        # if command is unexpected or not recognized
-                        else:
-                            self.do_inform_about_unknown_command(client)
+                        from_id = str(event.object.message['from_id'])
+                        self.dispatcher.submit(from_id, self.serve_message, from_id, event.object.message['text'])
             except requests.exceptions.ConnectionError:
                 if retries < self.retry_attempts:
                     log(f'Error in connection. Retry in {self.retry_timeout} seconds...', self.debug_mode)
                     sleep(self.retry_timeout)
                 else:
                     log(f'Error in connection. Bot shutting down.', self.debug_mode)
+        self.clients_pool.shutdown()
+        self.dispatcher.shutdown()
+        self.prefetcher.shutdown(wait=False)
+        self.profiles.shutdown(wait=False)
+        self.sessions.close()
+        self.group_client.close()
+        self.db.close()
+
+    def serve_message(self, from_id: str, msg: str):
+        """
+        Processes single incoming message of client and saves session, called by dispatcher in worker thread
+        """
+        self.handle_message(from_id, msg)
+        self.save_session(from_id)
+
+    def save_session(self, vk_id: str):
+        """
+        Session of client is saved in worker thread of client, as client's state is changed only by this thread
+        """
+        client = self.clients_pool.get(vk_id, touch=False)
+        if client:
+            self.sessions.put(vk_id, dump_client(client))
+        else:
+            self.sessions.remove(vk_id)
+
+    def request_eviction(self, vk_id: str, idle: bool):
+        """
+        Called by sweeper of clients pool, eviction is queued after messages of client which are already received
+        """
+        self.dispatcher.submit(vk_id, self.evict_client, vk_id, idle)
+
+    def request_profile_refresh(self, vk_id: str, user: ApiUser):
+        """
+        Called with profile received from VK in background, profile is applied after messages of client
+        which are already received
+        """
+        self.dispatcher.submit(vk_id, self.refresh_client_profile, vk_id, user)
+
+    def refresh_client_profile(self, vk_id: str, user: ApiUser):
+        """
+        Updates profile of client, called by dispatcher in worker thread of client
+        """
+        client = self.clients_pool.get(vk_id, touch=False)
+        # client has left, so profile will be refreshed on the next contact
+        if not client:
+            return
+        refresh_profile(client, user)
+        self.db.save_client(client)
+        self.profiles.put(client)
+        self.save_session(vk_id)
+
+    def evict_client(self, vk_id: str, idle: bool):
+        """
+        Moves client from memory to session store, called by dispatcher in worker thread of client
+        :param idle: True if client is evicted due to inactivity, so eviction is cancelled if client became active
+        """
+        client = self.clients_pool.get(vk_id, touch=False)
+        if not client:
+            return
+        if idle and not self.clients_pool.is_idle(client):
+            self.clients_pool.release(vk_id)
+            return
+        # client is kept in memory until its session is written, otherwise conversation would be lost
+        if not self.sessions.save(vk_id, dump_client(client)):
+            self.clients_pool.release(vk_id)
+            return
+        self.prefetcher.cancel(client)
+        self.profiles.put(client)
+        self.clients_pool.pop(vk_id)
+        log(f'[{client.fname} {client.lname}] Evicted from memory: {self.clients_pool.metrics}', self.debug_mode)
+
+    def handle_message(self, from_id: str, msg: str):
+        """
+        Processes single incoming message of client, called by dispatcher in worker thread
+        """
+        client = self.get_client(from_id)
+        log(f'[{client.fname} {client.lname}] typed "{msg}"', self.debug_mode)
+        msg = msg.lower()
+        command = self.cmd.find(msg)
+
+        # imitation of custom search - works at any page, but exit has higher priority
+        if command is None and msg == 'test':
+            self.do_test_search(client)
+            return
+
+        self.router.route(client.status, command)(msg, client)
+
+    def make_router(self):
+        """
+        Dispatch table of conversation: pages of bot are statuses of client, buttons of page are commands
+        """
+        router = Router(lambda msg, client: self.do_inform_about_unknown_command(client))
+        welcome = (STATUSES['invited'], STATUSES['has_contacted'])
+
+        # obligatory exit from conversation, works at any page,
+        # one exception: if this command not very first one
+        router.add([status for status in STATUSES.values() if status != STATUSES['has_contacted']], ['quit'],
+                   lambda msg, client: self.do_say_goodbye(client))
+
+        # if client prints/press something at "Welcome screen" page
+        router.add(welcome, ['yes', 'new search'], lambda msg, client: self.do_start_search_creating(client))
+        router.add(welcome, ['show history'], lambda msg, client: self.do_show_search_history(client))
+        router.add(welcome, ['liked', 'disliked', 'banned'], self.do_show_rated_users)
+        router.add(welcome, ['no'], lambda msg, client: self.do_say_goodbye(client))
+        router.fallback([STATUSES['has_contacted']], lambda msg, client: self.do_propose_start_search(client))
+
+        # if client prints/press something in "Select search history" page
+        router.add([STATUSES['search_history_input_wait']], ['back'],
+                   lambda msg, client: self.do_propose_start_search(client))
+        router.fallback([STATUSES['search_history_input_wait']], self.on_search_history_choose)
+
+        # if client prints/press something in "Search country" page
+        router.add([STATUSES['country_input_wait']], ['back'],
+                   lambda msg, client: self.do_start_search_creating(client))
+        router.fallback([STATUSES['country_input_wait']], self.on_country_name_input)
+
+        # if client prints/press something in "Select country" page
+        router.add([STATUSES['country_choose_wait']], ['back'],
+                   lambda msg, client: self.do_propose_country_name_input(client))
+        router.fallback([STATUSES['country_choose_wait']], self.on_country_name_choose)
+
+        # if client prints/press something in "Search city" page
+        router.add([STATUSES['city_input_wait']], ['back'], lambda msg, client: self.do_propose_start_search(client))
+        router.add([STATUSES['city_input_wait']], ['country'],
+                   lambda msg, client: self.do_propose_country_name_input(client))
+        router.fallback([STATUSES['city_input_wait']], self.do_propose_city_name_choose)
+
+        # if client prints/press something in "Select city" page
+        router.add([STATUSES['city_choose_wait']], ['back'], lambda msg, client: self.do_start_search_creating(client))
+        router.fallback([STATUSES['city_choose_wait']], self.on_city_name_choose)
+
+        # if client prints/press something in "Select sex" page
+        router.add([STATUSES['sex_choose_wait']], ['back'], lambda msg, client: self.do_start_search_creating(client))
+        router.fallback([STATUSES['sex_choose_wait']], self.on_sex_choose)
+
+        # if client prints/press something in "Select love status" page
+        router.add([STATUSES['status_choose_wait']], ['back'], lambda msg, client: self.do_propose_sex_choose(client))
+        router.fallback([STATUSES['status_choose_wait']], self.on_status_choose)
+
+        # if client prints/press something in "Min age" page
+        router.add([STATUSES['min_age_input_wait']], ['back'],
+                   lambda msg, client: self.do_propose_status_choose(client))
+        router.fallback([STATUSES['min_age_input_wait']], self.on_min_age_enter)
+
+        # if client prints/press something in "Max age" page
+        router.add([STATUSES['max_age_input_wait']], ['back'],
+                   lambda msg, client: self.do_propose_min_age_enter(client))
+        router.fallback([STATUSES['max_age_input_wait']], self.on_max_age_enter)
+
+        # if client prints/press something in "User profile view" page
+        router.add([STATUSES['decision_wait']], ['back'], lambda msg, client: self.do_return_from_decision(client))
+        router.fallback([STATUSES['decision_wait']], self.on_decision_made)
+        return router
+
+    def do_test_search(self, client: VKinderClient):
+        client.reset_search()
+        client.search.sex_id = randrange(0, 2, 1)
+        client.search.status_id = randrange(1, 8, 1)
+        client.search.city_id = 1
+        client.search.city_name = 'Москва'
+        client.search.min_age = randrange(0, 60, 1)
+        client.search.max_age = randrange(client.search.min_age, 127, 1)
+        client.rating_filter = RATINGS['new']
+        self.do_users_search(client)
+
+    def do_return_from_decision(self, client: VKinderClient):
+        if client.rating_filter == RATINGS['new']:
+            self.do_propose_min_age_enter(client)
+        else:
+            self.do_propose_start_search(client)
 
     # @decorator_speed_meter(True)
     def on_decision_made(self, msg: str, client: VKinderClient):
         if msg in self.cmd.get('yes'):
-            client.active_user.rating_id = RATINGS['liked']
+            client.rate_active_user(RATINGS['liked'])
         elif msg in self.cmd.get('no'):
-            client.active_user.rating_id = RATINGS['disliked']
+            client.rate_active_user(RATINGS['disliked'])
         elif msg in self.cmd.get('ban'):
-            client.active_user.rating_id = RATINGS['banned']
+            client.rate_active_user(RATINGS['banned'])
         else:
             self.do_inform_about_unknown_command(client)
             return
@@ -253,13 +336,13 @@ class VKinderBot:
             self.do_send_to_start_due_to_reach_end(client)
             self.do_propose_start_search(client)
             return
-        client.active_user.photos = self.vk_personal.get_user_photos(client.active_user.vk_id)
-        if not client.active_user.photos:
-            client.active_user.photos = self.vk_personal.get_user_photos(client.active_user.vk_id, album_id='wall')
-        photos = [f'photo{photo.owner_id}_{photo.id}' for photo in client.active_user.photos]
-        photos_str = ','.join(photos)
+        # user might be shared with other clients, so photos are kept by photos cache, not by user
+        photos = self.prefetcher.pop(client, client.active_user)
+        if photos is None:
+            photos = self.load_user_photos(client.active_user)
+        photos_str = ','.join(f'photo{photo.owner_id}_{photo.id}' for photo in photos)
         log(f'[{client.fname} {client.lname}] Showing user: {client.active_user.fname} '
-            f'{client.active_user.lname} with {len(client.active_user.photos)} photos', self.debug_mode)
+            f'{client.active_user.lname} with {len(photos)} photos', self.debug_mode)
         age_str = f', возраст: {client.active_user.age}' if client.active_user.age else ''
         user_info = f'{client.active_user.fname} {client.active_user.lname} '
         user_info += f'({client.active_user.city_name}{age_str})'
@@ -267,10 +350,52 @@ class VKinderBot:
         keyboard = self.cmd.kb(['yes', 'no', 'ban', None, 'back', 'quit'])
         self.send_msg(client, user_info, attachment=photos_str, keyboard=keyboard)
         self.send_msg(client, PHRASES['do_you_like_it'])
-        self.db.save_photos(client)
+        # while client is deciding, we are loading photos of next users
+        self.prefetcher.schedule(client)
+
+    def load_user_photos(self, user: ApiUser) -> list[ApiPhoto]:
+        """
+        Gets the best photos of user, see load_users_photos
+        """
+        return self.load_users_photos([user])[user.vk_id]
+
+    def load_users_photos(self, users: list[ApiUser]) -> dict[str, list[ApiPhoto]]:
+        """
+        Gets the best photos of users from profile, or from wall if profile is empty.
+        Photos are taken from memory cache or from DB if they are fresh enough, otherwise they are refreshed from VK,
+        photos of all such users are requested together via execute
+        :return: dict {user VK id: list of ApiPhoto}
+        """
+        result = {}
+        missing = []
+        for user in users:
+            photos = self.photos_cache.get(user.vk_id)
+            if photos is None:
+                photos = self.db.load_photos(user.vk_id, self.photos_max_age)
+                if photos is not None:
+                    self.photos_cache.put(user.vk_id, photos)
+            if photos is None:
+                missing.append(user.vk_id)
+            else:
+                result[user.vk_id] = photos
+        if not missing:
+            return result
+        loaded = self.vk_personal.get_users_photos(missing)
+        empty = [vk_id for vk_id in missing if not loaded.get(vk_id)]
+        if empty:
+            loaded.update(self.vk_personal.get_users_photos(empty, album_id='wall'))
+        for vk_id in missing:
+            photos = loaded.get(vk_id, [])
+            result[vk_id] = photos
+            # empty list might be caused by error, so it isn't saved
+            if photos:
+                self.db.save_photos(vk_id, photos)
+                self.photos_cache.put(vk_id, photos)
+        return result
 
     def do_show_rated_users(self, msg: str, client: VKinderClient):
         client.status = STATUSES['loading_users']
+        self.prefetcher.cancel(client)
         if msg in self.cmd.get('banned'):
             client.rating_filter = RATINGS['banned']
         elif msg in self.cmd.get('disliked'):
@@ -287,26 +412,37 @@ class VKinderBot:
     # @decorator_speed_meter(True)
     def do_users_search(self, client: VKinderClient):
         client.status = STATUSES['loading_users']
+        self.prefetcher.cancel(client)
         params = PHRASES['city_x_sex_x_status_x_age_xx'].format(client.search.city_name, SEXES[client.search.sex_id],
                                                                 LOVE_STATUSES[client.search.status_id],
                                                                 client.search.min_age, client.search.max_age)
         self.send_msg(client, f'{PHRASES["started_search_peoples"]}\n({params})')
         self.send_typing_activity(client)
         self.db.save_search(client)
-        client.found_users = self.vk_personal.search_users(city_id=client.search.city_id, sex_id=client.search.sex_id,
-                                                           love_status_id=client.search.status_id,
-                                                           age_from=client.search.min_age, age_to=client.search.max_age)
-        client.found_users = [user for user in client.found_users if not user.is_closed and user.last_seen_time]
-        client.found_users.sort(key=lambda x: x.last_seen_time, reverse=True)
+        if self.stream_search:
+            # pages are taken till the first one with new users, the rest are loaded after showing of candidate
+            pages = self.iter_search_users(client.search)
+            client.found_users = []
+            for page in pages:
+                client.found_users.extend(page)
+                self.db.load_users_ratings_from_db(client, page)
+                if client.found_users.ratings_counts()['new'] > 0:
+                    break
+        else:
+            client.found_users = self.search_users(client.search)
+            if client.found_users:
+                self.db.load_users_ratings_from_db(client)
         if client.found_users:
-            self.db.load_users_ratings_from_db(client)
-            ratings_sum = get_users_ratings_counts(client.found_users)
+            ratings_sum = client.found_users.ratings_counts()
             self.send_msg(client, PHRASES['found_x_peoples_x_new_x_liked_x_disliked_x_banned'].format(
                 len(client.found_users), ratings_sum['new'], ratings_sum['liked'], ratings_sum['disliked'],
                 ratings_sum['banned']))
             if ratings_sum['new'] > 0:
                 self.db.save_users(client)
                 self.do_show_next_user(client)
+                if self.stream_search:
+                    # queued before next messages of client, so they will see all found users
+                    self.dispatcher.submit(client.vk_id, self.do_load_next_users, client, pages)
             else:
                 self.send_msg(client, PHRASES['no_new_peoples_found'])
                 self.do_propose_start_search(client)
@@ -314,6 +450,57 @@ class VKinderBot:
             self.send_msg(client, PHRASES['no_peoples_found'])
             self.do_propose_start_search(client)
 
+    def do_load_next_users(self, client: VKinderClient, pages):
+        """
+        Adds the rest pages of streamed search to found users of client
+        """
+        found_users = client.found_users
+        for page in pages:
+            # client started another search or switched to rated users
+            if client.found_users is not found_users:
+                pages.close()
+                return
+            found_users += page
+            self.db.load_users_ratings_from_db(client, page)
+            self.db.save_users(client, page)
+        log(f'[{client.fname} {client.lname}] Totally found {len(found_users)} users', self.debug_mode)
+        self.save_session(client.vk_id)
+
+    def iter_search_users(self, search: VKinderSearch):
+        """
+        Searches open and active users page by page, each page sorted by last seen time.
+        Whole result is cached when all pages are received, cached result is yielded as one page.
+        Users are shared between clients via pool, ratings are kept by found users of each client
+        :return: generator of lists of ApiUser
+        """
+        key = get_search_key(search)
+        users = self.search_cache.get(key)
+        if users is not None:
+            log(f'Search results are taken from cache: {self.search_cache.metrics}', self.debug_mode)
+            yield list(users)
+            return
+        users = []
+        for page in self.vk_personal.iter_search_users(city_id=search.city_id, sex_id=search.sex_id,
+                                                       love_status_id=search.status_id, age_from=search.min_age,
+                                                       age_to=search.max_age):
+            page = CandidateSet(users_pool.resolve_all(page))
+            page = page.select(~page.column('is_closed') & (page.column('last_seen_time') > 0))
+            page = page.sorted_by('last_seen_time', reverse=True)
+            users += page
+            yield list(page)
+        users.sort(key=lambda x: x.last_seen_time, reverse=True)
+        # empty result might be caused by error, so it isn't cached
+        if users:
+            self.search_cache.put(key, users)
+
+    def search_users(self, search: VKinderSearch) -> CandidateSet:
+        """
+        Searches open and active users, sorted by last seen time. Results are shared between clients via cache,
+        each client receives own ratings of users
+        """
+        users = CandidateSet(user for page in self.iter_search_users(search) for user in page)
+        return users.sorted_by('last_seen_time', reverse=True)
+
     # @decorator_speed_meter(True)
     def on_max_age_enter(self, max_age: str, client: VKinderClient):
         result = None
@@ -445,7 +632,7 @@ class VKinderBot:
         self.send_typing_activity(client)
         # this needed to prevent repeated search operations with same city name
         if city:
-            client.found_cities = self.vk_personal.search_cities(country_id=client.country_id, city_name=city)
+            client.found_cities = self.catalog.search_cities(client.country_id, city)
         cities = [f'{index}. {format_city_name(city)}' for index, city in enumerate(client.found_cities, 1)]
         if cities:
             keyboard = self.cmd.kb(['back', 'quit'])
@@ -477,12 +664,7 @@ class VKinderBot:
     def on_country_name_input(self, country_name: str, client: VKinderClient):
         client.status = STATUSES['country_choose_wait']
         self.send_typing_activity(client)
-        # this needed to prevent repeated search operations for countries names
-        if not self.countries:
-            self.countries = self.vk_personal.get_countries()
-        # filter countries by country_name
-        client.found_countries = [country for country in self.countries
-                                  if country.title.lower().find(country_name) > -1]
+        client.found_countries = self.catalog.search_countries(country_name)
         countries = [f'{index}. {country.title}' for index, country in enumerate(client.found_countries, 1)]
         if countries:
             keyboard = self.cmd.kb(['back', 'quit'])
@@ -504,6 +686,7 @@ class VKinderBot:
         # revert to default for new search
         client.rating_filter = RATINGS['new']
         client.reset_search()
+        self.prefetcher.cancel(client)
         keyboard = self.cmd.kb(['country', None, 'back', 'quit'])
         self.send_msg(client, PHRASES['enter_city_name_in_x'].format(client.country_name), keyboard=keyboard)
 
@@ -581,29 +764,50 @@ class VKinderBot:
         else:
             keyboard = self.cmd.kb(['new search', 'show history', None, 'liked', 'disliked', 'banned', None, 'quit'])
             self.send_msg(client, PHRASES['goodbye_x'].format(client.fname), keyboard=keyboard)
+        self.prefetcher.cancel(client)
+        self.profiles.put(client)
         self.clients_pool.pop(client.vk_id)
 
 
 class Commands:
-    def __init__(self, commands):
+    def __init__(self, commands, keyboards: list = None):
         self._commands = commands
-        self._keyboard = VkKeyboard()
-
-    def kb(self, params: list = None, one_time: bool = False):
+        # lowercased synonyms are made once, synonym -> command name is used to recognize messages
+        self._synonyms = {name: [x.lower() for x in command[0]] for name, command in commands.items()}
+        self._names = {synonym: name for name, synonyms in self._synonyms.items() for synonym in synonyms}
+        # (layout, one_time) -> JSON of keyboard, known layouts are compiled beforehand, other ones on first use
+        self._keyboards: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        for params in keyboards or []:
+            for one_time in (False, True):
+                self.kb(params, one_time)
+
+    def kb(self, params: list = None, one_time: bool = False) -> str:
+        """
+        Gets JSON of keyboard of vk_api with buttons of given commands
+        """
+        key = (tuple(params) if params else (), one_time)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self.make_keyboard(params, one_time)
+            with self._lock:
+                keyboard = self._keyboards.setdefault(key, keyboard)
+        return keyboard
+
+    def make_keyboard(self, params: list = None, one_time: bool = False) -> str:
         """
         Makes buttons that used by keyboard of vk_api
         """
         if not params:
-            self._keyboard = VkKeyboard()
-            return self._keyboard.get_empty_keyboard()
-        self._keyboard = VkKeyboard(one_time=one_time)
+            return VkKeyboard.get_empty_keyboard()
+        keyboard = VkKeyboard(one_time=one_time)
         for param in params:
             if param is None:
-                self._keyboard.add_line()
+                keyboard.add_line()
                 continue
             btn = self.get(param, True)
-            self._keyboard.add_button(btn[0], color=btn[1])
-        return self._keyboard.get_keyboard()
+            keyboard.add_button(btn[0], color=btn[1])
+        return keyboard.get_keyboard()
 
     def get(self, command_name: str, make_button=False):
         """
@@ -614,4 +818,41 @@ class Commands:
             return []
         if make_button:
             return [command[0][0], command[1]]
-        return [x.lower() for x in command[0]]
+        return self._synonyms[command_name]
+
+    def find(self, msg: str) -> str:
+        """
+        :param msg: lowercased message
+        :return: name of command which has such synonym, or None
+        """
+        return self._names.get(msg)
+
+
+class Router:
+    """
+    Dispatch table of bot: (client status, command name) -> handler(msg, client).
+    Message which isn't command expected at page goes to fallback handler of status, or to default one
+    """
+
+    def __init__(self, default):
+        self.__default = default
+        self.__routes = {}
+        self.__fallbacks = {}
+
+    def add(self, statuses, commands: list, handler):
+        for status in statuses:
+            for command in commands:
+                self.__routes[(status, command)] = handler
+
+    def fallback(self, statuses, handler):
+        for status in statuses:
+            self.__fallbacks[status] = handler
+
+    def route(self, status: int, command: str):
+        """
+        :param command: name of command recognized in message, or None for free text
+        """
+        handler = self.__routes.get((status, command))
+        if handler is None:
+            handler = self.__fallbacks.get(status, self.__default)
+        return handler
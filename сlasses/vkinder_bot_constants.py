@@ -77,3 +77,13 @@ COMMANDS = {
     'banned': [['Забаненые', 'забаненые', 'banned'], 'secondary'],
     'country': [['☭ Выбор страны', 'страна', '/страна', 'country'], 'primary']
 }
+# layouts of keyboards used by bot, they are compiled once, None starts new line of buttons
+KEYBOARDS = [
+    [],
+    ['back', 'quit'],
+    ['yes', 'no'],
+    ['yes', 'no', 'ban', None, 'back', 'quit'],
+    ['woman', 'man', 'anybody', None, 'back', 'quit'],
+    ['country', None, 'back', 'quit'],
+    ['new search', 'show history', None, 'liked', 'disliked', 'banned', None, 'quit']
+]
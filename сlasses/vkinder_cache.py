@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache with time to live of entries.
+    'max_weight': limit of total weight of entries, least recently used entries are evicted when exceeded
+    'ttl': seconds after which entry is expired
+    'weigher': function which estimates weight (memory usage) of value, each entry weights 1 by default
+    """
+
+    def __init__(self, max_weight: int = 1000, ttl: float = 600, weigher=None):
+        self.max_weight = max_weight
+        self.ttl = ttl
+        self.__weigher = weigher if weigher else lambda value: 1
+        self.__lock = threading.Lock()
+        # key -> (expiration time, weight, value), ordered from least to most recently used
+        self.__entries = OrderedDict()
+        self.__weight = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key):
+        """
+        :return: cached value or None if it is absent or expired
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self.__remove(key)
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, value):
+        weight = self.__weigher(value)
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            # value heavier than whole cache wouldn't be stored
+            if weight > self.max_weight:
+                return
+            self.__entries[key] = (time.monotonic() + self.ttl, weight, value)
+            self.__weight += weight
+            while self.__weight > self.max_weight:
+                self.__remove(next(iter(self.__entries)))
+                self.__evictions += 1
+
+    def pop(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__remove(key)
+                return entry[2]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__weight = 0
+
+    def __remove(self, key):
+        """
+        Internal use only, must be called under lock
+        """
+        entry = self.__entries.pop(key)
+        self.__weight -= entry[1]
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def metrics(self) -> dict:
+        with self.__lock:
+            requests_count = self.__hits + self.__misses
+            return {'hits': self.__hits,
+                    'misses': self.__misses,
+                    'hit_ratio': self.__hits / requests_count if requests_count else 0.0,
+                    'evictions': self.__evictions,
+                    'entries': len(self.__entries),
+                    'weight': self.__weight}
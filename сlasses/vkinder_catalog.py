@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from сlasses.vk_api_classes import ApiCountry, ApiCity, log
+from сlasses.vk_api_client import VkApiClient
+from сlasses.vkinder_db_client import VKinderDb
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercased text with ё replaced by е, as titles and queries are written both ways
+    """
+    return text.lower().replace('ё', 'е')
+
+
+class CatalogIndex:
+    """
+    In-memory index of titles: prefix search by beginning of any word and substring search by trigrams.
+    Search ignores case and difference between ё and е. Results are returned in order of given items.
+    """
+
+    def __init__(self, items: list, key=lambda item: item.title):
+        self.items = items
+        titles = [normalize(key(item) or '') for item in items]
+        self.__titles = titles
+        # sorted pairs (word, item index), whole title is also a word, so queries with spaces are supported
+        words = set()
+        for index, title in enumerate(titles):
+            words.add((title, index))
+            words.update((word, index) for word in re.split(r'[\s\-()]+', title) if word)
+        self.__words = sorted(words)
+        self.__trigrams = defaultdict(set)
+        for index, title in enumerate(titles):
+            for pos in range(len(title) - 2):
+                self.__trigrams[title[pos:pos + 3]].add(index)
+
+    def prefix_search(self, query: str) -> list:
+        query = normalize(query)
+        found = set()
+        for pos in range(bisect_left(self.__words, (query,)), len(self.__words)):
+            word, index = self.__words[pos]
+            if not word.startswith(query):
+                break
+            found.add(index)
+        return [self.items[index] for index in sorted(found)]
+
+    def substring_search(self, query: str) -> list:
+        query = normalize(query)
+        if len(query) < 3:
+            candidates = range(len(self.items))
+        else:
+            candidates = set.intersection(*[self.__trigrams.get(query[pos:pos + 3], set())
+                                            for pos in range(len(query) - 2)])
+        return [self.items[index] for index in sorted(candidates) if query in self.__titles[index]]
+
+
+class VKinderCatalog:
+    """
+    Countries and cities catalog, which is stored in DB and answers lookups locally.
+    VK is requested only if there is no fresh local answer, catalog entries are refreshed once per refresh_interval.
+    """
+
+    def __init__(self, vk: VkApiClient, db: VKinderDb, refresh_interval: int = 7 * 86400, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.refresh_interval = refresh_interval
+        self.__vk = vk
+        self.__db = db
+        self.__lock = threading.Lock()
+        self.__countries: CatalogIndex = None
+        self.__countries_loaded = 0.0
+        # country id -> {query: (list of ApiCity, CatalogIndex)}
+        self.__cities: dict[int, dict[str, tuple[list[ApiCity], CatalogIndex]]] = {}
+        self.__cities_loaded: dict[int, float] = {}
+
+    def search_countries(self, name: str) -> list[ApiCountry]:
+        """
+        Countries which titles contain given name
+        """
+        with self.__lock:
+            countries = self.__countries
+            if countries is not None and not self.__is_expired(self.__countries_loaded):
+                return countries.substring_search(name.strip())
+        # DB and VK are requested without lock, so lookups of other clients don't wait for them
+        countries = self.__db.load_countries(self.refresh_interval)
+        if countries is None:
+            countries = self.__vk.get_countries()
+            if countries:
+                self.__db.save_countries(countries)
+        # empty result is caused by failure, it isn't kept, so countries are requested again at next lookup
+        if not countries:
+            return []
+        index = CatalogIndex(countries)
+        with self.__lock:
+            self.__countries = index
+            self.__countries_loaded = time.monotonic()
+        return index.substring_search(name.strip())
+
+    def search_cities(self, country_id: int, name: str) -> list[ApiCity]:
+        """
+        Cities of country with names which start with given name, like VK search does.
+        Answered locally if the same name or its beginning was already searched in VK.
+        """
+        query = normalize(name.strip())
+        with self.__lock:
+            queries = self.__cities.get(country_id)
+            if queries is not None and self.__is_expired(self.__cities_loaded.get(country_id, 0.0)):
+                queries = None
+        if queries is None:
+            # queries saved before normalization was introduced might contain ё
+            queries = {normalize(query): (cities, CatalogIndex(cities)) for query, cities in
+                       self.__db.load_cities_queries(country_id, self.refresh_interval).items()}
+            with self.__lock:
+                # queries searched in VK or loaded by other client meanwhile are kept
+                if not self.__is_expired(self.__cities_loaded.get(country_id, 0.0)):
+                    queries.update(self.__cities.get(country_id, {}))
+                self.__cities[country_id] = queries
+                self.__cities_loaded[country_id] = time.monotonic()
+        if query in queries:
+            return queries[query][0]
+        # all cities which names start with query are among results of any searched beginning of query
+        for length in range(len(query) - 1, 0, -1):
+            cached = queries.get(query[:length])
+            if cached is not None:
+                log(f'City "{query}" found locally by "{query[:length]}"', self.debug_mode)
+                return cached[1].prefix_search(query)
+        cities = self.__vk.search_cities(country_id=country_id, city_name=query)
+        if cities:
+            self.__db.save_cities_query(country_id, query, cities)
+            with self.__lock:
+                self.__cities.setdefault(country_id, {})[query] = (cities, CatalogIndex(cities))
+        return cities
+
+    def __is_expired(self, loaded: float) -> bool:
+        return time.monotonic() - loaded > self.refresh_interval
+
+    def clear(self):
+        """
+        Drops in-memory catalog, it will be reloaded from DB at next lookup
+        """
+        with self.__lock:
+            self.__countries = None
+            self.__cities = {}
+            self.__cities_loaded = {}
@@ -0,0 +1,145 @@
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from сlasses.vk_api_classes import VKinderClient, log
+
+
+class ClientsPool:
+    """
+    Thread safe pool of clients in memory by VK id, ordered from least to most recently used.
+    Sweeper thread finds clients which are idle longer than idle_timeout by heap of their last contact times,
+    and least recently used clients while pool exceeds max_clients or max_weight (total quantity of found users).
+    Such clients are passed to evict(vk_id, idle) function, which must call pop if client is evicted,
+    or release if client is kept
+    """
+
+    def __init__(self, evict, idle_timeout: float = 1800, max_clients: int = 10000, max_weight: int = 1000000,
+                 sweep_interval: float = 10, debug_mode=False):
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.max_weight = max_weight
+        self.sweep_interval = sweep_interval
+        self.debug_mode = debug_mode
+        self.__evict = evict
+        self.__lock = threading.Condition()
+        self.__clients: OrderedDict[str, VKinderClient] = OrderedDict()
+        # (time when client becomes idle, VK id), time is checked again when entry is taken, as client might be active
+        self.__deadlines: list[tuple[float, str]] = []
+        # VK id -> True for idle client, False for least recently used one, while client is being evicted
+        self.__evicting: dict[str, bool] = {}
+        self.__evicted_idle = 0
+        self.__evicted_lru = 0
+        self.__closed = False
+        self.__sweeper = threading.Thread(target=self.__sweep_periodically, name='clients_sweeper', daemon=True)
+        self.__sweeper.start()
+
+    def get(self, vk_id: str, touch: bool = True) -> VKinderClient:
+        """
+        :param touch: False if getting of client shouldn't make it most recently used
+        """
+        with self.__lock:
+            client = self.__clients.get(vk_id)
+            if client is not None and touch:
+                self.__clients.move_to_end(vk_id)
+            return client
+
+    def put(self, client: VKinderClient):
+        with self.__lock:
+            self.__clients[client.vk_id] = client
+            self.__clients.move_to_end(client.vk_id)
+            heapq.heappush(self.__deadlines, (self.__idle_deadline(client), client.vk_id))
+            if len(self.__clients) > self.max_clients:
+                self.__lock.notify()
+
+    def pop(self, vk_id: str) -> VKinderClient:
+        with self.__lock:
+            evicting = self.__evicting.pop(vk_id, None)
+            if evicting is not None:
+                if evicting:
+                    self.__evicted_idle += 1
+                else:
+                    self.__evicted_lru += 1
+            return self.__clients.pop(vk_id, None)
+
+    def release(self, vk_id: str):
+        """
+        Cancels eviction of client, which became active again
+        """
+        with self.__lock:
+            self.__evicting.pop(vk_id, None)
+            client = self.__clients.get(vk_id)
+            if client is not None:
+                heapq.heappush(self.__deadlines, (self.__idle_deadline(client), vk_id))
+
+    def is_idle(self, client: VKinderClient) -> bool:
+        return self.__idle_deadline(client) <= datetime.now().timestamp()
+
+    def __idle_deadline(self, client: VKinderClient) -> float:
+        return client.last_contact.timestamp() + self.idle_timeout
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__clients)
+
+    def __sweep_periodically(self):
+        """
+        Internal use only. Sweeper thread
+        """
+        while True:
+            with self.__lock:
+                self.__lock.wait(self.sweep_interval)
+                if self.__closed:
+                    return
+            self.sweep()
+
+    def sweep(self):
+        """
+        Passes idle clients and least recently used clients above limits to evict function
+        """
+        now = datetime.now().timestamp()
+        idle = []
+        lru = []
+        with self.__lock:
+            while self.__deadlines and self.__deadlines[0][0] <= now:
+                _, vk_id = heapq.heappop(self.__deadlines)
+                client = self.__clients.get(vk_id)
+                # client is already evicted or gone, or entry is outdated by newer one
+                if client is None or vk_id in self.__evicting:
+                    continue
+                deadline = self.__idle_deadline(client)
+                if deadline > now:
+                    heapq.heappush(self.__deadlines, (deadline, vk_id))
+                    continue
+                self.__evicting[vk_id] = True
+                idle.append(vk_id)
+            kept = [(vk_id, client) for vk_id, client in self.__clients.items() if vk_id not in self.__evicting]
+            weight = sum(len(client.found_users) for _, client in kept)
+            for vk_id, client in kept:
+                if len(kept) - len(lru) <= self.max_clients and weight <= self.max_weight:
+                    break
+                self.__evicting[vk_id] = False
+                lru.append(vk_id)
+                weight -= len(client.found_users)
+        if idle or lru:
+            log(f'Evicting {len(idle)} idle and {len(lru)} least recently used clients, pool: {self.metrics}',
+                self.debug_mode)
+        for vk_id in idle:
+            self.__evict(vk_id, True)
+        for vk_id in lru:
+            self.__evict(vk_id, False)
+
+    @property
+    def metrics(self) -> dict:
+        with self.__lock:
+            return {'size': len(self.__clients),
+                    'weight': sum(len(client.found_users) for client in self.__clients.values()),
+                    'evicting': len(self.__evicting),
+                    'evicted_idle': self.__evicted_idle,
+                    'evicted_lru': self.__evicted_lru}
+
+    def shutdown(self):
+        with self.__lock:
+            self.__closed = True
+            self.__lock.notify()
+        self.__sweeper.join()
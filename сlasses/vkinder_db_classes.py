@@ -1,9 +1,8 @@
 import sqlalchemy as sa
-from sqlalchemy import ForeignKey, PrimaryKeyConstraint, func
+from sqlalchemy import ForeignKey, PrimaryKeyConstraint, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from сlasses.vk_api_classes import ApiUser
-from сlasses.vk_api_constants import RATINGS
+from сlasses.vk_api_classes import ApiUser, ApiPhoto, ApiCountry, ApiCity
 
 Base = declarative_base()
 
@@ -26,12 +25,14 @@ class Clients(Base):
     birth_year = sa.Column(sa.Integer)
     sex_id = sa.Column(sa.Integer)
     updated = sa.Column(sa.TIMESTAMP(timezone=True), default=func.now())
+    # time when profile was received from VK
+    profile_updated = sa.Column(sa.TIMESTAMP(timezone=True))
     rated_users = relationship('Users', secondary='clients_users')
     tagged_photos = relationship('Photos', secondary='clients_userphotos')
 
-    def convert_to_ApiUser(self, rating_id=RATINGS['new']) -> ApiUser:
+    def convert_to_ApiUser(self) -> ApiUser:
         """
-        Needed when we restore from DB previously saved users
+        Needed when we restore from DB previously saved clients
         """
         bdate = [str(self.birth_day) if self.birth_day is not None else '',
                  str(self.birth_month) if self.birth_month is not None else '',
@@ -44,13 +45,20 @@ class Clients(Base):
                    'id': self.country_id,
                    'title': self.country_name
                },
+               'city': {
+                   'id': self.city_id,
+                   'title': self.city_name
+               },
+               'home_town': self.hometown,
                'last_seen': {
                    'time': None,
                },
                'domain': self.domain,
                'bdate': '.'.join(bdate),
                }
-        return ApiUser(row, rating_id=rating_id)
+        user = ApiUser(row)
+        user.db_id = self.id
+        return user
 
 
 class Users(Base):
@@ -74,7 +82,7 @@ class Users(Base):
     raters = relationship('Clients', secondary='clients_users')
     searches = relationship('Searches', secondary='searches_users')
 
-    def convert_to_ApiUser(self, rating_id=RATINGS['new']) -> ApiUser:
+    def convert_to_ApiUser(self) -> ApiUser:
         """
         Needed when we restore from DB previously saved users
         """
@@ -95,12 +103,15 @@ class Users(Base):
                'domain': self.domain,
                'bdate': '.'.join(bdate),
                }
-        return ApiUser(row, rating_id=rating_id)
+        return ApiUser(row)
 
 
 class ClientsUsers(Base):
     __tablename__ = 'clients_users'
-    __table_args__ = (PrimaryKeyConstraint('client_id', 'user_id'),)
+    # rated users of client are selected by rating, user_id is included to avoid reading of table
+    __table_args__ = (PrimaryKeyConstraint('client_id', 'user_id'),
+                      Index('ix_clients_users_client_id_rating_id', 'client_id', 'rating_id', 'user_id'),
+                      Index('ix_clients_users_user_id', 'user_id'))
     client_id = sa.Column(sa.Integer, ForeignKey('clients.id', ondelete='CASCADE'))
     user_id = sa.Column(sa.Integer, ForeignKey('users.id', ondelete='CASCADE'))
     rating_id = sa.Column(sa.Integer)
@@ -115,6 +126,7 @@ class ClientsUsers(Base):
 
 class Photos(Base):
     __tablename__ = 'photos'
+    __table_args__ = (Index('ix_photos_owner_id_photo_id', 'owner_id', 'photo_id'),)
     id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     url = sa.Column(sa.String(2048))
     likes_count = sa.Column(sa.Integer)
@@ -135,6 +147,19 @@ class Photos(Base):
         self.owner_id = owner_db_id
         self.updated = updated
 
+    def convert_to_ApiPhoto(self, owner_vk_id: str) -> ApiPhoto:
+        """
+        Needed when we restore from DB previously saved photos
+        """
+        row = {'url': self.url,
+               'likes_count': str(self.likes_count),
+               'comments_count': str(self.comments_count),
+               'reposts_count': str(self.reposts_count),
+               'owner_id': owner_vk_id,
+               'id': self.photo_id,
+               }
+        return ApiPhoto(row)
+
 
 class ClientsUserPhotos(Base):
     __tablename__ = 'clients_userphotos'
@@ -145,6 +170,8 @@ class ClientsUserPhotos(Base):
 
 class Searches(Base):
     __tablename__ = 'searches'
+    # search history of client is ordered by time
+    __table_args__ = (Index('ix_searches_client_id_updated', 'client_id', 'updated'),)
     id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     client_id = sa.Column(sa.Integer, ForeignKey('clients.id'), nullable=False)
     min_age = sa.Column(sa.Integer)
@@ -159,6 +186,44 @@ class Searches(Base):
 
 class SearchesUsers(Base):
     __tablename__ = 'searches_users'
-    __table_args__ = (PrimaryKeyConstraint('search_id', 'user_id'),)
+    # index on user_id is needed for cascade deleting of users
+    __table_args__ = (PrimaryKeyConstraint('search_id', 'user_id'),
+                      Index('ix_searches_users_user_id', 'user_id'))
     search_id = sa.Column(sa.Integer, ForeignKey('searches.id', ondelete='CASCADE'), nullable=False)
     user_id = sa.Column(sa.Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+
+class Countries(Base):
+    __tablename__ = 'countries'
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    title = sa.Column(sa.String(100), nullable=False)
+    updated = sa.Column(sa.TIMESTAMP(timezone=True), default=func.now())
+
+    def convert_to_ApiCountry(self) -> ApiCountry:
+        return ApiCountry({'id': self.id, 'title': self.title})
+
+
+class Cities(Base):
+    __tablename__ = 'cities'
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    country_id = sa.Column(sa.Integer, nullable=False)
+    title = sa.Column(sa.String(200), nullable=False)
+    area = sa.Column(sa.String(200))
+    region = sa.Column(sa.String(200))
+    updated = sa.Column(sa.TIMESTAMP(timezone=True), default=func.now())
+
+    def convert_to_ApiCity(self) -> ApiCity:
+        return ApiCity({'id': self.id, 'title': self.title, 'area': self.area, 'region': self.region})
+
+
+class CitiesQueries(Base):
+    """
+    Results of city searches in VK, which can be answered locally later
+    """
+    __tablename__ = 'cities_queries'
+    __table_args__ = (PrimaryKeyConstraint('country_id', 'query', 'position'),)
+    country_id = sa.Column(sa.Integer, nullable=False)
+    query = sa.Column(sa.String(100), nullable=False)
+    position = sa.Column(sa.Integer, nullable=False)
+    city_id = sa.Column(sa.Integer, ForeignKey('cities.id', ondelete='CASCADE'), nullable=False)
+    updated = sa.Column(sa.TIMESTAMP(timezone=True), default=func.now())
@@ -1,30 +1,94 @@
+import atexit
 import json
-from сlasses.vk_api_classes import VKinderClient, VKinderSearch, log, clear_db
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from сlasses.vk_api_classes import VKinderClient, VKinderSearch, CandidateSet, ApiUser, ApiPhoto, ApiCountry, \
+    ApiCity, log, clear_db
 import psycopg2
 import sqlalchemy as sa
 from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func, delete, and_, not_
-from сlasses.vkinder_db_classes import Clients, Base, Searches, Users, ClientsUsers, Photos
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import func, delete, and_, not_, bindparam, any_
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY
+from сlasses.vkinder_db_migrations import migrate
+from сlasses.vkinder_users_pool import users_pool
+from сlasses.vkinder_db_classes import Clients, Searches, Users, ClientsUsers, Photos, Countries, Cities, \
+    CitiesQueries, SearchesUsers
+
+
+def unit_of_work(method):
+    """
+    Runs method of VKinderDb in session scope
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.session_scope():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class VKinderDb:
 
     def __init__(self, db_name, db_login, db_password, db_driver='postgresql', db_host='localhost', db_port=5432,
-                 debug_mode=False):
+                 pool_size: int = 10, max_overflow: int = 10, pool_timeout: float = 30, pool_recycle: int = 1800,
+                 pool_pre_ping: bool = True, write_behind_size: int = 500, write_behind_interval: float = 1.0,
+                 write_behind_retries: int = 3, debug_mode=False):
         self.debug_mode = debug_mode
         self.__sqlalchemy = sa
         self.search_history_limit = 10
+        # max users per bulk statement
+        self.bulk_chunk_size = 1000
         self.rebuild = self.load_config()['rebuild_tables']
+        # depth of nested units of work in current thread
+        self.__local = threading.local()
+        self.__metrics_lock = threading.Lock()
+        self.__checkouts = 0
+        self.__checkins = 0
+        self.__timeouts = 0
+        self.__waits = 0
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+        # write-behind buffer: ratings, photos and updates of clients are coalesced by key and written by batches,
+        # when buffer size reaches write_behind_size or after write_behind_interval seconds
+        self.write_behind_size = write_behind_size
+        self.write_behind_interval = write_behind_interval
+        self.__write_lock = threading.Condition()
+        # flushes are serialized, so older batch can't be committed after newer one
+        self.__flush_lock = threading.Lock()
+        # ratings and photos of users which aren't saved yet are kept in buffer for write_behind_retries flushes
+        self.write_behind_retries = write_behind_retries
+        self.__deferred: dict[tuple, int] = {}
+        # (client DB id, user VK id) -> rating id
+        self.__pending_ratings: dict[tuple[int, str], int] = {}
+        # user VK id -> list of ApiPhoto
+        self.__pending_photos: dict[str, list[ApiPhoto]] = {}
+        # client DB id -> values of clients table columns
+        self.__pending_clients: dict[int, dict] = {}
+        self.__writer: threading.Thread = None
+        self.__closed = False
         try:
-            self.__engine = sa.create_engine(f'{db_driver}://{db_login}:{db_password}@{db_host}:{db_port}/{db_name}')
+            # pool should be not less than quantity of dispatcher workers, otherwise handlers wait for connections
+            self.__engine = sa.create_engine(f'{db_driver}://{db_login}:{db_password}@{db_host}:{db_port}/{db_name}',
+                                             pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                                             pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+            sa.event.listen(self.__engine, 'checkout', self.__on_checkout)
+            sa.event.listen(self.__engine, 'checkin', self.__on_checkin)
             self.__engine.connect().close()
-            self.__session = sessionmaker(bind=self.__engine)()
+            # thread-local sessions, as handlers of different clients are working concurrently, each session lives
+            # during one unit of work only, objects stay usable after commit and closing of session
+            self.__session = scoped_session(sessionmaker(bind=self.__engine, expire_on_commit=False))
             log(f'{type(self).__name__} successfully connected to DB', self.debug_mode)
             if self.rebuild:
                 log(f'Rebuilding tables...', self.debug_mode)
                 clear_db(sa, self.__engine)
-                Base.metadata.create_all(self.__engine)
+            self.schema_version = migrate(self.__engine, debug_mode=self.debug_mode)
+            self.__writer = threading.Thread(target=self.__write_behind, name='db_writer', daemon=True)
+            self.__writer.start()
+            # buffered writes aren't lost at exit, even if close wasn't called
+            atexit.register(self.close)
             self.__initialized = True
         except OperationalError as e:
             log(f'{type(self).__name__} unable connect to DB: {e}', self.debug_mode)
@@ -35,44 +99,286 @@ class VKinderDb:
     def is_initialized(self):
         return self.__initialized
 
+    @contextmanager
+    def session_scope(self):
+        """
+        Unit of work. Gives thread-local session, which is closed at the end of outermost scope, so its connection
+        returns to pool and identity map is cleared. Not committed changes are rolled back in case of error.
+        """
+        depth = getattr(self.__local, 'depth', 0)
+        self.__local.depth = depth + 1
+        try:
+            if depth == 0:
+                self.__checkout_connection()
+            yield self.__session()
+        except BaseException:
+            self.__session.rollback()
+            raise
+        finally:
+            self.__local.depth = depth
+            if depth == 0:
+                self.__session.remove()
+
+    def __checkout_connection(self):
+        """
+        Internal use only. Takes connection from pool for session of current thread, measuring waiting time
+        """
+        start_time = time.perf_counter()
+        try:
+            self.__session.connection()
+        except sa.exc.TimeoutError:
+            with self.__metrics_lock:
+                self.__timeouts += 1
+            raise
+        wait = time.perf_counter() - start_time
+        with self.__metrics_lock:
+            self.__waits += 1
+            self.__wait_total += wait
+            self.__wait_max = max(self.__wait_max, wait)
+
+    def __on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self.__metrics_lock:
+            self.__checkouts += 1
+
+    def __on_checkin(self, dbapi_connection, connection_record):
+        with self.__metrics_lock:
+            self.__checkins += 1
+
+    @property
+    def pool_metrics(self) -> dict:
+        """
+        Connections pool usage: checkouts from pool, connections in use and time of waiting for connection
+        """
+        with self.__metrics_lock:
+            return {'pool': self.__engine.pool.status(),
+                    'checkouts': self.__checkouts,
+                    'in_use': self.__checkouts - self.__checkins,
+                    'timeouts': self.__timeouts,
+                    'wait_total': self.__wait_total,
+                    'wait_max': self.__wait_max,
+                    'wait_avg': self.__wait_total / self.__waits if self.__waits else 0.0}
+
+    @property
+    def pending_writes(self) -> int:
+        with self.__write_lock:
+            return len(self.__pending_ratings) + len(self.__pending_photos) + len(self.__pending_clients)
+
+    def __enqueue(self, pending: dict, key, value):
+        """
+        Internal use only. Puts write to buffer, replacing not written value with the same key
+        """
+        with self.__write_lock:
+            pending[key] = value
+            if len(self.__pending_ratings) + len(self.__pending_photos) + len(self.__pending_clients) >= \
+                    self.write_behind_size:
+                self.__write_lock.notify()
+
+    def __write_behind(self):
+        """
+        Internal use only. Writer thread, flushes buffer by size or time threshold
+        """
+        while True:
+            with self.__write_lock:
+                self.__write_lock.wait(self.write_behind_interval)
+                if self.__closed:
+                    return
+            self.flush()
+
+    def flush(self, client_id: int = None) -> bool:
+        """
+        Writes buffered changes in one transaction. If writing fails, changes are returned to buffer,
+        unless they were replaced by newer ones
+        :param client_id: DB id of client, if only changes of this client should be written
+        :return: True if any changes were taken from buffer
+        """
+        with self.__flush_lock:
+            with self.__write_lock:
+                batches = ((self.__pending_clients, self.__write_clients, lambda key: key == client_id),
+                           (self.__pending_ratings, self.__write_ratings, lambda key: key[0] == client_id),
+                           (self.__pending_photos, self.__write_photos, lambda key: False))
+                taken = [(pending, take_pending(pending, None if client_id is None else belongs), write)
+                         for pending, write, belongs in batches]
+            if not any(batch for _, batch, _ in taken):
+                return False
+            try:
+                with self.session_scope():
+                    skipped = [write(batch) if batch else {} for _, batch, write in taken]
+                    self.__session.commit()
+            except Exception as e:
+                log(f'Writing of buffered changes to DB failed: {type(e).__name__}: {e}',
+                    is_debug_msg=self.debug_mode)
+                with self.__write_lock:
+                    for pending, batch, _ in taken:
+                        for key, value in batch.items():
+                            pending.setdefault(key, value)
+                return True
+            self.__defer([pending for pending, _, _ in taken], skipped)
+            return True
+
+    def __defer(self, buffers: list[dict], skipped: list[dict]):
+        """
+        Internal use only. Returns changes of users which aren't saved in DB yet to buffer, until retries are over
+        """
+        deferred = {}
+        dropped = 0
+        with self.__write_lock:
+            for buffer, (pending, batch) in enumerate(zip(buffers, skipped)):
+                for key, value in batch.items():
+                    attempts = self.__deferred.pop((buffer, key), 0) + 1
+                    if attempts > self.write_behind_retries:
+                        dropped += 1
+                    # newer change, which was buffered meanwhile, is written as usual
+                    elif pending.setdefault(key, value) is value:
+                        deferred[(buffer, key)] = attempts
+            self.__deferred.update(deferred)
+        if deferred or dropped:
+            log(f'Users not found in DB: {len(deferred)} changes are deferred, {dropped} changes are dropped',
+                is_debug_msg=self.debug_mode)
+
+    def close(self):
+        """
+        Stops writer thread and writes all buffered changes
+        """
+        if not self.__initialized or self.__closed:
+            return
+        with self.__write_lock:
+            self.__closed = True
+            self.__write_lock.notify()
+        self.__writer.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __write_clients(self, clients: dict[int, dict]) -> dict:
+        """
+        Internal use only. Updates of existing clients by one executemany UPDATE
+        :return: skipped changes, there are no such ones
+        """
+        for columns in {tuple(sorted(values)) for values in clients.values()}:
+            rows = [{**values, 'db_id': db_id} for db_id, values in clients.items() if tuple(sorted(values)) == columns]
+            self.__session.execute(Clients.__table__.update().where(Clients.id == bindparam('db_id')), rows)
+        return {}
+
+    def __write_ratings(self, ratings: dict[tuple[int, str], int]) -> dict:
+        """
+        Internal use only. Bulk UPSERT of ratings, ratings of users absent in DB are skipped
+        :return: skipped ratings
+        """
+        users_ids = {}
+        for vk_ids_filter in self.__vk_ids_filters(list({vk_id for _, vk_id in ratings})):
+            users_ids.update(self.__session.query(Users.vk_id, Users.id).filter(vk_ids_filter))
+        updated = datetime.now(timezone.utc)
+        rows = [{'client_id': client_id, 'user_id': users_ids[vk_id], 'rating_id': rating_id, 'updated': updated}
+                for (client_id, vk_id), rating_id in ratings.items() if vk_id in users_ids]
+        skipped = {key: rating_id for key, rating_id in ratings.items() if key[1] not in users_ids}
+        if not rows:
+            return skipped
+        if self.__engine.dialect.name == 'postgresql':
+            upsert = pg_insert(ClientsUsers.__table__).values(rows)
+            self.__session.execute(upsert.on_conflict_do_update(
+                index_elements=[ClientsUsers.client_id, ClientsUsers.user_id],
+                set_={'rating_id': upsert.excluded.rating_id, 'updated': upsert.excluded.updated}))
+            return skipped
+        existing = set(self.__session.query(ClientsUsers.client_id, ClientsUsers.user_id).filter(
+            ClientsUsers.client_id.in_(list({row['client_id'] for row in rows})),
+            ClientsUsers.user_id.in_(list({row['user_id'] for row in rows}))))
+        updates = [{**row, 'c_id': row['client_id'], 'u_id': row['user_id']} for row in rows
+                   if (row['client_id'], row['user_id']) in existing]
+        inserts = [row for row in rows if (row['client_id'], row['user_id']) not in existing]
+        if updates:
+            self.__session.execute(ClientsUsers.__table__.update().where(and_(
+                ClientsUsers.client_id == bindparam('c_id'), ClientsUsers.user_id == bindparam('u_id'))), updates)
+        if inserts:
+            self.__session.execute(ClientsUsers.__table__.insert(), inserts)
+        return skipped
+
+    def __write_photos(self, photos: dict[str, list[ApiPhoto]]) -> dict:
+        """
+        Internal use only. UPSERT by photo id and deleting photos which are absent in given lists
+        :return: skipped photos of users absent in DB
+        """
+        users_ids = dict(self.__session.query(Users.vk_id, Users.id).filter(Users.vk_id.in_(list(photos))))
+        photos_db = {}
+        for photo_db in self.__session.query(Photos).filter(Photos.owner_id.in_(list(users_ids.values()))):
+            photos_db[(photo_db.owner_id, photo_db.photo_id)] = photo_db
+        skipped = {}
+        for vk_id, user_photos in photos.items():
+            if vk_id not in users_ids:
+                skipped[vk_id] = user_photos
+                continue
+            for photo in user_photos:
+                photo_id = str(photo.id)
+                photo_db = photos_db.pop((users_ids[vk_id], photo_id), None)
+                if not photo_db:
+                    photo_db = Photos(photo_id=photo_id, owner_db_id=users_ids[vk_id])
+                    self.__session.add(photo_db)
+                photo_db.url = photo.url
+                photo_db.likes_count = photo.likes_count
+                photo_db.comments_count = photo.comments_count
+                photo_db.reposts_count = photo.reposts_count
+                photo_db.updated = func.now()
+        # photos which are not among the best ones anymore
+        for photo_db in photos_db.values():
+            self.__session.delete(photo_db)
+        return skipped
+
     @staticmethod
     def load_config(filename='options.cfg'):
         rebuild_key = 'rebuild_tables'
         rebuild_default_value = False
         options_default = {rebuild_key: rebuild_default_value}
-        result = dict()
+        result = dict(options_default)
         try:
-            with open(filename, encoding='utf-8', mode='r+') as file:
+            with open(filename, encoding='utf-8', mode='r') as file:
                 options = json.load(file)
-                rebuild_value = options.get(rebuild_key, False)
-                if not rebuild_value == rebuild_default_value:
-                    result.update({rebuild_key: rebuild_value})
-                else:
-                    result.update({rebuild_key: rebuild_default_value})
-                options_default[rebuild_key] = rebuild_default_value
-        except json.decoder.JSONDecodeError or FileNotFoundError:
-            result = options_default
-        finally:
+            result[rebuild_key] = options.get(rebuild_key, rebuild_default_value)
+            # file is rewritten only to reset the flag, so it's untouched at usual start
+            need_reset = not result[rebuild_key] == rebuild_default_value
+        except (json.decoder.JSONDecodeError, FileNotFoundError):
+            need_reset = True
+        if need_reset:
             with open(filename, encoding='utf-8', mode='w+') as file:
                 json.dump(options_default, file)
         return result
 
     # @decorator_speed_meter(True)
-    def load_client_from_db(self, vk_id: str):
+    @unit_of_work
+    def load_client_from_db(self, vk_id: str) -> VKinderClient:
         """
-        Gets client by its VK id
+        Gets client by its VK id together with search history
+        :return: client or None if client is absent in DB
         """
         log(f'Loading client info from DB', is_debug_msg=self.debug_mode)
-        client = self.__session.query(Clients).filter(Clients.vk_id == vk_id).first()
-        if client:
-            return client.convert_to_ApiUser()
+        client_db = self.__session.query(Clients).filter(Clients.vk_id == vk_id).first()
+        # buffered update of this client is written before reading, changes of other clients are left to writer
+        if client_db and self.flush(client_db.id):
+            self.__session.refresh(client_db)
+        if client_db:
+            client = VKinderClient(client_db.convert_to_ApiUser())
+            client.profile_updated = client_db.profile_updated
+            client.searches = self.load_searches(client)
+            return client
 
     # @decorator_speed_meter(True)
+    @unit_of_work
     def save_client(self, client: VKinderClient, force_country_update=False):
         """
-        Manual UPSERT of single client in DB
+        Manual UPSERT of single client in DB. New client is saved at once, as its DB id is needed,
+        update of known client is buffered
         """
         log(f'[{client.fname} {client.lname}] Saving client\'s info to DB', is_debug_msg=self.debug_mode)
+        if client.db_id:
+            values = {'fname': client.fname, 'lname': client.lname, 'domain': client.domain,
+                      'city_id': client.city_id, 'city_name': client.city_name, 'hometown': client.hometown,
+                      'birth_date': client.birth_date, 'birth_day': client.birth_day,
+                      'birth_month': client.birth_month, 'birth_year': client.birth_year, 'sex_id': client.sex_id,
+                      'updated': client.last_contact, 'profile_updated': client.profile_updated}
+            if force_country_update:
+                values.update({'country_id': client.country_id, 'country_name': client.country_name})
+            with self.__write_lock:
+                # country update shouldn't be lost because of later update without it
+                values = {**self.__pending_clients.get(client.db_id, {}), **values}
+            self.__enqueue(self.__pending_clients, client.db_id, values)
+            return
         client_db = self.__session.query(Clients).filter(Clients.vk_id == client.vk_id).first()
         if not client_db:
             client_db = Clients()
@@ -96,6 +402,7 @@ class VKinderDb:
         client_db.birth_year = client.birth_year
         client_db.sex_id = client.sex_id
         client_db.updated = client.last_contact
+        client_db.profile_updated = client.profile_updated
         self.__session.add(client_db)
         self.__session.commit()
         # load new id from base if client was just created
@@ -103,6 +410,7 @@ class VKinderDb:
         client.searches = self.load_searches(client)
 
     # @decorator_speed_meter(True)
+    @unit_of_work
     def load_searches(self, client: VKinderClient) -> list[VKinderSearch]:
         """
         Loads all search history parameters
@@ -113,6 +421,7 @@ class VKinderDb:
         return result
 
     # @decorator_speed_meter(True)
+    @unit_of_work
     def save_search(self, client: VKinderClient):
         """
         Saves customs search, with delete old searches (more than search_history_limit)
@@ -137,103 +446,245 @@ class VKinderDb:
         client.searches.append(client.search)
 
     # @decorator_speed_meter(True)
-    def save_users(self, client: VKinderClient):
+    @unit_of_work
+    def save_users(self, client: VKinderClient, users: list[ApiUser] = None):
         """
-        Making manual batch UPSERT of users with relations to search using many-to-many relations
+        Making bulk UPSERT of users with relations to search, few statements per bulk_chunk_size users.
+        PostgreSQL uses INSERT ... ON CONFLICT, other DBs are updated by separate UPDATE and INSERT statements
+        :param users: part of found users to be saved, all found users of client by default
         """
-        if not client.found_users:
+        found_users = client.found_users if users is None else users
+        if not found_users:
             log(f'[{client.fname} {client.lname}] No users to save in DB', is_debug_msg=self.debug_mode)
             return
         log(f'[{client.fname} {client.lname}] Saving users info to DB', is_debug_msg=self.debug_mode)
-        search = self.__session.query(Searches).filter(Searches.id == client.search.id).first()
-        vk_ids = [client.vk_id for client in client.found_users]
-        users = self.__session.query(Users).filter(Users.vk_id.in_(vk_ids)).all()
-        matches = {user.vk_id: user for user in users}
-        users_list = []
-        for found_user in client.found_users:
-            user = matches.get(found_user.vk_id, Users())
-            user.vk_id = found_user.vk_id
-            user.fname = found_user.fname
-            user.lname = found_user.lname
-            user.domain = found_user.domain
-            user.country_id = found_user.country_id
-            user.country_name = found_user.country_name
-            user.city_id = found_user.city_id
-            user.city_name = found_user.city_name
-            user.hometown = found_user.hometown
-            user.birth_date = found_user.birth_date
-            user.birth_day = found_user.birth_day
-            user.birth_month = found_user.birth_month
-            user.birth_year = found_user.birth_year
-            user.sex_id = found_user.sex_id
-            user.updated = func.now()
-            user.searches.append(search)
-            users_list.append(user)
-        self.__session.add_all(users_list)
+        # the same user can't be affected twice by one statement
+        rows = list({found_user.vk_id: make_user_row(found_user) for found_user in found_users}.values())
+        upsert = self.__upsert_users_pg if self.__engine.dialect.name == 'postgresql' else self.__upsert_users
+        for start in range(0, len(rows), self.bulk_chunk_size):
+            upsert(client.search.id, rows[start:start + self.bulk_chunk_size])
         self.__session.commit()
 
+    def __upsert_users_pg(self, search_id: int, rows: list[dict]):
+        """
+        Internal use only. One INSERT ... ON CONFLICT for users and one for their relations to search
+        """
+        users = pg_insert(Users.__table__).values(rows)
+        users = users.on_conflict_do_update(index_elements=[Users.vk_id],
+                                            set_={key: users.excluded[key] for key in rows[0] if key != 'vk_id'})
+        users_ids = [row[0] for row in self.__session.execute(users.returning(Users.id))]
+        searches_users = pg_insert(SearchesUsers.__table__).values(
+            [{'search_id': search_id, 'user_id': user_id} for user_id in users_ids])
+        self.__session.execute(searches_users.on_conflict_do_nothing())
+
+    def __upsert_users(self, search_id: int, rows: list[dict]):
+        """
+        Internal use only. Portable bulk UPSERT: existing users are updated by one executemany UPDATE,
+        new users are added by one executemany INSERT, then missing relations to search are inserted
+        """
+        vk_ids = [row['vk_id'] for row in rows]
+        users_ids = dict(self.__session.query(Users.vk_id, Users.id).filter(Users.vk_id.in_(vk_ids)))
+        updates = [{**row, 'db_id': users_ids[row['vk_id']]} for row in rows if row['vk_id'] in users_ids]
+        inserts = [row for row in rows if row['vk_id'] not in users_ids]
+        if updates:
+            self.__session.execute(Users.__table__.update().where(Users.id == bindparam('db_id')), updates)
+        if inserts:
+            self.__session.execute(Users.__table__.insert(), inserts)
+            users_ids.update(self.__session.query(Users.vk_id, Users.id).filter(
+                Users.vk_id.in_([row['vk_id'] for row in inserts])))
+        linked = {row[0] for row in self.__session.query(SearchesUsers.user_id).filter(
+            SearchesUsers.search_id == search_id, SearchesUsers.user_id.in_(users_ids.values()))}
+        links = [{'search_id': search_id, 'user_id': user_id} for user_id in users_ids.values() if user_id not in linked]
+        if links:
+            self.__session.execute(SearchesUsers.__table__.insert(), links)
+
     # @decorator_speed_meter(True)
     def save_user_rating(self, client: VKinderClient):
         """
-        Saves user rating (when client liked/disliked/banned), updates exist rating
+        Saves user rating (when client liked/disliked/banned), updates exist rating. Rating is buffered
         """
         log(f'[{client.fname} {client.lname}] Saving user rating to DB', is_debug_msg=self.debug_mode)
-        client_db = self.__session.query(Clients).filter(Clients.vk_id == client.vk_id).first()
-        user_db = self.__session.query(Users).filter(Users.vk_id == client.active_user.vk_id).first()
-        clients_user = self.__session.query(ClientsUsers).filter(and_(ClientsUsers.client_id == client_db.id,
-                                                                      ClientsUsers.user_id == user_db.id)).first()
-        if not clients_user:
-            clients_user = ClientsUsers(client_id=client_db.id, user_id=user_db.id,
-                                        rating_id=client.active_user.rating_id)
-        else:
-            clients_user.rating_id = client.active_user.rating_id
-            clients_user.updated = func.now()
-        self.__session.add(clients_user)
-        self.__session.commit()
+        self.__enqueue(self.__pending_ratings, (client.db_id, client.active_user.vk_id),
+                       client.found_users.get_rating(client.active_user.vk_id))
 
     # @decorator_speed_meter(True)
-    def save_photos(self, client: VKinderClient):
+    def save_photos(self, vk_id: str, photos: list[ApiPhoto]):
         """
-        Saves users photo information, with clearance of all previously saved photo
+        Saves users photo information, making UPSERT by photo id and deleting photos which are absent in given list.
+        Photos are buffered
         """
-        log(f'[{client.fname} {client.lname}] Saving photo\'s info to DB', is_debug_msg=self.debug_mode)
-        # let's clear all previous user photos
-        user_db = self.__session.query(Users).filter(Users.vk_id == client.active_user.vk_id).first()
-        self.__session.query(Photos).filter(and_(Photos.owner_id == user_db.id)).delete()
-        self.__session.commit()
-        photos_list = []
-        for photo in client.active_user.photos:
-            photo_db = Photos(url=photo.url, likes_count=photo.likes_count, comments_count=photo.comments_count,
-                              reposts_count=photo.reposts_count, photo_id=photo.id, owner_db_id=user_db.id)
-            photos_list.append(photo_db)
-        self.__session.add_all(photos_list)
-        self.__session.commit()
+        log(f'Saving user {vk_id} photo\'s info to DB', is_debug_msg=self.debug_mode)
+        self.__enqueue(self.__pending_photos, vk_id, list(photos))
 
     # @decorator_speed_meter(True)
-    def load_users_ratings_from_db(self, client: VKinderClient):
+    @unit_of_work
+    def load_photos(self, vk_id: str, max_age: int) -> list[ApiPhoto]:
         """
-        Syncs ratings from DB with set of users, received from VK search
+        Gets previously saved users photos, if they were updated not earlier than max_age seconds ago
+        :return: list of ApiPhoto sorted by popularity or None if photos are absent or stale
+        """
+        with self.__write_lock:
+            photos = self.__pending_photos.get(vk_id)
+        if photos is not None:
+            return list(photos)
+        photos_db = self.__session.query(Photos).join(Users).filter(Users.vk_id == vk_id).all()
+        if not photos_db:
+            return None
+        if not is_fresh(min(photo_db.updated for photo_db in photos_db), max_age):
+            return None
+        photos_db.sort(key=lambda x: x.likes_count + x.comments_count + x.reposts_count * 3, reverse=True)
+        return [photo_db.convert_to_ApiPhoto(vk_id) for photo_db in photos_db]
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
+    def load_users_ratings_from_db(self, client: VKinderClient, users: list[ApiUser] = None):
         """
-        vk_ids = [client.vk_id for client in client.found_users]
-        users_db = self.__session.query(Users.vk_id, ClientsUsers.rating_id).join(ClientsUsers).filter(
-            Users.vk_id.in_(vk_ids)).filter(ClientsUsers.client_id == client.db_id).all()
+        Syncs ratings from DB with found users of client, received from VK search
+        :param users: part of found users to be synced, all found users of client by default
+        """
+        vk_ids = {found_user.vk_id for found_user in (client.found_users if users is None else users)}
+        ratings: dict[str, int] = {}
+        for vk_ids_filter in self.__vk_ids_filters(list(vk_ids)):
+            users_db = self.__session.query(Users.vk_id, ClientsUsers.rating_id).join(ClientsUsers).filter(
+                vk_ids_filter).filter(ClientsUsers.client_id == client.db_id)
+            ratings.update(users_db)
+        # ratings which aren't written yet
+        with self.__write_lock:
+            ratings.update((vk_id, rating_id) for (client_id, vk_id), rating_id in self.__pending_ratings.items()
+                           if client_id == client.db_id and vk_id in vk_ids)
         # let's update rating status from DB at found users
-        for users in users_db:
-            for found_user in client.found_users:
-                if found_user.vk_id == users[0]:
-                    found_user.rating_id = users[1]
+        client.found_users.set_ratings(ratings)
+
+    def __vk_ids_filters(self, vk_ids: list[str]) -> list:
+        """
+        Internal use only. Conditions on Users.vk_id, PostgreSQL receives all ids as one array parameter,
+        other DBs receive ids by chunks, as number of parameters is limited
+        """
+        if self.__engine.dialect.name == 'postgresql':
+            return [Users.vk_id == any_(bindparam('vk_ids', vk_ids, type_=ARRAY(sa.String)))]
+        return [Users.vk_id.in_(vk_ids[start:start + self.bulk_chunk_size])
+                for start in range(0, len(vk_ids), self.bulk_chunk_size)]
 
     # @decorator_speed_meter(True)
+    @unit_of_work
+    def load_users_by_vk_ids(self, vk_ids: list[str]) -> dict[str, ApiUser]:
+        """
+        Gets saved users by VK ids, users found by VK search are preferred, as users restored from DB have no
+        activity data
+        :return: dict {VK id: ApiUser}, users absent in DB are skipped
+        """
+        result = {}
+        for vk_ids_filter in self.__vk_ids_filters(list(set(vk_ids))):
+            for user in self.__session.query(Users).filter(vk_ids_filter):
+                result[user.vk_id] = users_pool.resolve(user.convert_to_ApiUser(), refresh=False)
+        return result
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
     def load_users_from_db(self, client: VKinderClient):
         """
         Gets all rated users by client, using rating as filter
         """
         log(f'[{client.fname} {client.lname}] Loading users from DB with rating {client.rating_filter}',
             is_debug_msg=self.debug_mode)
+        # selection by rating needs all ratings of client written
+        self.flush(client.db_id)
         users = self.__session.query(Users).join(ClientsUsers).filter(
             ClientsUsers.client_id == client.db_id).filter(ClientsUsers.rating_id == client.rating_filter).all()
-        client.found_users = []
-        for user in users:
-            client.found_users.append(user.convert_to_ApiUser(client.rating_filter))
+        # users restored from DB have no activity data, so users found by VK search are preferred
+        client.found_users = CandidateSet(users_pool.resolve_all([user.convert_to_ApiUser() for user in users],
+                                                                 refresh=False), client.rating_filter)
         log(f'[{client.fname} {client.lname}] Loaded {len(client.found_users)} users from DB',
             is_debug_msg=self.debug_mode)
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
+    def load_countries(self, max_age: int) -> list[ApiCountry]:
+        """
+        Gets catalog of countries, if it was updated not earlier than max_age seconds ago
+        :return: list of ApiCountry or None if catalog is empty or stale
+        """
+        countries_db = self.__session.query(Countries).order_by(Countries.title).all()
+        if not countries_db or not is_fresh(min(country_db.updated for country_db in countries_db), max_age):
+            return None
+        return [country_db.convert_to_ApiCountry() for country_db in countries_db]
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
+    def save_countries(self, countries: list[ApiCountry]):
+        """
+        Replaces catalog of countries
+        """
+        log(f'Saving {len(countries)} countries to DB', is_debug_msg=self.debug_mode)
+        self.__session.query(Countries).delete()
+        self.__session.add_all([Countries(id=country.id, title=country.title, updated=func.now())
+                                for country in countries])
+        self.__session.commit()
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
+    def load_cities_queries(self, country_id: int, max_age: int) -> dict[str, list[ApiCity]]:
+        """
+        Gets results of all cities searches in country, which were made not earlier than max_age seconds ago
+        :return: dict {query: list of ApiCity in order of VK search results}
+        """
+        rows = self.__session.query(CitiesQueries, Cities).join(Cities).filter(
+            CitiesQueries.country_id == country_id).order_by(CitiesQueries.query, CitiesQueries.position).all()
+        result = {}
+        for query_db, city_db in rows:
+            if not is_fresh(query_db.updated, max_age):
+                continue
+            result.setdefault(query_db.query, []).append(city_db.convert_to_ApiCity())
+        return result
+
+    # @decorator_speed_meter(True)
+    @unit_of_work
+    def save_cities_query(self, country_id: int, query: str, cities: list[ApiCity]):
+        """
+        Saves cities found in VK by query, replacing previous results of same query
+        """
+        log(f'Saving {len(cities)} cities found by "{query}" to DB', is_debug_msg=self.debug_mode)
+        for city in cities:
+            self.__session.merge(Cities(id=city.id, country_id=country_id, title=city.title, area=city.area,
+                                        region=city.region, updated=func.now()))
+        self.__session.flush()
+        self.__session.query(CitiesQueries).filter(and_(CitiesQueries.country_id == country_id,
+                                                        CitiesQueries.query == query)).delete()
+        self.__session.add_all([CitiesQueries(country_id=country_id, query=query, position=position, city_id=city.id,
+                                              updated=func.now()) for position, city in enumerate(cities)])
+        self.__session.commit()
+
+
+def make_user_row(user: ApiUser) -> dict:
+    """
+    Values of users table columns for bulk statements
+    """
+    return {'vk_id': user.vk_id, 'fname': user.fname, 'lname': user.lname, 'domain': user.domain,
+            'country_id': user.country_id, 'country_name': user.country_name, 'city_id': user.city_id,
+            'city_name': user.city_name, 'hometown': user.hometown, 'birth_date': user.birth_date,
+            'birth_day': user.birth_day, 'birth_month': user.birth_month, 'birth_year': user.birth_year,
+            'sex_id': user.sex_id, 'updated': datetime.now(timezone.utc)}
+
+
+def take_pending(pending: dict, belongs=None) -> dict:
+    """
+    Takes changes out of write-behind buffer
+    :param belongs: function which checks key of change, all changes are taken by default
+    """
+    if belongs is None:
+        taken = dict(pending)
+        pending.clear()
+        return taken
+    taken = {key: value for key, value in pending.items() if belongs(key)}
+    for key in taken:
+        del pending[key]
+    return taken
+
+
+def is_fresh(updated: datetime, max_age: int) -> bool:
+    """
+    Checks that given time of update is not earlier than max_age seconds ago
+    """
+    # some DB drivers return time in UTC without timezone
+    updated = updated if updated.tzinfo else updated.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - updated).total_seconds() <= max_age
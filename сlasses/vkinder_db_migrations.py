@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+from сlasses.vk_api_classes import log
+from сlasses.vkinder_db_classes import Base
+
+# any constant, which is unique among advisory locks of DB, prevents concurrent migrations by several bot instances
+MIGRATIONS_LOCK_ID = 7311
+
+schema_version = sa.Table('schema_version', sa.MetaData(),
+                          sa.Column('version', sa.Integer, primary_key=True, autoincrement=False),
+                          sa.Column('description', sa.String(300)),
+                          sa.Column('applied', sa.TIMESTAMP(timezone=True)))
+
+
+class Migration:
+    """
+    Versioned change of schema.
+    'upgrade': function which receives connection and applies change, it must be idempotent,
+    as fresh DB already has schema of current models after the first migration
+    'transactional': False for changes which can't run inside transaction, like CREATE INDEX CONCURRENTLY,
+    such migrations are applied in autocommit mode
+    """
+
+    def __init__(self, version: int, description: str, upgrade, transactional: bool = True):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+def create_tables(connection: Connection):
+    """
+    Creates absent tables of current models, existing tables of DB created before migrations are kept
+    """
+    Base.metadata.create_all(connection, checkfirst=True)
+
+
+def create_index_online(connection: Connection, name: str):
+    """
+    Creates index declared on models without locking table for writes.
+    PostgreSQL leaves invalid index if concurrent building fails, such index is rebuilt
+    """
+    index = next(index for table in Base.metadata.tables.values() for index in table.indexes if index.name == name)
+    columns = ', '.join(column.name for column in index.columns)
+    if connection.dialect.name != 'postgresql':
+        connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {index.table.name} ({columns})')
+        return
+    invalid = connection.execute(sa.text('SELECT 1 FROM pg_class JOIN pg_index ON pg_index.indexrelid = pg_class.oid '
+                                         'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'),
+                                 name=name).first()
+    if invalid:
+        connection.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    connection.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {index.table.name} ({columns})')
+
+
+def add_column(table_name: str, column_name: str):
+    """
+    Adds column declared on model to table created before this column appeared
+    """
+    def upgrade(connection: Connection):
+        if column_name in {column['name'] for column in sa.inspect(connection).get_columns(table_name)}:
+            return
+        column_type = Base.metadata.tables[table_name].c[column_name].type.compile(dialect=connection.dialect)
+        connection.execute(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}')
+    return upgrade
+
+
+def create_indexes_online(*names: str):
+    def upgrade(connection: Connection):
+        for name in names:
+            create_index_online(connection, name)
+    return upgrade
+
+
+# append new migrations to the end, never change applied ones
+MIGRATIONS = [
+    Migration(1, 'Tables of clients, users, photos, searches and catalog', create_tables),
+    Migration(2, 'Indexes for hot queries',
+              create_indexes_online('ix_searches_client_id_updated', 'ix_clients_users_client_id_rating_id',
+                                    'ix_clients_users_user_id', 'ix_photos_owner_id_photo_id',
+                                    'ix_searches_users_user_id'),
+              transactional=False),
+    Migration(3, 'Time of client profile receiving from VK', add_column('clients', 'profile_updated')),
+]
+
+
+def get_schema_version(connection: Connection) -> int:
+    """
+    One cheap query instead of reflection of all tables
+    :return: version of last applied migration, 0 for empty DB or DB created before migrations
+    """
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(sa.select([sa.func.coalesce(sa.func.max(schema_version.c.version), 0)])).scalar()
+
+
+def migrate(engine: Engine, debug_mode=False) -> int:
+    """
+    Applies migrations which are newer than schema version of DB
+    :return: schema version after migrations
+    """
+    # this connection holds lock during all migrations
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        is_postgresql = connection.dialect.name == 'postgresql'
+        if is_postgresql:
+            connection.execute(sa.text('SELECT pg_advisory_lock(:id)'), id=MIGRATIONS_LOCK_ID)
+        try:
+            version = get_schema_version(connection)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                log(f'Applying migration #{migration.version}: {migration.description}', debug_mode)
+                # change and its version are committed together, unless migration can't run in transaction
+                with engine.begin() if migration.transactional else engine.connect() as migration_connection:
+                    if not migration.transactional:
+                        migration_connection = migration_connection.execution_options(isolation_level='AUTOCOMMIT')
+                    migration.upgrade(migration_connection)
+                    migration_connection.execute(schema_version.insert(), version=migration.version,
+                                                 description=migration.description,
+                                                 applied=datetime.now(timezone.utc))
+                version = migration.version
+        finally:
+            if is_postgresql:
+                connection.execute(sa.text('SELECT pg_advisory_unlock(:id)'), id=MIGRATIONS_LOCK_ID)
+    log(f'DB schema version: {version}', debug_mode)
+    return version
@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from сlasses.vk_api_classes import log
+
+
+class EventDispatcher:
+    """
+    Fans out incoming events to pool of worker threads.
+    Events with the same key (client VK id) are processed strictly one by one in order of arrival,
+    while events of different clients are processed concurrently, so slow clients never block fast ones
+    """
+
+    def __init__(self, workers: int = 16, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.workers = workers
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatcher')
+        self.__lock = threading.Lock()
+        # key -> queue of pending events, key present only while its events are being processed
+        self.__queues: dict[str, deque] = {}
+        self.__closed = False
+
+    def submit(self, key: str, handler, *args):
+        """
+        Puts event to the queue of given key and schedules queue processing if it is not running yet
+        Raises RuntimeError after shutdown, as event would never be processed
+        """
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError(f'Can\'t submit event of {key}: {type(self).__name__} is shut down')
+            queue = self.__queues.get(key)
+            if queue is not None:
+                queue.append((handler, args))
+                return
+            self.__queues[key] = deque([(handler, args)])
+            # scheduled under lock, so shutdown can't happen between queue creation and scheduling
+            self.__executor.submit(self.__drain, key)
+
+    def __drain(self, key: str):
+        """
+        Processes all queued events of given key one by one. Internal use only.
+        """
+        while True:
+            with self.__lock:
+                queue = self.__queues[key]
+                if not queue:
+                    self.__queues.pop(key)
+                    return
+                handler, args = queue.popleft()
+            try:
+                handler(*args)
+            except Exception as e:
+                log(f'Error while processing event of {key}: {type(e).__name__}: {e}', self.debug_mode)
+
+    @property
+    def pending(self) -> int:
+        with self.__lock:
+            return sum(len(queue) for queue in self.__queues.values())
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops accepting of events, already queued events are processed
+        """
+        with self.__lock:
+            self.__closed = True
+        self.__executor.shutdown(wait=wait)
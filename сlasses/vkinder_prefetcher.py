@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from сlasses.vk_api_classes import ApiUser, ApiPhoto, VKinderClient, log
+
+
+class PhotoPrefetcher:
+    """
+    Loads photos of next candidates in background, while client is deciding about current one.
+    'loader': function which receives list of ApiUser and returns dict {user VK id: list of ApiPhoto},
+    next candidates of client are loaded together, so VK is requested once for all of them
+    'lookahead': quantity of next candidates to be prefetched for each client
+    'max_pending': global limit of scheduled and running loadings, protects API quota
+    """
+
+    def __init__(self, loader, lookahead: int = 2, workers: int = 4, max_pending: int = 32, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.lookahead = lookahead
+        self.max_pending = max_pending
+        self.__loader = loader
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetcher')
+        # reentrant, as callback of already finished future is called immediately in the same thread
+        self.__lock = threading.RLock()
+        # client VK id -> {user VK id: Future}
+        self.__futures: dict[str, dict[str, Future]] = {}
+        self.__pending = 0
+
+    def schedule(self, client: VKinderClient):
+        """
+        Starts loading of photos for next candidates of client, which are not loaded or loading yet
+        """
+        with self.__lock:
+            futures = self.__futures.setdefault(client.vk_id, {})
+            batch = []
+            for user in client.peek_next_users(self.lookahead):
+                if user.vk_id in futures:
+                    continue
+                if self.__pending >= self.max_pending:
+                    log(f'[{client.fname} {client.lname}] Prefetch skipped: limit of {self.max_pending} reached',
+                        self.debug_mode)
+                    break
+                self.__pending += 1
+                future = Future()
+                future.add_done_callback(self.__on_done)
+                futures[user.vk_id] = future
+                batch.append((user, future))
+        if batch:
+            self.__executor.submit(self.__load, batch)
+
+    def __load(self, batch: list[tuple[ApiUser, Future]]):
+        """
+        Internal use only. Loads photos of users, which weren't cancelled, by one call of loader
+        """
+        batch = [(user, future) for user, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            photos = self.__loader([user for user, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for user, future in batch:
+            future.set_result(photos.get(user.vk_id, []))
+
+    def pop(self, client: VKinderClient, user: ApiUser) -> list[ApiPhoto]:
+        """
+        Gets prefetched photos of user, waits if loading is in progress
+        :return: list of ApiPhoto or None if photos wasn't prefetched
+        """
+        with self.__lock:
+            future = self.__futures.get(client.vk_id, {}).pop(user.vk_id, None)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            log(f'[{client.fname} {client.lname}] Prefetch of user {user.vk_id} photos failed: {e}', self.debug_mode)
+            return None
+
+    def cancel(self, client: VKinderClient):
+        """
+        Cancels loadings of client which are not started yet, needed when found users are reset
+        """
+        with self.__lock:
+            futures = self.__futures.pop(client.vk_id, {})
+        for future in futures.values():
+            future.cancel()
+
+    def __on_done(self, future: Future):
+        with self.__lock:
+            self.__pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from сlasses.vk_api_classes import VKinderClient, ApiUser, USER_ATTRIBUTES, log
+from сlasses.vk_api_client import VkApiClient
+from сlasses.vkinder_cache import TTLCache
+from сlasses.vkinder_db_client import VKinderDb, is_fresh
+
+# attributes which are refreshed from VK, country chosen by client is kept (see VKinderDb.save_client)
+REFRESHED_ATTRIBUTES = tuple(name for name in USER_ATTRIBUTES
+                             if name not in ('db_id', 'photos', 'country_id', 'country_name'))
+
+
+class ClientsProfiles:
+    """
+    Tiered lookup of clients profiles on first contact: memory LRU cache, then DB, and only then VK.
+    Profiles older than max_age are used as is and refreshed from VK in background,
+    refreshed profile is passed to on_refresh(vk_id, user) function
+    """
+
+    def __init__(self, vk: VkApiClient, db: VKinderDb, on_refresh, cache_size: int = 10000, max_age: int = 7 * 86400,
+                 debug_mode=False):
+        self.max_age = max_age
+        self.debug_mode = debug_mode
+        self.__vk = vk
+        self.__db = db
+        self.__on_refresh = on_refresh
+        self.__cache = TTLCache(max_weight=cache_size, ttl=max_age)
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profiles')
+        self.__lock = threading.Lock()
+        self.__refreshing: set[str] = set()
+        # tier -> quantity of profiles found there
+        self.__found = {'memory': 0, 'db': 0, 'vk': 0}
+
+    def get(self, vk_id: str) -> VKinderClient:
+        """
+        :return: new client with profile and search history
+        """
+        profile = self.__cache.get(vk_id)
+        if profile is not None:
+            tier = 'memory'
+            client = copy_profile(profile)
+        else:
+            tier = 'db'
+            client = self.__db.load_client_from_db(vk_id)
+            if client is None:
+                tier = 'vk'
+                client = VKinderClient(self.__vk.get_users(vk_id)[0])
+                client.profile_updated = datetime.now(timezone.utc)
+                self.__db.save_client(client)
+            self.put(client)
+        with self.__lock:
+            self.__found[tier] += 1
+        log(f'[{client.fname} {client.lname}] Profile is taken from {tier}', self.debug_mode)
+        if client.profile_updated is None or not is_fresh(client.profile_updated, self.max_age):
+            self.__schedule_refresh(vk_id)
+        return client
+
+    def put(self, client: VKinderClient):
+        """
+        Remembers profile and search history of client, usually when client leaves
+        """
+        self.__cache.put(client.vk_id, copy_profile(client))
+
+    def __schedule_refresh(self, vk_id: str):
+        with self.__lock:
+            if vk_id in self.__refreshing:
+                return
+            self.__refreshing.add(vk_id)
+        self.__executor.submit(self.__refresh, vk_id)
+
+    def __refresh(self, vk_id: str):
+        """
+        Internal use only. Receives profile from VK in background thread
+        """
+        try:
+            users = self.__vk.get_users(vk_id)
+            if users:
+                self.__on_refresh(vk_id, users[0])
+        except Exception as e:
+            log(f'Refreshing of profile {vk_id} failed: {type(e).__name__}: {e}', self.debug_mode)
+        finally:
+            with self.__lock:
+                self.__refreshing.discard(vk_id)
+
+    @property
+    def metrics(self) -> dict:
+        with self.__lock:
+            return {**self.__found, 'refreshing': len(self.__refreshing), 'cache': self.__cache.metrics}
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+
+def copy_profile(client: VKinderClient) -> VKinderClient:
+    """
+    New client with profile and search history of given one
+    """
+    result = VKinderClient(client)
+    result.profile_updated = client.profile_updated
+    result.searches = list(client.searches)
+    return result
+
+
+def refresh_profile(client: VKinderClient, user: ApiUser):
+    """
+    Updates profile of client by user received from VK
+    """
+    for name in REFRESHED_ATTRIBUTES:
+        setattr(client, name, getattr(user, name))
+    client.profile_updated = datetime.now(timezone.utc)
@@ -0,0 +1,331 @@
+import atexit
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime, date, timezone
+import numpy as np
+from сlasses.vk_api_classes import VKinderClient, VKinderSearch, ApiUser, ApiCity, ApiCountry, CandidateSet, \
+    USER_ATTRIBUTES, RATINGS, log
+from сlasses.vkinder_bot_constants import STATUSES
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# photos of client as user aren't used by bot
+PROFILE_ATTRIBUTES = tuple(name for name in USER_ATTRIBUTES if name != 'photos')
+# searches of history are rows of DB, so only search parameters are taken from them
+SEARCH_ATTRIBUTES = ('id', 'min_age', 'max_age', 'sex_id', 'status_id', 'city_id', 'city_name')
+
+
+def dump_client(client: VKinderClient) -> dict:
+    """
+    Compact state of client conversation, suitable for JSON. Found users are stored as VK ids with ratings column
+    """
+    profile = {name: getattr(client, name) for name in PROFILE_ATTRIBUTES}
+    if profile['birth_date']:
+        profile['birth_date'] = profile['birth_date'].isoformat()
+    found_users = client.found_users
+    return {'profile': profile,
+            'status': client.status,
+            'last_contact': client.last_contact.timestamp(),
+            'profile_updated': to_timestamp(client.profile_updated),
+            'rating_filter': client.rating_filter,
+            'search': dump_search(client.search),
+            'searches': [dump_search(search) for search in client.searches],
+            'found_cities': [[city.id, city.title, city.area, city.region] for city in client.found_cities],
+            'found_countries': [[country.id, country.title] for country in client.found_countries],
+            'found_users': [user.vk_id for user in found_users],
+            'ratings': base64.b64encode(found_users.column('rating_id').tobytes()).decode(),
+            'cursor': found_users.cursor,
+            'active_user': client.active_user.vk_id if client.active_user else None}
+
+
+def restore_client(state: dict, load_users) -> VKinderClient:
+    """
+    Restores client from state made by dump_client
+    :param load_users: function which receives list of VK ids and returns dict {VK id: ApiUser},
+    users absent in result are dropped from found users
+    """
+    user = ApiUser()
+    for name, value in state['profile'].items():
+        # attributes which user doesn't have anymore are skipped
+        if name in PROFILE_ATTRIBUTES:
+            setattr(user, name, value)
+    if user.birth_date:
+        user.birth_date = date.fromisoformat(user.birth_date)
+    client = VKinderClient(user)
+    client.rating_filter = state['rating_filter']
+    client.search = make_search(state['search'])
+    client.searches = [make_search(search) for search in state['searches']]
+    client.found_cities = [ApiCity({'id': id, 'title': title, 'area': area, 'region': region})
+                           for id, title, area, region in state['found_cities']]
+    client.found_countries = [ApiCountry({'id': id, 'title': title}) for id, title in state['found_countries']]
+    vk_ids = state['found_users']
+    users = load_users(vk_ids) if vk_ids else {}
+    ratings = np.frombuffer(base64.b64decode(state['ratings']), dtype=CandidateSet.COLUMNS['rating_id'])
+    kept = [position for position, vk_id in enumerate(vk_ids) if vk_id in users]
+    found_users = CandidateSet(users[vk_ids[position]] for position in kept)
+    found_users.set_ratings({vk_ids[position]: int(ratings[position]) for position in kept
+                             if ratings[position] != RATINGS['new']})
+    client.found_users = found_users
+    # cursor points to the same user, if some of passed users are dropped
+    found_users.cursor = sum(1 for position in kept if position < state['cursor'])
+    client.active_user = users.get(state['active_user'])
+    # search interrupted by restart isn't continued
+    client.status = STATUSES['has_contacted'] if state['status'] == STATUSES['loading_users'] else state['status']
+    client.last_contact = datetime.fromtimestamp(state['last_contact'])
+    if state.get('profile_updated'):
+        client.profile_updated = datetime.fromtimestamp(state['profile_updated'], timezone.utc)
+    return client
+
+
+def dump_search(search) -> dict:
+    """
+    :param search: VKinderSearch or row of searches table
+    """
+    return {name: getattr(search, name, None) for name in SEARCH_ATTRIBUTES}
+
+
+def encode_state(state: dict) -> str:
+    return None if state is None else json.dumps(state, ensure_ascii=False, separators=(',', ':'))
+
+
+def to_timestamp(moment: datetime) -> float:
+    """
+    Time without timezone is considered as UTC, as DB drivers return it
+    """
+    if moment is None:
+        return None
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def make_search(values: dict) -> VKinderSearch:
+    search = VKinderSearch()
+    for name, value in values.items():
+        if name in SEARCH_ATTRIBUTES:
+            setattr(search, name, value)
+    return search
+
+
+class SessionStore:
+    """
+    Write-behind store of clients sessions, it's base class for storage backends.
+    States are put by dispatcher workers and written by own thread not often than once per interval and on close.
+    Written states shouldn't be kept in memory by backend, as clients are evicted to store to free memory.
+    'ttl': seconds of client inactivity after which session isn't restored
+    """
+
+    def __init__(self, interval: float = 5.0, ttl: float = 86400, debug_mode=False):
+        self.interval = interval
+        self.ttl = ttl
+        self.debug_mode = debug_mode
+        self.__lock = threading.Condition()
+        # writings are serialized, so older state can't be written after newer one
+        self.__write_lock = threading.Lock()
+        # client VK id -> state, or None if session is finished
+        self.__pending: dict[str, dict] = {}
+        # changes taken from buffer, which are being written
+        self.__writing: dict[str, dict] = {}
+        self.__closed = False
+        self.__writer = threading.Thread(target=self.__write_behind, name='sessions_writer', daemon=True)
+        self.__writer.start()
+        atexit.register(self.close)
+
+    def get(self, vk_id: str) -> dict:
+        """
+        :return: state of client, or None if there is no session or it is expired
+        """
+        with self.__lock:
+            buffered = vk_id in self.__pending or vk_id in self.__writing
+            state = self.__pending[vk_id] if vk_id in self.__pending else self.__writing.get(vk_id)
+        # session of client is changed only by worker thread of client, so written state can't be outdated here
+        if not buffered:
+            state = self.read_state(vk_id)
+        if state is None or state['last_contact'] < time.time() - self.ttl:
+            return None
+        return state
+
+    def put(self, vk_id: str, state: dict):
+        with self.__lock:
+            self.__pending[vk_id] = state
+
+    def remove(self, vk_id: str):
+        with self.__lock:
+            self.__pending[vk_id] = None
+
+    def save(self, vk_id: str, state: dict) -> bool:
+        """
+        Writes state of client at once, needed when client is removed from memory
+        :return: True if state is written, otherwise state is left to writer thread
+        """
+        with self.__write_lock:
+            with self.__lock:
+                self.__pending.pop(vk_id, None)
+            try:
+                self.write_states({vk_id: encode_state(state)})
+                return True
+            except Exception as e:
+                log(f'Writing of session {vk_id} failed: {type(e).__name__}: {e}', is_debug_msg=self.debug_mode)
+                with self.__lock:
+                    self.__pending.setdefault(vk_id, state)
+                return False
+
+    def __write_behind(self):
+        """
+        Internal use only. Writer thread
+        """
+        while True:
+            with self.__lock:
+                self.__lock.wait(self.interval)
+                if self.__closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all changed sessions. If writing fails, changes are returned to buffer, unless they were replaced.
+        States which can't be encoded are dropped, as they never could be written
+        """
+        with self.__write_lock:
+            self.__flush()
+
+    def __flush(self):
+        """
+        Internal use only. Called under write lock
+        """
+        with self.__lock:
+            changes, self.__pending = self.__pending, {}
+            self.__writing = changes
+        if not changes:
+            return
+        encoded = {}
+        for vk_id, state in changes.items():
+            try:
+                encoded[vk_id] = encode_state(state)
+            except (TypeError, ValueError) as e:
+                log(f'Session {vk_id} is dropped, as it can\'t be encoded: {type(e).__name__}: {e}',
+                    is_debug_msg=self.debug_mode)
+        changes = {vk_id: state for vk_id, state in changes.items() if vk_id in encoded}
+        try:
+            self.write_states(encoded)
+        except Exception as e:
+            log(f'Writing of sessions failed: {type(e).__name__}: {e}', is_debug_msg=self.debug_mode)
+            with self.__lock:
+                for vk_id, state in changes.items():
+                    self.__pending.setdefault(vk_id, state)
+        finally:
+            with self.__lock:
+                self.__writing = {}
+
+    def close(self):
+        """
+        Stops writer thread and writes all changed sessions
+        """
+        if self.__closed:
+            return
+        with self.__lock:
+            self.__closed = True
+            self.__lock.notify()
+        self.__writer.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def read_state(self, vk_id: str) -> dict:
+        """
+        :return: written state of client or None
+        """
+        raise NotImplementedError
+
+    def write_states(self, changes: dict[str, str]):
+        """
+        :param changes: {client VK id: state encoded to JSON or None if session should be removed}
+        """
+        raise NotImplementedError
+
+
+class FileSessionStore(SessionStore):
+    """
+    Each session is written to own file in directory, which is replaced atomically, so sessions aren't kept in memory
+    and only changed ones are written. Files of sessions expired by ttl are deleted not often than once per hour
+    """
+
+    def __init__(self, directory: str = 'sessions', interval: float = 5.0, ttl: float = 86400, debug_mode=False):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.__pruned = 0.0
+        super().__init__(interval=interval, ttl=ttl, debug_mode=debug_mode)
+
+    def __filename(self, vk_id: str) -> str:
+        return os.path.join(self.directory, f'{vk_id}.json')
+
+    def read_state(self, vk_id: str) -> dict:
+        try:
+            with open(self.__filename(vk_id), mode='rt', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log(f'{type(self).__name__}: session {vk_id} is broken and dropped: {e}', self.debug_mode)
+            return None
+
+    def write_states(self, changes: dict[str, str]):
+        self.__prune()
+        for vk_id, state in changes.items():
+            filename = self.__filename(vk_id)
+            if state is None:
+                if os.path.isfile(filename):
+                    os.remove(filename)
+                continue
+            temp_filename = f'{filename}.tmp'
+            with open(temp_filename, mode='wt', encoding='utf-8') as file:
+                file.write(state)
+            os.replace(temp_filename, filename)
+
+    def __prune(self):
+        """
+        Internal use only. Deletes files of sessions, which weren't written during ttl
+        """
+        now = time.time()
+        if now - self.__pruned < min(self.ttl, 3600):
+            return
+        self.__pruned = now
+        pruned = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < now - self.ttl:
+                    os.remove(entry.path)
+                    pruned += 1
+        if pruned:
+            log(f'{type(self).__name__}: {pruned} expired sessions are deleted', self.debug_mode)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions are kept in hash of Redis (or compatible server), so they survive restart of host.
+    Requires "redis" package
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', key: str = 'vkinder:sessions', interval: float = 5.0,
+                 ttl: float = 86400, debug_mode=False):
+        if redis is None:
+            raise ImportError(f'{type(self).__name__} requires "redis" package')
+        self.key = key
+        self.__redis = redis.Redis.from_url(url)
+        super().__init__(interval=interval, ttl=ttl, debug_mode=debug_mode)
+
+    def read_state(self, vk_id: str) -> dict:
+        state = self.__redis.hget(self.key, vk_id)
+        return None if state is None else json.loads(state)
+
+    def write_states(self, changes: dict[str, str]):
+        pipeline = self.__redis.pipeline()
+        for vk_id, state in changes.items():
+            if state is None:
+                pipeline.hdel(self.key, vk_id)
+            else:
+                pipeline.hset(self.key, vk_id, state)
+        pipeline.execute()
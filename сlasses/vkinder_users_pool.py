@@ -0,0 +1,73 @@
+import sys
+import threading
+import weakref
+from сlasses.vk_api_classes import ApiUser, USER_ATTRIBUTES
+
+# attributes of user which are repeated among many users
+INTERNED_ATTRIBUTES = ('fname', 'lname', 'country_name', 'city_name', 'hometown')
+# attributes which are taken by fresh user from pooled one, as fresh data has no them
+KEPT_ATTRIBUTES = ('db_id',)
+REFRESHED_ATTRIBUTES = tuple(name for name in USER_ATTRIBUTES if name not in KEPT_ATTRIBUTES)
+
+
+def intern_strings(user: ApiUser):
+    """
+    Equal names and cities of different users are kept as one string
+    """
+    for name in INTERNED_ATTRIBUTES:
+        value = getattr(user, name)
+        if type(value) is str:
+            setattr(user, name, sys.intern(value))
+
+
+class UsersPool:
+    """
+    Thread safe pool of users by VK id, the same user found by several clients is kept once.
+    Users are referenced weakly, so user is removed when there are no found users of clients or caches holding it.
+    Pooled users are shared and never changed by pool, fresh user with changed data replaces pooled one,
+    so found users of clients, which hold previous user, stay consistent with their columns.
+    Ratings are kept by found users of each client (see CandidateSet), photos are kept by photos cache of bot
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__users = weakref.WeakValueDictionary()
+        self.__hits = 0
+        self.__misses = 0
+
+    def resolve(self, user: ApiUser, refresh: bool = True) -> ApiUser:
+        """
+        :param refresh: False if attributes of given user are less complete than attributes of pooled one,
+        like attributes of user restored from DB
+        :return: pooled user with the same VK id, or given user which is pooled instead of it
+        """
+        intern_strings(user)
+        with self.__lock:
+            pooled = self.__users.get(user.vk_id)
+            if pooled is None:
+                self.__misses += 1
+                self.__users[user.vk_id] = user
+                return user
+            self.__hits += 1
+            if not refresh or pooled is user or all(getattr(pooled, name) == getattr(user, name)
+                                                    for name in REFRESHED_ATTRIBUTES):
+                return pooled
+            for name in KEPT_ATTRIBUTES:
+                setattr(user, name, getattr(pooled, name))
+            self.__users[user.vk_id] = user
+            return user
+
+    def resolve_all(self, users: list[ApiUser], refresh: bool = True) -> list[ApiUser]:
+        return [self.resolve(user, refresh) for user in users]
+
+    def __len__(self):
+        return len(self.__users)
+
+    @property
+    def metrics(self) -> dict:
+        with self.__lock:
+            return {'size': len(self.__users), 'hits': self.__hits, 'misses': self.__misses}
+
+
+# one pool for all clients of process
+users_pool = UsersPool()